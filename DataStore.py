@@ -0,0 +1,258 @@
+import numpy as np
+import os, json, shutil
+from warnings import warn
+
+# For Python 2.7, use cpickle
+try:
+    import cpickle as pickle
+except ModuleNotFoundError:
+    import pickle
+
+# Version of the manifest layout written by saveArrayData()
+STORE_VERSION = 1
+
+
+def saveArrayData(result_path, data, filenames, labels=None, links=None):
+    """
+    Save array data as an uncompressed columnar store, replacing pickle intermediates.
+    A store is a folder "filename.npys" in result_path, with every array saved as an uncompressed .npy file
+    and a JSON manifest "manifest.json" of container type, shapes, dtypes and optional labels.
+    This way, readArrayData() can memory-map arrays and only page in rows and columns that are actually touched.
+    If data is a list/tuple, e.g. list_data_*, every element is saved as a separate array.
+    If filenames is a tuple, data has to be a tuple of the same length and each data is saved to its own store,
+    the same as FieldData.savePickleData().
+
+    :param result_path: Directory to save the store(s) to. Created if not existent.
+    :type result_path: str
+    :param data: Array, or list/tuple of arrays, to save.
+    Elements that are not arrays, e.g. empty list, are converted to ndarray.
+    :type data: ndarray or list/tuple of ndarray, or tuple of them if filenames is a tuple
+    :param filenames: Store name(s) without extension.
+    :type filenames: str or tuple(str)
+    :param labels: Labels of data, e.g. feature labels of columns, saved in the manifest.
+    :type labels: list/tuple of str or None, optional (default=None)
+    :param links: Only if filenames is str. Dictionary of element index of data as keys and .npy file of an existing store
+    holding the same array as values, e.g. an upstream checkpoint passed through unchanged.
+    These elements are hard-linked from the existing file instead of written again, or copied if hard links aren't supported.
+    :type links: dict or None, optional (default=None)
+    """
+    if isinstance(filenames, str):
+        filenames, data, links = (filenames,), (data,), (links,)
+    elif links is not None:
+        raise ValueError("\nlinks is only supported for a single store!\n")
+    else:
+        links = (None,)*len(filenames)
+
+    os.makedirs(result_path, exist_ok=True)
+    for i, filename in enumerate(filenames):
+        store = os.path.join(result_path, filename + '.npys')
+        # Write to a temporary folder first so that a store is always complete
+        store_tmp = store + '.tmp' + str(os.getpid())
+        shutil.rmtree(store_tmp, ignore_errors=True)
+        os.makedirs(store_tmp)
+        container = type(data[i]).__name__ if isinstance(data[i], (list, tuple)) else 'ndarray'
+        arrays = data[i] if container != 'ndarray' else (data[i],)
+        manifest = {'version': STORE_VERSION, 'container': container, 'arrays': [],
+                    'labels': None if labels is None else [str(label) for label in labels]}
+        for j, arr in enumerate(arrays):
+            arr = np.asarray(arr)
+            if arr.dtype.hasobject:
+                shutil.rmtree(store_tmp, ignore_errors=True)
+                raise ValueError("\nArray " + str(j) + " of " + filename + " has object dtype and cannot be memory-mapped!\n")
+
+            file = os.path.join(store_tmp, str(j) + '.npy')
+            if links[i] is not None and j in links[i]:
+                try:
+                    os.link(links[i][j], file)
+                except OSError:
+                    shutil.copy2(links[i][j], file)
+
+            else:
+                np.save(file, arr, allow_pickle=False)
+
+            manifest['arrays'].append({'file': str(j) + '.npy', 'shape': list(arr.shape), 'dtype': arr.dtype.str})
+
+        with open(os.path.join(store_tmp, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+        shutil.rmtree(store, ignore_errors=True)
+        os.rename(store_tmp, store)
+        print('\n{0} saved at {1}'.format(filename, store))
+
+
+def readArrayData(result_path, filenames, mmap_mode='c'):
+    """
+    Read array data saved by saveArrayData(), memory-mapped by default so that loading is instant
+    and only rows and columns that are actually touched are read from disk.
+    The default copy-on-write mode lets arrays be modified in-place in RAM without touching the store.
+    If a store doesn't exist but a legacy pickle "filename.p" does, the pickle is loaded fully into RAM instead.
+
+    :param result_path: Directory of the store(s).
+    :type result_path: str
+    :param filenames: Store name(s) without extension.
+    :type filenames: str or tuple(str)
+    :param mmap_mode: Memory-map mode of numpy.load(). If None, arrays are loaded fully into RAM.
+    :type mmap_mode: "r" or "r+" or "c" or None, optional (default="c")
+
+    :return: Array, or list/tuple of arrays, in the container it was saved with if filenames is str;
+    otherwise dictionary of them with filenames as keys.
+    :rtype: ndarray or list/tuple of ndarray, or dict
+    """
+    names = (filenames,) if isinstance(filenames, str) else filenames
+    data = {}
+    for filename in names:
+        store = os.path.join(result_path, filename + '.npys')
+        if not os.path.isdir(store):
+            if not os.path.isfile(os.path.join(result_path, filename + '.p')):
+                raise FileNotFoundError("\n" + filename + " not found as store or pickle in " + result_path + "!\n")
+
+            warn("\n" + filename + " store not found, reading legacy pickle fully into RAM\n", stacklevel=2)
+            with open(os.path.join(result_path, filename + '.p'), 'rb') as f:
+                data[filename] = pickle.load(f, encoding='ASCII')
+
+            continue
+
+        with open(os.path.join(store, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        arrays = [np.load(os.path.join(store, entry['file']), mmap_mode=mmap_mode if np.prod(entry['shape']) > 0 else None)
+                  for entry in manifest['arrays']]
+        if manifest['container'] == 'ndarray':
+            data[filename] = arrays[0]
+        elif manifest['container'] == 'tuple':
+            data[filename] = tuple(arrays)
+        else:
+            data[filename] = arrays
+
+        print('\n{0} read from {1}'.format(filename, store))
+
+    return data[filenames] if isinstance(filenames, str) else data
+
+
+def openArrayData(result_path, filename, shape, dtype=np.float64, labels=None):
+    """
+    Create a single-array store to be filled in place, e.g. chunk by chunk, so that the array never has to fit in RAM.
+    The store is only visible to readArrayData() after closeArrayData().
+
+    :param result_path: Directory to save the store to. Created if not existent.
+    :type result_path: str
+    :param filename: Store name without extension.
+    :type filename: str
+    :param shape: Shape of the array.
+    :type shape: tuple(int)
+    :param dtype: Data type of the array.
+    :type dtype: np.dtype, optional (default=np.float64)
+    :param labels: Labels of the array saved in the manifest.
+    :type labels: list/tuple of str or None, optional (default=None)
+
+    :return: Writable memory-mapped array, also writable from other processes by np.load(its filename, mmap_mode='r+').
+    :rtype: np.memmap
+    """
+    store_tmp = os.path.join(result_path, filename + '.npys') + '.open'
+    shutil.rmtree(store_tmp, ignore_errors=True)
+    os.makedirs(store_tmp)
+    dtype = np.dtype(dtype)
+    manifest = {'version': STORE_VERSION, 'container': 'ndarray',
+                'arrays': [{'file': '0.npy', 'shape': list(shape), 'dtype': dtype.str}],
+                'labels': None if labels is None else [str(label) for label in labels]}
+    with open(os.path.join(store_tmp, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    return np.lib.format.open_memmap(os.path.join(store_tmp, '0.npy'), mode='w+', dtype=dtype, shape=tuple(shape))
+
+
+def closeArrayData(result_path, filename, arr):
+    """
+    Flush and publish a store created by openArrayData().
+
+    :param result_path: Directory of the store.
+    :type result_path: str
+    :param filename: Store name without extension.
+    :type filename: str
+    :param arr: Memory-mapped array returned by openArrayData().
+    :type arr: np.memmap
+    """
+    arr.flush()
+    store = os.path.join(result_path, filename + '.npys')
+    shutil.rmtree(store, ignore_errors=True)
+    os.rename(store + '.open', store)
+    print('\n{0} saved at {1}'.format(filename, store))
+
+
+def linkArrayData(src_path, src_filename, result_path, filename):
+    """
+    Publish an existing store under another name and/or directory without copying arrays,
+    by hard-linking its files. Falls back to copying if hard links aren't supported, e.g. across file systems.
+
+    :param src_path: Directory of the existing store.
+    :type src_path: str
+    :param src_filename: Existing store name without extension.
+    :type src_filename: str
+    :param result_path: Directory of the new store. Created if not existent.
+    :type result_path: str
+    :param filename: New store name without extension.
+    :type filename: str
+    """
+    src = os.path.join(src_path, src_filename + '.npys')
+    if not os.path.isdir(src):
+        raise FileNotFoundError("\n" + src_filename + " store not found in " + src_path + "!\n")
+
+    os.makedirs(result_path, exist_ok=True)
+    store = os.path.join(result_path, filename + '.npys')
+    store_tmp = store + '.tmp' + str(os.getpid())
+    shutil.rmtree(store_tmp, ignore_errors=True)
+    os.makedirs(store_tmp)
+    for file in os.listdir(src):
+        try:
+            os.link(os.path.join(src, file), os.path.join(store_tmp, file))
+        except OSError:
+            shutil.copy2(os.path.join(src, file), os.path.join(store_tmp, file))
+
+    shutil.rmtree(store, ignore_errors=True)
+    os.rename(store_tmp, store)
+    print('\n{0} linked at {1}'.format(src_filename, store))
+
+
+def readArrayManifest(result_path, filename):
+    """
+    Read the manifest of a store saved by saveArrayData(), without loading any array.
+    File names of arrays in the manifest are made absolute.
+
+    :param result_path: Directory of the store.
+    :type result_path: str
+    :param filename: Store name without extension.
+    :type filename: str
+
+    :return: Manifest with keys "version", "container", "arrays" and "labels", or None if the store doesn't exist.
+    :rtype: dict or None
+    """
+    store = os.path.join(result_path, filename + '.npys')
+    if not os.path.isdir(store):
+        return None
+
+    with open(os.path.join(store, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    for entry in manifest['arrays']:
+        entry['file'] = os.path.join(store, entry['file'])
+
+    return manifest
+
+
+def readArrayLabels(result_path, filename):
+    """
+    Read labels saved along with a store by saveArrayData().
+
+    :param result_path: Directory of the store.
+    :type result_path: str
+    :param filename: Store name without extension.
+    :type filename: str
+
+    :return: Labels, or None if no labels were saved.
+    :rtype: list(str) or None
+    """
+    manifest = readArrayManifest(result_path, filename)
+    if manifest is None:
+        raise FileNotFoundError("\n" + filename + " store not found in " + result_path + "!\n")
+
+    return manifest['labels']
@@ -0,0 +1,458 @@
+"""
+Read and Write OpenFOAM Field Data Without the External FieldData Module
+"""
+import numpy as np
+import os, mmap, re, glob
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from Utility import confineFieldDomainIndices3D
+from warnings import warn
+
+# Number of components of each OpenFOAM field type
+FIELD_COMPONENTS = {'scalar': 1, 'vector': 3, 'sphericalTensor': 1, 'symmTensor': 6, 'tensor': 9}
+# Header entries of interest, e.g. "format ascii;" and "class volVectorField;"
+_HEADER_ENTRY = re.compile(rb'\b(format|class)\s+(\w+)\s*;')
+# Uniform and nonuniform internalField, e.g. "internalField uniform (0 0 0);" and
+# "internalField nonuniform List<vector> \n1000\n(" in which case the list starts right after the match
+_UNIFORM = re.compile(rb'internalField\s+uniform\s+([^;]*);')
+_NONUNIFORM = re.compile(rb'internalField\s+nonuniform\s+List<(\w+)>\s*(\d+)\s*\(')
+# Size and start of a top-level list after the header, e.g. "1000\n(" of cellProcAddressing
+_LIST_START = re.compile(rb'\s*(\d+)\s*\(')
+# Parentheses to strip at byte level so that the whole list is one flat run of numbers
+_PARENTHESES = b'()'
+# OpenFOAM field type of each number of components when writing
+_COMPONENT_TYPES = {1: 'scalar', 3: 'vector', 6: 'symmTensor', 9: 'tensor'}
+# Index pairs of the 6 unique components xx, xy, xz, yy, yz, zz of a symmetric tensor
+_SYMMETRIC_PAIRS = ((0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2))
+# Number of rows formatted at once when writing ASCII, to bound memory of the intermediate string
+_ASCII_CHUNK = 100000
+_HEADER = """/*--------------------------------*- C++ -*----------------------------------*\\
+| =========                 |                                                 |
+| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
+|  \\\\    /   O peration     | Version:  2.4.0                                 |
+|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
+|    \\\\/     M anipulation  |                                                 |
+\\*---------------------------------------------------------------------------*/
+FoamFile
+{{
+    version     2.0;
+    format      {format};{arch}
+    class       vol{cls}Field;
+    location    "{time}";
+    object      {fieldname};
+}}
+// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
+
+dimensions      {dimensions};
+
+internalField   nonuniform List<{type}> 
+{n_cells}
+("""
+
+
+def readFoamField(filepath):
+    """
+    Read the internalField of an OpenFOAM field file in one vectorized pass.
+    The file is memory-mapped and only the internalField list is touched.
+    For ASCII format, parentheses of the list are stripped at byte level and all numbers parsed by NumPy at once;
+    for binary format, the list is directly viewed as float64.
+    Uniform internalField is returned as a single row, see readFieldData() for broadcasting it to all cells.
+
+    :param filepath: Full path of the field file, e.g. ".../Fields/20000/UAvg".
+    :type filepath: str
+
+    :return: Field of shape (n_cells,) for scalars or (n_cells, n_components) otherwise,
+    with n_components 3, 6 and 9 for vector, symmTensor and tensor respectively;
+    and whether the field is uniform in which case n_cells is 1.
+    :rtype: (np.ndarray, bool)
+    """
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Header tells format and, for uniform fields, field type
+        header_end = mm.find(b'internalField')
+        if header_end == -1:
+            raise ValueError("\ninternalField not found in " + filepath + "!\n")
+
+        header = dict(_HEADER_ENTRY.findall(mm[:header_end]))
+        binary = header.get(b'format', b'ascii') == b'binary'
+        match = _NONUNIFORM.match(mm, header_end)
+        if match is None:
+            match = _UNIFORM.match(mm, header_end)
+            if match is None:
+                raise ValueError("\nUnrecognized internalField in " + filepath + "!\n")
+
+            val = np.fromstring(match.group(1).translate(None, _PARENTHESES), sep=' ')
+            return (val.reshape(1, -1) if val.size > 1 else val.reshape(1)), True
+
+        field_type, n_cells = match.group(1).decode(), int(match.group(2))
+        if field_type not in FIELD_COMPONENTS:
+            raise ValueError("\nUnsupported field type List<" + field_type + "> in " + filepath + "!\n")
+
+        n_components = FIELD_COMPONENTS[field_type]
+        shape = (n_cells,) if n_components == 1 else (n_cells, n_components)
+        start = match.end()
+        if binary:
+            # Binary list is n_cells*n_components raw doubles right after "("
+            val = np.frombuffer(mm, dtype=np.float64, count=n_cells*n_components, offset=start).reshape(shape).copy()
+        else:
+            # The list ends at the first ";" since numbers never contain one
+            end = mm.find(b';', start)
+            # Parse the flattened list in one go, stripping every "(" and ")" at byte level
+            val = np.fromstring(mm[start:end].translate(None, _PARENTHESES), sep=' ')
+            if val.size != n_cells*n_components:
+                raise ValueError("\nExpected " + str(n_cells*n_components) + " values but got " + str(val.size) + " in " + filepath + "!\n")
+
+            val = val.reshape(shape)
+
+    return val, False
+
+
+def readFieldData(case_fullpath, times, fields, n_jobs=-1):
+    """
+    Read the internalField of multiple OpenFOAM fields at one or multiple times, in parallel with a thread pool.
+    Each field file is parsed by readFoamField(). Uniform fields are broadcast to the number of cells of
+    nonuniform fields at the same time. If all fields of a time are uniform, they are left as a single row.
+
+    :param case_fullpath: Directory containing the time folders, e.g. casedir + '/' + casename + '/Fields'.
+    :type case_fullpath: str
+    :param times: Time folder name(s).
+    :type times: str or float or int or list/tuple(str or float or int)
+    :param fields: Field file name(s).
+    :type fields: str or list/tuple(str)
+    :param n_jobs: Number of threads. If -1, use number of CPUs.
+    :type n_jobs: int, optional (default=-1)
+
+    :return: Dictionary of fields with field names as keys if times is str/float/int;
+    otherwise dictionary of such dictionaries with times as keys.
+    :rtype: dict(np.ndarray) or dict(dict(np.ndarray))
+    """
+    single_time = not isinstance(times, (list, tuple))
+    times = [str(times)] if single_time else [str(time) for time in times]
+    fields = [fields] if isinstance(fields, str) else list(fields)
+    n_jobs = os.cpu_count() if n_jobs == -1 else max(n_jobs, 1)
+    jobs = [(time, field) for time in times for field in fields]
+    print('\nReading {0} field(s) at {1} time(s) with {2} thread(s)...'.format(len(fields), len(times), min(n_jobs, len(jobs))))
+    # Each job memory-maps one file and spends most time in I/O and NumPy parsing
+    with ThreadPoolExecutor(max_workers=min(n_jobs, len(jobs))) as executor:
+        results = executor.map(lambda job: readFoamField(os.path.join(case_fullpath, job[0], job[1])), jobs)
+        results = dict(zip(jobs, results))
+
+    data = {}
+    for time in times:
+        n_cells = [results[(time, field)][0].shape[0] for field in fields if not results[(time, field)][1]]
+        if len(set(n_cells)) > 1:
+            warn("\nFields at time " + time + " have different number of cells " + str(sorted(set(n_cells))) + "\n", stacklevel=2)
+
+        data[time] = {}
+        for field in fields:
+            val, uniform = results[(time, field)]
+            # Broadcast uniform field to all cells
+            if uniform and len(n_cells) > 0:
+                val = np.tile(val, n_cells[0]) if val.ndim == 1 else np.tile(val, (n_cells[0], 1))
+
+            data[time][field] = val
+
+    print('\n{0} read at time {1}'.format(fields, times))
+    return data[times[0]] if single_time else data
+
+
+def readFoamLabelList(filepath):
+    """
+    Read an OpenFOAM labelList file, e.g. processor*/constant/polyMesh/cellProcAddressing, in one vectorized pass.
+    Binary format is assumed to have 32-bit labels.
+
+    :param filepath: Full path of the labelList file.
+    :type filepath: str
+
+    :return: Labels.
+    :rtype: np.ndarray[n_labels](int)
+    """
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # The list comes right after the FoamFile dictionary and any comment banner
+        header_end = mm.find(b'}')
+        header = dict(_HEADER_ENTRY.findall(mm[:header_end]))
+        # Skip the comment line after the header, if any, by searching from the next line
+        match = _LIST_START.search(mm, mm.find(b'\n', header_end))
+        if match is None:
+            raise ValueError("\nNo list found in " + filepath + "!\n")
+
+        n_labels, start = int(match.group(1)), match.end()
+        if header.get(b'format', b'ascii') == b'binary':
+            labels = np.frombuffer(mm, dtype=np.int32, count=n_labels, offset=start).astype(np.int64)
+        else:
+            labels = np.fromstring(mm[start:mm.find(b')', start)], dtype=np.int64, sep=' ')
+
+    if labels.size != n_labels:
+        raise ValueError("\nExpected " + str(n_labels) + " labels but got " + str(labels.size) + " in " + filepath + "!\n")
+
+    return labels
+
+
+def _readProcessorFieldData(args):
+    """
+    Read fields, cell centers and cell addressing of one processor* directory, confined if requested.
+    Module level function so that it can be sent to a process pool.
+    """
+    procdir, time, fields, cc_name, confine_kwargs = args
+    addressing = readFoamLabelList(os.path.join(procdir, 'constant', 'polyMesh', 'cellProcAddressing'))
+    data = {}
+    for field in fields + (cc_name,):
+        val, uniform = readFoamField(os.path.join(procdir, time, field))
+        # Broadcast uniform field to all cells of this processor
+        if uniform:
+            val = np.tile(val, len(addressing)) if val.ndim == 1 else np.tile(val, (len(addressing), 1))
+
+        data[field] = val
+
+    cc, n_cells = data.pop(cc_name), len(addressing)
+    # Drop cells outside the confinement box before sending anything back
+    if confine_kwargs is not None:
+        idx = confineFieldDomainIndices3D(cc, [confine_kwargs])[0]
+        cc, addressing = cc[idx], addressing[idx]
+        for field in fields:
+            data[field] = data[field][idx]
+
+    return addressing, cc, data, n_cells
+
+
+def readDecomposedFieldData(case_fullpath, time, fields, cc_name='C', confine_kwargs=None, n_jobs=-1):
+    """
+    Read the internalField of multiple OpenFOAM fields directly from processor*/<time>/<field> of a decomposed case,
+    without reconstructing it first, one processor per process of a process pool.
+    Each processor is optionally confined by confineFieldDomainIndices3D() right after reading
+    so that cells outside the confinement box are dropped before concatenation.
+    Processor blocks are then concatenated and put back in global cell order using cellProcAddressing,
+    thus the result is the same as reading the reconstructed case and confining it afterwards.
+
+    :param case_fullpath: Directory containing the processor* folders.
+    :type case_fullpath: str
+    :param time: Time folder name. If "latestTime", the latest time of processor0 is used.
+    :type time: str or float or int
+    :param fields: Field file name(s).
+    :type fields: str or list/tuple(str)
+    :param cc_name: File name of cell center field in each processor time folder, e.g. written by writeCellCentres.
+    :type cc_name: str, optional (default="C")
+    :param confine_kwargs: Keyword arguments box_l, box_w, box_h, box_orig, and rot_z of confineFieldDomain3D(), i.e. a box of confineFieldDomainIndices3D().
+    If None, no confinement is done.
+    :type confine_kwargs: dict or None, optional (default=None)
+    :param n_jobs: Number of processes. If -1, use number of CPUs.
+    :type n_jobs: int, optional (default=-1)
+
+    :return: Dictionary of fields with field names as keys, cell centers,
+    and 1D bool mask of global cells kept, whose True indices, np.flatnonzero(mask), map rows back to global cells.
+    :rtype: (dict(np.ndarray), np.ndarray[n_cells, 3], np.ndarray[n_cells_global](bool))
+    """
+    procdirs = sorted(glob.glob(os.path.join(case_fullpath, 'processor*')), key=lambda procdir: int(procdir.rsplit('processor', 1)[1]))
+    if len(procdirs) == 0:
+        raise ValueError("\nNo processor* directory found in " + case_fullpath + "!\n")
+
+    if time == 'latestTime':
+        times = []
+        for timedir in os.listdir(procdirs[0]):
+            try:
+                times.append((float(timedir), timedir))
+            except ValueError:
+                continue
+
+        time = max(times)[1]
+
+    fields = (fields,) if isinstance(fields, str) else tuple(fields)
+    n_jobs = os.cpu_count() if n_jobs == -1 else max(n_jobs, 1)
+    print('\nReading {0} field(s) at time {1} from {2} processor(s) with {3} process(es)...'.format(len(fields), time, len(procdirs),
+                                                                                                  min(n_jobs, len(procdirs))))
+    # Fork so that the calling script, which has no __main__ guard, isn't re-executed by every worker
+    mp_context = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(procdirs)), mp_context=mp_context) as executor:
+        results = list(executor.map(_readProcessorFieldData, [(procdir, str(time), fields, cc_name, confine_kwargs) for procdir in procdirs]))
+
+    # Every global cell belongs to exactly one processor
+    n_cells_global = sum(result[3] for result in results)
+    addressing = np.concatenate([result[0] for result in results])
+    # Order of concatenated rows that gives global cell order
+    order = np.argsort(addressing, kind='stable')
+    mask = np.zeros(n_cells_global, dtype=bool)
+    mask[addressing] = True
+    cc = np.concatenate([result[1] for result in results])[order]
+    data = {field: np.concatenate([result[2][field] for result in results])[order] for field in fields}
+    print('\n{0} read at time {1} with {2}/{3} cells'.format(fields, time, len(addressing), n_cells_global))
+    return data, cc, mask
+
+
+class FieldAverage:
+    """
+    Streaming average of fields over multiple times, fed one time at a time so that memory stays at
+    one time of fields plus the preallocated accumulators.
+    Every field is averaged as a running mean, mean += (val - mean)/n, in float64.
+    A second moment field, e.g. uuPrime2, is the fluctuation about its mean field of the same time, e.g. UAvg.
+    Its average about the averaged mean field is the mean of the second moments plus the covariance of the mean field over times,
+    the latter accumulated Welford-style, M2 += (val - mean_old)(val - mean_new).
+    
+    Example:
+        average = FieldAverage(moments={'uuPrime2': 'UAvg'})
+        for time in times:
+            average.add(readFieldData(case_fullpath, time, fields))
+            
+        field_data = average.getAverage()
+    """
+    def __init__(self, moments=None):
+        """
+        :param moments: Second moment fields as keys and their mean fields as values, e.g. {'uuPrime2': 'UAvg'}.
+        A second moment field is of 6 (symmetric tensor, xx, xy, xz, yy, yz, zz) or 9 components
+        and its mean field of 3 components. Fields not given here are only averaged.
+        :type moments: dict or None, optional (default=None)
+        """
+        self.moments = {} if moments is None else dict(moments)
+        self.n_times = 0
+        # Running means of every field, and Welford sums of outer products of deviations of each mean field
+        self.means, self._m2 = {}, {}
+
+    def add(self, data):
+        """
+        Add fields of one time.
+        
+        :param data: Dictionary of fields with field names as keys, e.g. from readFieldData() or readDecomposedFieldData().
+        Every time has to have the same fields and cells.
+        Writable float64 arrays of the first time are updated in place as running means afterwards.
+        :type data: dict(np.ndarray)
+        """
+        if self.n_times == 0:
+            for moment, field in self.moments.items():
+                if moment in data and field not in data:
+                    raise ValueError("\nMean field " + field + " of second moment " + moment + " is not read!\n")
+
+            # Fields of the first time become the running means, adopted without a copy if they're writable float64 arrays,
+            # and the Welford sums start at 0
+            self.means = {field: val if isinstance(val, np.ndarray) and val.dtype == np.float64 and val.flags.writeable and val.flags.owndata
+                          else np.array(val, dtype=np.float64) for field, val in data.items()}
+            self._m2 = {moment: np.zeros(np.shape(data[moment])) for moment in self.moments if moment in data}
+            self.n_times = 1
+            return
+
+        if set(data) != set(self.means):
+            raise ValueError("\nFields " + str(sorted(data)) + " differ from fields " + str(sorted(self.means)) + " of earlier times!\n")
+
+        self.n_times += 1
+        # Deviations of mean fields of second moments from their running means before the update
+        deltas = {}
+        for field, val in data.items():
+            mean = self.means[field]
+            delta = val - mean
+            mean += delta/self.n_times
+            if field in [self.moments[moment] for moment in self._m2]: deltas[field] = delta
+
+        for moment, m2 in self._m2.items():
+            val, mean, delta = data[self.moments[moment]], self.means[self.moments[moment]], deltas[self.moments[moment]]
+            # Sum of outer products of deviations before and after the update, only unique components if symmetric
+            pairs = _SYMMETRIC_PAIRS if m2.shape[1] == 6 else [(i, j) for i in range(3) for j in range(3)]
+            for c, (i, j) in enumerate(pairs):
+                m2[:, c] += delta[:, i]*(val[:, j] - mean[:, j])
+
+    def getAverage(self):
+        """
+        Get averaged fields, with second moments about the averaged mean fields.
+        Fields other than second moments are the accumulators themselves, thus change if more times are added.
+        
+        :return: Dictionary of averaged fields with field names as keys.
+        :rtype: dict(np.ndarray)
+        """
+        if self.n_times == 0:
+            raise ValueError("\nNo time has been added to average!\n")
+
+        average = dict(self.means)
+        for moment, m2 in self._m2.items():
+            average[moment] = self.means[moment] + m2/self.n_times
+
+        return average
+
+
+def averageFieldData(case_fullpath, times, fields, moments=None, n_jobs=-1):
+    """
+    Average the internalField of multiple OpenFOAM fields over multiple times with FieldAverage,
+    reading one time at a time with readFieldData().
+
+    :param case_fullpath: Directory containing the time folders, e.g. casedir + '/' + casename + '/Fields'.
+    :type case_fullpath: str
+    :param times: Time folder names.
+    :type times: list/tuple(str or float or int)
+    :param fields: Field file name(s).
+    :type fields: str or list/tuple(str)
+    :param moments: Second moment fields as keys and their mean fields as values, see FieldAverage.
+    :type moments: dict or None, optional (default=None)
+    :param n_jobs: Number of threads reading fields of a time. If -1, use number of CPUs.
+    :type n_jobs: int, optional (default=-1)
+
+    :return: Dictionary of averaged fields with field names as keys.
+    :rtype: dict(np.ndarray)
+    """
+    average = FieldAverage(moments)
+    for time in times:
+        average.add(readFieldData(case_fullpath, time, fields, n_jobs=n_jobs))
+
+    print('\n{0} averaged over {1} time(s)'.format(fields if not isinstance(fields, str) else (fields,), average.n_times))
+    return average.getAverage()
+
+
+def writeFoamField(filepath, val, patches, mask=None, time='', dimensions='[0 0 0 0 0 0 0]', binary=True, precision=10):
+    """
+    Write an OpenFOAM volScalarField, volVectorField, volSymmTensorField or volTensorField file,
+    with field type inferred from number of columns of val.
+    In binary format, the internalField is written as raw float64 from one buffer;
+    in ASCII format, rows are formatted by one string formatting per chunk of rows instead of per row.
+    Every boundary patch is written as "calculated" with uniform 0 value.
+
+    :param filepath: Full path of the field file to write, its name is also the field name.
+    :type filepath: str
+    :param val: Field values, of every cell if mask is None; otherwise only of cells where mask is True.
+    :type val: np.ndarray[n_cells or n_masked_cells] or np.ndarray[n_cells or n_masked_cells, 1/3/6/9]
+    :param patches: Names of boundary patches of the mesh, e.g. ('lower', 'upper', 'south', 'west', 'east', 'north').
+    :type patches: list/tuple(str)
+    :param mask: Cells val belongs to. Cells not in mask are 0. If None, val is of every cell.
+    :type mask: np.ndarray[n_cells](bool) or None, optional (default=None)
+    :param time: Time folder name written as "location" in the header.
+    :type time: str or float or int, optional (default='')
+    :param dimensions: OpenFOAM dimensions of the field.
+    :type dimensions: str, optional (default='[0 0 0 0 0 0 0]')
+    :param binary: Whether to write in binary format, otherwise ASCII.
+    :type binary: bool, optional (default=True)
+    :param precision: Number of significant digits in ASCII format.
+    :type precision: int, optional (default=10)
+    """
+    val = np.asarray(val, dtype=np.float64)
+    n_components = 1 if val.ndim == 1 else val.shape[1]
+    if n_components not in _COMPONENT_TYPES:
+        raise ValueError("\nval has to have 1, 3, 6 or 9 columns for scalar, vector, symmTensor or tensor field!\n")
+
+    # Assign val to masked cells, with unmasked cells being 0
+    if mask is not None:
+        val_all = np.zeros((len(mask),) + val.shape[1:])
+        val_all[mask] = val
+        val = val_all
+
+    field_type = _COMPONENT_TYPES[n_components]
+    fieldname = os.path.basename(filepath)
+    header = _HEADER.format(format='binary' if binary else 'ascii',
+                            arch='\n    arch        "LSB;label=32;scalar=64";' if binary else '',
+                            cls=field_type[0].upper() + field_type[1:], time=time, fieldname=fieldname,
+                            dimensions=dimensions, type=field_type, n_cells=len(val))
+    zero = '0' if n_components == 1 else '(' + ' '.join(('0',)*n_components) + ')'
+    footer = ')\n;\n\nboundaryField\n{\n'
+    for patch in patches:
+        footer += '    {0}\n    {{\n        type            calculated;\n        value           uniform {1};\n    }}\n'.format(patch, zero)
+
+    footer += '}\n\n\n// ************************************************************************* //\n'
+    print('\nWriting {0} to OpenFOAM {1} format...'.format(fieldname, 'binary' if binary else 'ASCII'))
+    with open(filepath, 'wb') as f:
+        f.write(header.encode())
+        if binary:
+            # Raw little-endian doubles right after "("
+            f.write(np.ascontiguousarray(val, dtype='<f8').tobytes())
+        else:
+            f.write(b'\n')
+            row = '%.{0}g'.format(precision)
+            row = (row + '\n') if n_components == 1 else ('(' + ' '.join((row,)*n_components) + ')\n')
+            for i in range(0, len(val), _ASCII_CHUNK):
+                chunk = val[i:i + _ASCII_CHUNK]
+                f.write(((row*len(chunk)) % tuple(chunk.ravel().tolist())).encode())
+
+        f.write(footer.encode())
+
+    print('\n{0} written at {1}'.format(fieldname, filepath))
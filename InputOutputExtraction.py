@@ -3,20 +3,18 @@ import sys
 # See https://github.com/YuyangL/SOWFA-PostProcess
 sys.path.append('/home/yluan/Documents/SOWFA PostProcessing/SOWFA-Postprocess')
 from FieldData import FieldData
+from DataStore import saveArrayData
+from FoamData import readFieldData, readDecomposedFieldData, FieldAverage
+from Pipeline import Pipeline
 from SliceData import SliceProperties
 from SetData import SetProperties
 from Preprocess.Tensor import processReynoldsStress, expandSymmetricTensor, contractSymmetricTensor, getStrainAndRotationRateTensor, getInvariantBases
 from Preprocess.Feature import getInvariantFeatureSet, getSupplementaryInvariantFeatures, getRadialTurbineDistance
 from Preprocess.FeatureExtraction import splitTrainTestDataList
-from Utility import rotateData, confineFieldDomain3D
-
-# For Python 2.7, use cpickle
-try:
-    import cpickle as pickle
-except ModuleNotFoundError:
-    import pickle
+from Utility import rotateData, confineFieldDomainIndices3D
 
 from warnings import warn
+from glob import glob
 import time as t
 
 """
@@ -25,15 +23,21 @@ Programme Settings
 # Field settings
 # Global field setting, will skip the following field settings if False
 proc_field = False  # bool
-# Whether process field data, invariants, features from scratch,
-# or use raw field pickle data and process invariants and features
-# or use raw field and invariants pickle data and process features
-proc_field_raw = True  # bool
-proc_invariant = True  # bool
-# Whether to calculate features or skip and directly read from pickle data
-proc_field_feature = True  # bool
-# Whether to split train and test data or skip and directly read from pickle data
-proc_field_traintest_split = True  # bool
+# Field processing is a graph of stages with checkpoints keyed by their settings,
+# so only stages affected by changed settings are recomputed.
+# Names of stages to recompute regardless, e.g. after raw data changed in place:
+# 'fields', 'confine', 'sijrij', 'tij', 'bij', 'features', 'split'
+force_stages = ()  # list/tuple(str)
+# Folder in the result folder to store stage checkpoints
+checkpoint_folder = 'Checkpoints'  # str
+# Streaming mode: if not None, Sij/Rij, Tij, bij and feature stages process cells in chunks of this size,
+# written straight to disk-backed checkpoints so that peak memory is bounded by chunk size rather than domain size
+chunk_size = None  # int, None
+# Number of worker processes computing chunks in streaming mode, -1 for all CPUs
+n_jobs = 1  # int
+# Precision of fields, Sij/Rij, Tij, bij and features. 'float32' halves memory and bandwidth of every stage,
+# within 1e-6 (features of grad(TKE)/grad(p) within 1e-5) relative to float64, enough for tree models that split in float32 anyway
+dtype = 'float64'  # 'float64', 'float32'
 
 # Whether process slice and sets data, purely for prediction
 proc_slice = True  # bool
@@ -49,6 +53,16 @@ casename = 'ALM_N_H_ParTurb_HiSpeed'  # str
 casedir = '/media/yluan'  # str
 # Which time to extract input and output for ML
 time = 'latestTime'  # str/float/int or 'latestTime'
+# Times to average raw fields over, read one time at a time into running means so that memory stays at one time of fields.
+# uuPrime2 is averaged about the averaged UAvg if UAvg is read, otherwise only its mean is taken.
+# Results are still stored under time. If None, only time is used
+average_times = None  # list/tuple(str/float/int), None
+# Folder of the case containing time folders of raw fields
+field_foldername = 'Fields'  # str
+# Whether read raw fields directly from processor* folders of a decomposed case, confined per processor if confine is True.
+# Cell centers are read from field cc_fieldname in each processor time folder
+decomposed = False  # bool
+cc_fieldname = 'C'  # str
 # What keyword does the gradient fields contain
 grad_kw = 'grad'  # str
 # Flow field counter-clockwise rotation in x-y plane
@@ -120,8 +134,6 @@ else:
     fields = ('kResolved', 'kSGSmean', 'epsilonSGSmean', 'uuPrime2',
               'grad_UAvg')
 
-# Ensemble name of fields useful for Machine Learning
-mlfield_ensemble_name = 'ML_Fields_' + casename
 # Case related default settings
 if 'ParTurb' in casename:
     slicenames = ('hubHeight', 'quarterDaboveHub', 'turbineApexHeight')
@@ -194,8 +206,6 @@ else:
 
 # Subscript for the slice names
 slicename_sub = 'Slice'
-# Ensemble file name, containing fields related to ML
-mlfield_ensemble_namefull = mlfield_ensemble_name + '_' + confinedfield_namesub
 # Initialize case object
 case = FieldData(casename=casename, casedir=casedir, times=time, fields=fields, save=save_fields, result_folder=resultfolder)
 # Update time to the actual detected time if time was 'latestTime'
@@ -203,17 +213,35 @@ time = case.times[0]
 
 
 """
-Read and Process Raw Field Data
+Field Processing Stages
 """
-if proc_field and proc_field_raw:
-    # Read raw field data specified in fields
-    field_data = case.readFieldData()
+# The field processing is a graph of stages read fields -> confine -> Sij/Rij -> Tij -> bij -> features -> split,
+# each checkpointed under a hash of its parameters and upstream stages,
+# so only stages affected by a changed setting, e.g. cap_sijrij or fs, are recomputed
+def readFieldStage(fields, grad_kw, decomposed, dtype, times, confine_kwargs=None, confined=False, cc_fieldname='C'):
+    # Read raw field data specified in fields, one time at a time and averaged over times
+    average = FieldAverage(moments={'uuPrime2': 'UAvg'} if 'UAvg' in fields else None)
+    for time_i in times:
+        if decomposed:
+            # Fields and cell centers are already confined per processor, mask is of the whole domain
+            field_data, cc, mask = readDecomposedFieldData(casedir + '/' + casename, time_i, fields, cc_name=cc_fieldname,
+                                                           confine_kwargs=confine_kwargs)
+        else:
+            field_data = readFieldData(casedir + '/' + casename + '/' + field_foldername, time_i, fields)
+
+        average.add(field_data)
+        del field_data
+
+    field_data = average.getAverage()
+    del average
+
+    n_points = field_data[fields[0]].shape[0]
     # Initialize gradient of U as nPoint x 9 and U as n_points x 3
-    grad_u, u = np.zeros((field_data[fields[0]].shape[0], 9)), np.zeros((field_data[fields[0]].shape[0], 3))
+    grad_u, u = np.zeros((n_points, 9)), np.zeros((n_points, 3))
     # Initialize gradient of p_rgh and TKE as nPoint x 3
-    grad_p, grad_k = (np.zeros((field_data[fields[0]].shape[0], 3)),)*2
+    grad_p, grad_k = np.zeros((n_points, 3)), np.zeros((n_points, 3))
     # Initialize k, SGS epsilon as nPoint x 0
-    k, epsilon = (np.zeros(field_data[fields[0]].shape[0]),)*2
+    k, epsilon = np.zeros(n_points), np.zeros(n_points)
     # Go through each read (and rotated) field to assign different field to variable,
     # and also aggregate resolved and SGS fields
     for field in fields:
@@ -231,7 +259,7 @@ if proc_field and proc_field_raw:
         # although currently only SGS component available
         elif 'epsilonSGS' in field:
             epsilon = field_data[field]
-            
+
         # Same with U, there should be 'grad_UAvg'
         elif 'U' in field:
             if grad_kw in field:
@@ -256,124 +284,58 @@ if proc_field and proc_field_raw:
     # Convert 1D array to 2D so that I can hstack them to 1 array ensemble, nCell x 1
     k, epsilon = k.reshape((-1, 1)), epsilon.reshape((-1, 1))
     # Assemble all useful fields for Machine Learning
-    mlfield_ensemble = np.hstack((grad_k, k, epsilon, grad_u, u, grad_p, uuprime2))
+    # Every downstream stage follows its precision
+    mlfield_ensemble = np.hstack((grad_k, k, epsilon, grad_u, u, grad_p, uuprime2)).astype(dtype, copy=False)
     print('\nField variables identified and resolved and SGS TKE aggregated')
+    if decomposed:
+        return mlfield_ensemble, cc, mask
+
     # Read cell center coordinates of the whole domain, nCell x 0
     ccx, ccy, ccz, cc = case.readCellCenterCoordinates()
+    # Confinement is left to the confine stage, mask is empty when not confined
+    return (mlfield_ensemble, cc) if confined else (mlfield_ensemble, cc, [])
 
 
-    """
-    Confine the Whole Field, If confine Is True
-    """
-    mask = []
-    if confine:
-        cc, mlfield_ensemble, mask = confineFieldDomain3D(cc, mlfield_ensemble,
-                                                                                                                                                     box_l=boxl, box_w=boxw,
-                                                                                                                                                     box_h=boxh, box_orig=boxorig,
-                                                                                                                                                     rot_z=rotbox)
-        # # Confine to domain of interest and save confined cell centers as well as field ensemble if requested
-        # _, _, _, cc, mlfield_ensemble, box, _ = case.confineFieldDomain_Rotated(ccx, ccy, ccz, mlfield_ensemble,
-        #                                                                                 box_l=boxl, box_w=boxw,
-        #                                                                                 box_h=boxh, box_orig=boxorig,
-        #                                                                                 rot_z=rotbox,
-        #                                                                                 filenames_sub=confinedfield_namesub,
-        #                                                                                 vals_name=mlfield_ensemble_name)
-        # del ccx, ccy, ccz
-        # Update old whole fields to new confined fields
-        grad_k, k = mlfield_ensemble[:, :3], mlfield_ensemble[:, 3]
-        epsilon = mlfield_ensemble[:, 4]
-        grad_u = mlfield_ensemble[:, 5:14]
-        u = mlfield_ensemble[:, 14:17]
-        grad_p = mlfield_ensemble[:, 17:20]
-        uuprime2 = mlfield_ensemble[:, 20:]
-         
-    
-    """
-    Rotate Fields by Given Rotation Angle
-    """
-    # TODO: maybe rotate field here already
-    # if rotz != 0.:
-    #     grad_k = rotateData(grad_k, anglez=rotz)
-    #     # Switch to matrix form for grad(U) and rotate
-    #     grad_u = grad_u.reshape((-1, 3, 3))
-    #     grad_u = rotateData(grad_u, anglez=rotz).reshape((-1, 9))
-    #     u = rotateData(u, anglez=rotz)
-    #     grad_p = rotateData(grad_p, anglez=rotz)
-    #     # Extend symmetric tensor to full matrix form
-    #     uuprime2 = expandSymmetricTensor(uuprime2).reshape((-1, 3, 3))
-    #     uuprime2 = rotateData(uuprime2, anglez=rotz).reshape((-1, 9))
-    #     uuprime2 = contractSymmetricTensor(uuprime2)
-
-    if save_fields:
-        k, epsilon = k.reshape((-1, 1)), epsilon.reshape((-1, 1))
-        # Reassemble ML field ensemble after possible field rotation
-        mlfield_ensemble = np.hstack((grad_k, k, epsilon, grad_u, u, grad_p, uuprime2))
-        case.savePickleData(time, mlfield_ensemble, filenames=mlfield_ensemble_namefull)
-        case.savePickleData(time, cc, filenames='CC_' + confinedfield_namesub)
-        case.savePickleData(time, mask, filenames='IndexMask_' + confinedfield_namesub)
-
-    del mlfield_ensemble
-# Else if directly read pickle data
-else:
-    if proc_field and proc_invariant:
-        # Load rotated and/or confined field data useful for Machine Learning
-        mlfield_ensemble = case.readPickleData(time, mlfield_ensemble_namefull)
-        grad_k, k = mlfield_ensemble[:, :3], mlfield_ensemble[:, 3]
-        epsilon = mlfield_ensemble[:, 4]
-        grad_u = mlfield_ensemble[:, 5:14]
-        u = mlfield_ensemble[:, 14:17]
-        grad_p = mlfield_ensemble[:, 17:20]
-        uuprime2 = mlfield_ensemble[:, 20:]
-        # Load confined cell centers too
-        cc = case.readPickleData(time, 'CC_' + confinedfield_namesub)
+def confineStage(mlfield_ensemble_all, cc_all, box_l, box_w, box_h, box_orig, rot_z):
+    # Confine the whole field and cell centers by gathering cells in the box, in order
+    idx = confineFieldDomainIndices3D(cc_all, [dict(box_l=box_l, box_w=box_w, box_h=box_h, box_orig=box_orig, rot_z=rot_z)])[0]
+    mask = np.zeros(len(cc_all), dtype=bool)
+    mask[idx] = True
+    return mlfield_ensemble_all[idx], cc_all[idx], mask
 
-        del mlfield_ensemble
 
-
-"""
-Calculate Field Invariants
-"""
-if proc_field and proc_invariant:
+def strainRotationRateStage(mlfield_ensemble, cap):
     # Step 1: non-dimensional strain rate and rotation rate tensor Sij and Rij
     # epsilon is SGS epsilon as it's not necessary to use total epsilon
     # Sij shape (n_samples, 6); Rij shape (n_samples, 9)
     t0 = t.time()
-    sij, rij = getStrainAndRotationRateTensor(grad_u, tke=k, eps=epsilon, cap=cap_sijrij)
+    sij, rij = getStrainAndRotationRateTensor(mlfield_ensemble[:, 5:14], tke=mlfield_ensemble[:, 3], eps=mlfield_ensemble[:, 4], cap=cap)
     t1 = t.time()
     print('\nFinished Sij and Rij calculation in {:.4f} s'.format(t1 - t0))
+    return sij, rij
+
+
+def invariantBasesStage(sij, rij, is_scale):
     # Step 2: 10 invariant bases scaled Tij, shape (n_samples, 6, 10)
     t0 = t.time()
-    tb = getInvariantBases(sij, rij, quadratic_only=False, is_scale=scale_tb)
+    tb = getInvariantBases(sij, rij, quadratic_only=False, is_scale=is_scale)
     t1 = t.time()
     print('\nFinished Tij calculation in {:.4f} s'.format(t1 - t0))
-    # Step 3: anisotropy tensor bij, shape (n_samples, 6)
-    bij = case.getAnisotropyTensorField(uuprime2, use_oldshape=False)
-    del uuprime2
-    # Save tensor invariants related fields
-    if save_fields:
-        case.savePickleData(time, sij, filenames=('Sij_' + confinedfield_namesub))
-        case.savePickleData(time, rij, filenames=('Rij_' + confinedfield_namesub))
-        case.savePickleData(time, tb, filenames=('Tij_' + confinedfield_namesub))
-        case.savePickleData(time, bij, filenames=('bij_' + confinedfield_namesub))
+    return tb
 
-# Else if read invariants data from pickle
-else:
-    if proc_field and proc_field_feature:
-        invariants = case.readPickleData(time, filenames=('Sij_' + confinedfield_namesub,
-                                                            'Rij_' + confinedfield_namesub,
-                                                            'Tij_' + confinedfield_namesub,
-                                                            'bij_' + confinedfield_namesub))
-        sij = invariants['Sij_' + confinedfield_namesub]
-        rij = invariants['Rij_' + confinedfield_namesub]
-        tb = invariants['Tij_' + confinedfield_namesub]
-        bij = invariants['bij_' + confinedfield_namesub]
-        del invariants
 
+def anisotropyStage(mlfield_ensemble):
+    # Step 3: anisotropy tensor bij, shape (n_samples, 6)
+    bij = case.getAnisotropyTensorField(np.ascontiguousarray(mlfield_ensemble[:, 20:]), use_oldshape=False)
+    return bij.astype(mlfield_ensemble.dtype, copy=False)
 
-"""
-Calculate Feature Sets
-"""
-if proc_field and proc_field_feature:
+
+def featureStage(mlfield_ensemble, cc, sij, rij, fs, nu, turblocs):
+    grad_k, k = mlfield_ensemble[:, :3], mlfield_ensemble[:, 3]
+    epsilon = mlfield_ensemble[:, 4]
+    grad_u = mlfield_ensemble[:, 5:14]
+    u = mlfield_ensemble[:, 14:17]
+    grad_p = mlfield_ensemble[:, 17:20]
     if fs == 'grad(TKE)':
         fs_data, labels = getInvariantFeatureSet(sij, rij, grad_k, k=k, eps=epsilon)
     elif fs == 'grad(p)':
@@ -383,56 +345,78 @@ if proc_field and proc_field_feature:
                                                  grad_u=grad_u)
         # 4 additional invariant features
         if '+' in fs:
-            nu *= np.ones_like(k)
+            nu = nu*np.ones_like(k)
             # Radial distance to (closest) turbine center.
             # Don't supply z to get horizontal radial distance
             r = getRadialTurbineDistance(cc[:, 0], cc[:, 1], z=None, turblocs=turblocs)
             fs_data2, labels2 = getSupplementaryInvariantFeatures(k, cc[:, 2], epsilon, nu, sij, r=r)
             fs_data = np.hstack((fs_data, fs_data2))
-            del nu, r, fs_data2
-
-    del sij, rij, grad_k, k, epsilon, grad_u, u, grad_p
-    if save_fields:
-        case.savePickleData(time, fs_data, filenames='FS_' + fs + '_' + confinedfield_namesub)
+            labels += labels2
 
-# Else, directly read feature set data
-else:
-    if proc_field and proc_field_traintest_split: fs_data = case.readPickleData(time, filenames='FS_' + fs + '_' + confinedfield_namesub)
+    return fs_data, np.array(labels)
 
 
-"""
-Train, Test Data Preparation
-"""
-if proc_field and proc_field_traintest_split:
+def trainTestStage(cc, fs_data, bij, tb, mask, sampled, samples_gs, samples_train, seed):
     # X is either RANS or LES invariant features shape (n_samples, n_features)
-    x = fs_data
-    del fs_data
     # y is LES bij shape (n_samples, 6)
-    y = bij
-    del bij
-    # Prepare GS samples of specified size
-    if 'OneTurb' in casename:
-        list_data_gs, _ = splitTrainTestDataList([cc, x, y, tb], test_fraction=0., seed=seed, sample_size=samples_gs)
-        # Prepare training samples of specified size for actual training
-        list_data_train, _ = splitTrainTestDataList([cc, x, y, tb], test_fraction=0., seed=seed, sample_size=samples_train)
+    list_data_test = [cc, fs_data, bij, tb, mask]
+    if not sampled:
+        return list_data_test
 
-    list_data_test = [cc, x, y, tb, mask]
-    del cc, x, y, tb
+    # Prepare GS samples of specified size
+    list_data_gs, _ = splitTrainTestDataList([cc, fs_data, bij, tb], test_fraction=0., seed=seed, sample_size=samples_gs)
+    # Prepare training samples of specified size for actual training
+    list_data_train, _ = splitTrainTestDataList([cc, fs_data, bij, tb], test_fraction=0., seed=seed, sample_size=samples_train)
+    return list_data_test, list_data_gs, list_data_train
+
+
+if proc_field:
+    pipeline = Pipeline(case.result_paths[time] + checkpoint_folder, save=save_fields, force=force_stages)
+    confine_kwargs = dict(box_l=boxl, box_w=boxw, box_h=boxh, box_orig=boxorig, rot_z=rotbox) if confine else None
+    field_times = (str(time),) if average_times is None else tuple(str(time_i) for time_i in average_times)
+    # Raw fields only change when their files change
+    if decomposed:
+        # Cell centers and cell addressing per processor are read as well
+        field_files = [file for time_i in field_times for field in tuple(fields) + (cc_fieldname,)
+                       for file in glob(casedir + '/' + casename + '/processor*/' + time_i + '/' + field)]
+        field_files += glob(casedir + '/' + casename + '/processor*/constant/polyMesh/cellProcAddressing')
+        pipeline.addStage('fields', readFieldStage, ('mlfield_ensemble', 'cc', 'mask'), files=sorted(field_files),
+                          params=dict(fields=fields, grad_kw=grad_kw, decomposed=True, dtype=dtype, times=field_times,
+                                      confine_kwargs=confine_kwargs, cc_fieldname=cc_fieldname))
+    else:
+        field_files = [casedir + '/' + casename + '/' + field_foldername + '/' + time_i + '/' + field for time_i in field_times for field in fields]
+        # Cell centers of time are read as well
+        field_files += sorted(glob(casedir + '/' + casename + '/' + field_foldername + '/' + str(time) + '/cc*'))
+        # Only whether to confine matters here so that a changed box only recomputes the confine stage onwards
+        pipeline.addStage('fields', readFieldStage, ('mlfield_ensemble_all', 'cc_all') if confine else ('mlfield_ensemble', 'cc', 'mask'),
+                          files=field_files, params=dict(fields=fields, grad_kw=grad_kw, decomposed=False, dtype=dtype, times=field_times,
+                                                         confined=confine))
+        if confine:
+            pipeline.addStage('confine', confineStage, ('mlfield_ensemble', 'cc', 'mask'), inputs=('mlfield_ensemble_all', 'cc_all'),
+                              params=confine_kwargs)
+
+    # Invariant and feature stages are row-wise thus can be streamed in chunks
+    pipeline.addStage('sijrij', strainRotationRateStage, ('sij', 'rij'), inputs=('mlfield_ensemble',), params=dict(cap=cap_sijrij),
+                      chunk_size=chunk_size, n_jobs=n_jobs)
+    pipeline.addStage('tij', invariantBasesStage, 'tb', inputs=('sij', 'rij'), params=dict(is_scale=scale_tb),
+                      chunk_size=chunk_size, n_jobs=n_jobs)
+    pipeline.addStage('bij', anisotropyStage, 'bij', inputs=('mlfield_ensemble',), chunk_size=chunk_size, n_jobs=n_jobs)
+    pipeline.addStage('features', featureStage, ('fs_data', 'labels'), inputs=('mlfield_ensemble', 'cc', 'sij', 'rij'),
+                      params=dict(fs=fs, nu=nu, turblocs=turblocs), chunk_size=chunk_size, n_jobs=n_jobs, static_outputs=('labels',))
+    # GS and train samples only for the single turbine case
+    sampled = 'OneTurb' in casename
+    pipeline.addStage('split', trainTestStage, ('list_data_test', 'list_data_gs', 'list_data_train') if sampled else 'list_data_test',
+                      inputs=('cc', 'fs_data', 'bij', 'tb', 'mask'),
+                      params=dict(sampled=sampled, samples_gs=samples_gs, samples_train=samples_train, seed=seed))
+    # Publish train and test data under fixed names for training and prediction scripts
     if save_fields:
-        if 'OneTurb' in casename:
-            # Extra tuple treatment to list_data_* that's already a tuple since savePickleData thinks tuple means multiple files
-            case.savePickleData(time, (list_data_train,), 'list_data_train_' + confinedfield_namesub)
-            case.savePickleData(time, (list_data_gs,), 'list_data_GS_' + confinedfield_namesub)
-
-        case.savePickleData(time, (list_data_test,), 'list_data_test_' + confinedfield_namesub)
+        pipeline.publish('list_data_test', case.result_paths[time], 'list_data_test_' + confinedfield_namesub)
+        if sampled:
+            pipeline.publish('list_data_train', case.result_paths[time], 'list_data_train_' + confinedfield_namesub)
+            pipeline.publish('list_data_gs', case.result_paths[time], 'list_data_GS_' + confinedfield_namesub)
 
-
-# Else if directly read GS, train and test data from pickle data
-else:
-    if proc_field:
-        list_data_gs = case.readPickleData(time, 'list_data_GS_' + confinedfield_namesub)
-        list_data_train = case.readPickleData(time, 'list_data_train_' + confinedfield_namesub)
-        list_data_test = case.readPickleData(time, 'list_data_test_' + confinedfield_namesub)
+    else:
+        pipeline.run(*pipeline.stages['split'].outputs)
 
 
 """
@@ -548,17 +532,17 @@ if proc_slice:
         bij = case.getAnisotropyTensorField(uuprime2, use_oldshape=False)
         # Save tensor invariants related fields
         if save_fields:
-            case.savePickleData(time, sij, filenames=('Sij_' + slice_type))
-            case.savePickleData(time, rij, filenames=('Rij_' + slice_type))
-            case.savePickleData(time, tb, filenames=('Tij_' + slice_type))
-            case.savePickleData(time, bij, filenames=('bij_' + slice_type))
+            saveArrayData(case.result_paths[time], sij, 'Sij_' + slice_type)
+            saveArrayData(case.result_paths[time], rij, 'Rij_' + slice_type)
+            saveArrayData(case.result_paths[time], tb, 'Tij_' + slice_type)
+            saveArrayData(case.result_paths[time], bij, 'bij_' + slice_type)
             # Visualization related slice data
-            case.savePickleData(time, k, 'TKE_' + slice_type)
-            case.savePickleData(time, grad_u, 'grad(U)_' + slice_type)
+            saveArrayData(case.result_paths[time], k, 'TKE_' + slice_type)
+            saveArrayData(case.result_paths[time], grad_u, 'grad(U)_' + slice_type)
             # case.savePickleData(time, g_tke, 'G_' + slice_type)
             # case.savePickleData(time, div_devr, 'div(dev(R))_' + slice_type)
             # case.savePickleData(time, ddevr_dj, 'ddev(Rab)_db_' + slice_type)
-            case.savePickleData(time, list_slicecoor[slice_type], filenames='CC_' + slice_type)
+            saveArrayData(case.result_paths[time], list_slicecoor[slice_type], 'CC_' + slice_type)
 
         # Calculate features
         if fs == 'grad(TKE)':
@@ -576,11 +560,12 @@ if proc_slice:
                 r = getRadialTurbineDistance(list_slicecoor[slice_type][:, 0], list_slicecoor[slice_type][:, 1], z=None, turblocs=turblocs)
                 fs_data2, labels2 = getSupplementaryInvariantFeatures(k, list_slicecoor[slice_type][:, 2], epsilon, nulist, sij, r=r)
                 fs_data = np.hstack((fs_data, fs_data2))
+                labels += labels2
                 del nulist, r, fs_data2
 
         # If only feature set 1 used for ML input, then do train test data split here
         if save_fields:
-            case.savePickleData(time, fs_data, filenames=('FS_' + fs + '_' + slice_type))
+            saveArrayData(case.result_paths[time], fs_data, 'FS_' + fs + '_' + slice_type, labels=labels)
 
         # Test data preparation
         x = fs_data
@@ -589,7 +574,7 @@ if proc_slice:
         # Prepare test data of specified size into an ensemble
         list_data_test = [list_slicecoor[slice_type], x, y, tb]
         if save_fields:
-            case.savePickleData(time, (list_data_test,), 'list_data_test_' + slice_type)
+            saveArrayData(case.result_paths[time], list_data_test, 'list_data_test_' + slice_type)
 
 
 """
@@ -653,17 +638,17 @@ if proc_set:
         tb = getInvariantBases(sij, rij, quadratic_only=False, is_scale=scale_tb)
         bij = case.getAnisotropyTensorField(uuprime2, use_oldshape=False)
         if save_fields:
-            case.savePickleData(time, sij, filenames=('Sij_' + set_type))
-            case.savePickleData(time, rij, filenames=('Rij_' + set_type))
-            case.savePickleData(time, tb, filenames=('Tij_' + set_type))
-            case.savePickleData(time, bij, filenames=('bij_' + set_type))
+            saveArrayData(case.result_paths[time], sij, 'Sij_' + set_type)
+            saveArrayData(case.result_paths[time], rij, 'Rij_' + set_type)
+            saveArrayData(case.result_paths[time], tb, 'Tij_' + set_type)
+            saveArrayData(case.result_paths[time], bij, 'bij_' + set_type)
             # Save (purely) visualization related sets
-            case.savePickleData(time, k, 'TKE_' + set_type)
-            case.savePickleData(time, grad_u, 'grad(U)_' + set_type)
-            case.savePickleData(time, g_tke, 'G_' + set_type)
-            case.savePickleData(time, div_devr, 'div(dev(R))_' + set_type)
-            case.savePickleData(time, ddevr_dj, 'ddev(Rab)_db_' + set_type)
-            case.savePickleData(time, distance, filenames='CC_' + set_type)
+            saveArrayData(case.result_paths[time], k, 'TKE_' + set_type)
+            saveArrayData(case.result_paths[time], grad_u, 'grad(U)_' + set_type)
+            saveArrayData(case.result_paths[time], g_tke, 'G_' + set_type)
+            saveArrayData(case.result_paths[time], div_devr, 'div(dev(R))_' + set_type)
+            saveArrayData(case.result_paths[time], ddevr_dj, 'ddev(Rab)_db_' + set_type)
+            saveArrayData(case.result_paths[time], distance, 'CC_' + set_type)
 
         # Calculate features
         if fs == 'grad(TKE)':
@@ -760,17 +745,18 @@ if proc_set:
                 r = getRadialTurbineDistance(xline, yline, z=None, turblocs=turblocs)
                 fs_data2, labels2 = getSupplementaryInvariantFeatures(k, zline, epsilon, nulist, sij, r=r)
                 fs_data = np.hstack((fs_data, fs_data2))
+                labels += labels2
                 del nulist, r, fs_data2
 
         if save_fields:
-            case.savePickleData(time, fs_data, filenames=('FS_' + fs + '_' + set_type))
+            saveArrayData(case.result_paths[time], fs_data, 'FS_' + fs + '_' + set_type, labels=labels)
 
         x = fs_data
         y = bij
         del bij
         list_data_test = [distance, x, y, tb]
         if save_fields:
-            case.savePickleData(time, (list_data_test,), 'list_data_test_' + set_type)
+            saveArrayData(case.result_paths[time], list_data_test, 'list_data_test_' + set_type)
 
 
 
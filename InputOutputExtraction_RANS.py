@@ -4,6 +4,8 @@ import sys
 # See https://github.com/YuyangL/SOWFA-PostProcess
 sys.path.append('/home/yluan/Documents/SOWFA PostProcessing/SOWFA-Postprocess')
 from FieldData import FieldData
+from DataStore import saveArrayData, readArrayData
+from FoamData import readFieldData
 from SliceData import SliceProperties
 from SetData import SetProperties
 from Preprocess.Tensor import processReynoldsStress, expandSymmetricTensor, contractSymmetricTensor, \
@@ -56,6 +58,8 @@ casedir_les = '/media/yluan'  # str
 # Which time to extract input and output for ML
 time = '10000'  # str/float/int or 'latestTime'
 time_les = 'latestTime'  # str/float/int or 'latestTime'
+# Folder of the case containing time folders of raw fields
+field_foldername = 'Fields'  # str
 # Interpolation method when interpolating mesh grids
 interp_method = "nearest"  # "nearest", "linear", "cubic"
 # What keyword does the gradient fields contain
@@ -214,7 +218,7 @@ Read and Process Raw Field Data
 """
 if proc_field and proc_field_raw:
     # Read raw field data specified in fields
-    field_data = case.readFieldData()
+    field_data = readFieldData(casedir + '/' + casename + '/' + field_foldername, case.times[0], fields)
     # field_data_les = case_les.readFieldData()
     # Assign fields to their corresponding variable
     grad_u, u = field_data['grad_U'], field_data['U']
@@ -297,16 +301,16 @@ if proc_field and proc_field_raw:
         k, epsilon = k.reshape((-1, 1)), epsilon.reshape((-1, 1))
         # Reassemble ML field ensemble after possible field rotation
         mlfield_ensemble = np.hstack((grad_k, k, epsilon, grad_u, u, grad_p, bij_les))
-        case.savePickleData(time, mlfield_ensemble, filenames=mlfield_ensemble_namefull)
-        case.savePickleData(time, cc, filenames='CC_' + confinedfield_namesub)
-        case.savePickleData(time, mask, filenames='IndexMask_' + confinedfield_namesub)
+        saveArrayData(case.result_paths[time], mlfield_ensemble, mlfield_ensemble_namefull)
+        saveArrayData(case.result_paths[time], cc, 'CC_' + confinedfield_namesub)
+        saveArrayData(case.result_paths[time], mask, 'IndexMask_' + confinedfield_namesub)
         
     del mlfield_ensemble
 # Else if directly read pickle data
 else:
     if proc_field and proc_invariant:
         # Load rotated and/or confined field data useful for Machine Learning
-        mlfield_ensemble = case.readPickleData(time, mlfield_ensemble_namefull)
+        mlfield_ensemble = readArrayData(case.result_paths[time], mlfield_ensemble_namefull)
         grad_k, k = mlfield_ensemble[:, :3], mlfield_ensemble[:, 3]
         epsilon = mlfield_ensemble[:, 4]
         grad_u = mlfield_ensemble[:, 5:14]
@@ -314,7 +318,7 @@ else:
         grad_p = mlfield_ensemble[:, 17:20]
         bij_les = mlfield_ensemble[:, 20:]
         # Load confined cell centers too
-        cc = case.readPickleData(time, 'CC_' + confinedfield_namesub)
+        cc = readArrayData(case.result_paths[time], 'CC_' + confinedfield_namesub)
 
         del mlfield_ensemble
 
@@ -338,15 +342,15 @@ if proc_field and proc_invariant:
     bij = bij_les
     # Save tensor invariants related fields
     if save_fields:
-        case.savePickleData(time, sij, filenames=('Sij_' + confinedfield_namesub))
-        case.savePickleData(time, rij, filenames=('Rij_' + confinedfield_namesub))
-        case.savePickleData(time, tb, filenames=('Tij_' + confinedfield_namesub))
-        case.savePickleData(time, bij, filenames=('bij_' + confinedfield_namesub))
+        saveArrayData(case.result_paths[time], sij, 'Sij_' + confinedfield_namesub)
+        saveArrayData(case.result_paths[time], rij, 'Rij_' + confinedfield_namesub)
+        saveArrayData(case.result_paths[time], tb, 'Tij_' + confinedfield_namesub)
+        saveArrayData(case.result_paths[time], bij, 'bij_' + confinedfield_namesub)
 
 # Else if read invariants data from pickle
 else:
     if proc_field and proc_field_feature:
-        invariants = case.readPickleData(time, filenames=('Sij_' + confinedfield_namesub,
+        invariants = readArrayData(case.result_paths[time], ('Sij_' + confinedfield_namesub,
                                                           'Rij_' + confinedfield_namesub,
                                                           'Tij_' + confinedfield_namesub,
                                                           'bij_' + confinedfield_namesub))
@@ -369,15 +373,16 @@ if proc_field and proc_field_feature:
     r = getRadialTurbineDistance(cc[:, 0], cc[:, 1], z=None, turblocs=turblocs)
     fs_data2, labels2 = getSupplementaryInvariantFeatures(k, cc[:, 2], epsilon, nu, sij, r=r)
     fs_data = np.hstack((fs_data, fs_data2))
+    labels += labels2
     del nu, r, fs_data2
     del sij, rij, grad_k, k, epsilon, grad_u, u, grad_p
     # If only feature set 1 used for ML input, then do train test data split here
     if save_fields:
-        case.savePickleData(time, fs_data, filenames='FS_' + fs + '_' + confinedfield_namesub)
+        saveArrayData(case.result_paths[time], fs_data, 'FS_' + fs + '_' + confinedfield_namesub, labels=labels)
 
 # Else, directly read feature set data
 else:
-    if proc_field and proc_field_traintest_split: fs_data = case.readPickleData(time, filenames='FS_' + fs + '_' + confinedfield_namesub)
+    if proc_field and proc_field_traintest_split: fs_data = readArrayData(case.result_paths[time], 'FS_' + fs + '_' + confinedfield_namesub)
 
 
 """
@@ -399,18 +404,17 @@ if proc_field and proc_field_traintest_split:
     del cc, x, y, tb
     if save_fields:
         if 'OneTurb' in casename:
-            # Extra tuple treatment to list_data_* that's already a tuple since savePickleData thinks tuple means multiple files
-            case.savePickleData(time, (list_data_train,), 'list_data_train_' + confinedfield_namesub)
-            case.savePickleData(time, (list_data_gs,), 'list_data_GS_' + confinedfield_namesub)
+            saveArrayData(case.result_paths[time], list_data_train, 'list_data_train_' + confinedfield_namesub)
+            saveArrayData(case.result_paths[time], list_data_gs, 'list_data_GS_' + confinedfield_namesub)
 
-        case.savePickleData(time, (list_data_test,), 'list_data_test_' + confinedfield_namesub)
+        saveArrayData(case.result_paths[time], list_data_test, 'list_data_test_' + confinedfield_namesub)
 
 # Else if directly read GS, train and test data from pickle data
 else:
     if proc_field:
-        list_data_gs = case.readPickleData(time, 'list_data_GS_' + confinedfield_namesub)
-        list_data_train = case.readPickleData(time, 'list_data_train_' + confinedfield_namesub)
-        list_data_test = case.readPickleData(time, 'list_data_test_' + confinedfield_namesub)
+        list_data_gs = readArrayData(case.result_paths[time], 'list_data_GS_' + confinedfield_namesub)
+        list_data_train = readArrayData(case.result_paths[time], 'list_data_train_' + confinedfield_namesub)
+        list_data_test = readArrayData(case.result_paths[time], 'list_data_test_' + confinedfield_namesub)
 
 
 """
@@ -504,11 +508,11 @@ if proc_slice:
         # print('\nFinished getInvariantBasisCoefficientsField in {:.4f} s'.format(t1 - t0))
         # Save tensor invariants related fields
         if save_fields:
-            case.savePickleData(time, sij, filenames=('Sij_' + slice_type))
-            case.savePickleData(time, rij, filenames=('Rij_' + slice_type))
-            case.savePickleData(time, tb, filenames=('Tij_' + slice_type))
-            case.savePickleData(time, bij, filenames=('bij_' + slice_type))
-            case.savePickleData(time, list_slicecoor[slice_type], filenames='CC_' + slice_type)
+            saveArrayData(case.result_paths[time], sij, 'Sij_' + slice_type)
+            saveArrayData(case.result_paths[time], rij, 'Rij_' + slice_type)
+            saveArrayData(case.result_paths[time], tb, 'Tij_' + slice_type)
+            saveArrayData(case.result_paths[time], bij, 'bij_' + slice_type)
+            saveArrayData(case.result_paths[time], list_slicecoor[slice_type], 'CC_' + slice_type)
 
         # Calculate features
         if fs == 'grad(TKE)':
@@ -528,11 +532,12 @@ if proc_slice:
                 fs_data2, labels2 = getSupplementaryInvariantFeatures(k, list_slicecoor[slice_type][:, 2], epsilon,
                                                                       nulist, sij, r=r)
                 fs_data = np.hstack((fs_data, fs_data2))
+                labels += labels2
                 del nulist, r, fs_data2
 
         # If only feature set 1 used for ML input, then do train test data split here
         if save_fields:
-            case.savePickleData(time, fs_data, filenames=('FS_' + fs + '_' + slice_type))
+            saveArrayData(case.result_paths[time], fs_data, 'FS_' + fs + '_' + slice_type, labels=labels)
 
         # Test data preparation
         x = fs_data
@@ -542,7 +547,7 @@ if proc_slice:
         list_data_test, _ = splitTrainTestDataList([list_slicecoor[slice_type], x, y, tb], test_fraction=0., seed=seed,
                                                    sample_size=None)
         if save_fields:
-            case.savePickleData(time, (list_data_test,), 'list_data_test_' + slice_type)
+            saveArrayData(case.result_paths[time], list_data_test, 'list_data_test_' + slice_type)
 
 
 """
@@ -597,11 +602,11 @@ if proc_set:
         tb = getInvariantBases(sij, rij, quadratic_only=False, is_scale=scale_tb)
         bij = case.getAnisotropyTensorField(uuprime2, use_oldshape=False)
         if save_fields:
-            case.savePickleData(time, sij, filenames=('Sij_' + set_type))
-            case.savePickleData(time, rij, filenames=('Rij_' + set_type))
-            case.savePickleData(time, tb, filenames=('Tij_' + set_type))
-            case.savePickleData(time, bij, filenames=('bij_' + set_type))
-            case.savePickleData(time, distance, filenames='CC_' + set_type)
+            saveArrayData(case.result_paths[time], sij, 'Sij_' + set_type)
+            saveArrayData(case.result_paths[time], rij, 'Rij_' + set_type)
+            saveArrayData(case.result_paths[time], tb, 'Tij_' + set_type)
+            saveArrayData(case.result_paths[time], bij, 'bij_' + set_type)
+            saveArrayData(case.result_paths[time], distance, 'CC_' + set_type)
 
         if fs == 'grad(TKE)':
             fs_data, labels = getInvariantFeatureSet(sij, rij, grad_k, k=k, eps=epsilon)
@@ -686,17 +691,18 @@ if proc_set:
                 r = getRadialTurbineDistance(xline, yline, z=None, turblocs=turblocs)
                 fs_data2, labels2 = getSupplementaryInvariantFeatures(k, zline, epsilon, nulist, sij, r=r)
                 fs_data = np.hstack((fs_data, fs_data2))
+                labels += labels2
                 del nulist, r, fs_data2
 
         if save_fields:
-            case.savePickleData(time, fs_data, filenames=('FS_' + fs + '_' + set_type))
+            saveArrayData(case.result_paths[time], fs_data, 'FS_' + fs + '_' + set_type, labels=labels)
 
         x = fs_data
         y = bij
         list_data_test, _ = splitTrainTestDataList([distance, x, y, tb], test_fraction=0., seed=seed,
                                                    sample_size=None)
         if save_fields:
-            case.savePickleData(time, (list_data_test,), 'list_data_test_' + set_type)
+            saveArrayData(case.result_paths[time], list_data_test, 'list_data_test_' + set_type)
 
 
 
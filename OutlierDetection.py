@@ -3,11 +3,12 @@ import sys
 # See https://github.com/YuyangL/SOWFA-PostProcess
 sys.path.append('/home/yluan/Documents/SOWFA PostProcessing/SOWFA-Postprocess')
 from FieldData import FieldData
+from DataStore import readArrayData
 from SliceData import SliceProperties
 from Postprocess.OutlierAndNoveltyDetection import InputOutlierDetection
 from Preprocess.Tensor import processReynoldsStress, getBarycentricMapData, expandSymmetricTensor, \
     contractSymmetricTensor
-from Utility import interpolateGridData
+from Utility import GridInterpolator
 from joblib import load, dump
 import time as t
 from PlottingTool import BaseFigure, Plot2D, Plot2D_Image, PlotImageSlices3D
@@ -120,7 +121,7 @@ else:
 # Load trained regressor
 regressor = load(ml_path + estimator_name + '/' + estimator_name + '_Confined2' + '.joblib')
 # Load ALM_N_H_OneTurb GS data
-list_data = case.readPickleData(time, 'list_data_GS_Confined2')
+list_data = readArrayData(case.result_paths[time], 'list_data_GS_Confined2')
 cc = list_data[0]
 ccx, ccy, ccz = cc[:, 0], cc[:, 1], cc[:, 2]
 x, y, tb = list_data[1:4]
@@ -131,7 +132,7 @@ x_test_out, y_test_out, anomaly_idx_test = {}, {}, {}
 list_ccx, list_ccy, list_ccz = [], [], []
 list_val, list_val_out = [], []
 for i, slice in enumerate(slicenames):        
-    list_data_test = case_test.readPickleData(time_test, 'list_data_test_' + slice)
+    list_data_test = readArrayData(case_test.result_paths[time_test], 'list_data_test_' + slice)
     cc_test = list_data_test[0]
     ccx_test, ccy_test, ccz_test = cc_test[:, 0], cc_test[:, 1], cc_test[:, 2]
     x_test, y_test, tb_test = list_data_test[1:4]
@@ -216,12 +217,11 @@ for i, slice in enumerate(slicenames):
     print('\nFinished getting Barycentric map data in {:.4f} s'.format(t1 - t0))
     
     t0 = t.time()
-    ccx_test_mesh, ccy_test_mesh, _, rgb_bary_test_mesh = interpolateGridData(ccx_test, ccy_test, rgb_bary_test,
-                                                                              mesh_target=uniform_mesh_size,
-                                                                              interp=interp_method, fill_val=89/255.)
-    _, _, _, rgb_bary_test_out_mesh = interpolateGridData(ccx_test, ccy_test, rgb_bary_test_out,
-                                                          mesh_target=uniform_mesh_size, interp=interp_method,
-                                                          fill_val=89/255.)
+    # Triangulation and interpolation weights are built once and shared by both RGB fields
+    interpolator = GridInterpolator(ccx_test, ccy_test, mesh_target=uniform_mesh_size, interp=interp_method, fill_val=89/255.)
+    ccx_test_mesh, ccy_test_mesh = interpolator.xmesh, interpolator.ymesh
+    rgb_bary_test_mesh = interpolator(rgb_bary_test)
+    rgb_bary_test_out_mesh = interpolator(rgb_bary_test_out)
     # Individually make z a mesh grid even though it's constant per slice, just to make image slice plotting functioning
     _, z2d = np.mgrid[0:1:ccx_test_mesh.shape[0]*1j, (height[i] - 1e-9):(height[i] + 1e-9):ccx_test_mesh.shape[1]*1j]
     # ccx_train_mesh, ccy_train_mesh, _, rgb_bary_train_mesh = interpolateGridData(ccx_train, ccy_train, rgb_bary_train,
@@ -0,0 +1,335 @@
+"""
+Stage Graph With Content-Hashed Checkpoints
+"""
+import numpy as np
+import os, re, hashlib, shutil
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from DataStore import saveArrayData, readArrayData, readArrayManifest, linkArrayData, openArrayData, closeArrayData
+
+# Chunked stage being run, (func, inputs, params, output files), inherited by forked workers instead of pickled
+_CHUNK_JOB = None
+
+
+def _updateCodeHash(sha, code):
+    # Hash bytecode and constants, recursing into nested functions since their repr contains memory addresses
+    sha.update(code.co_code)
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _updateCodeHash(sha, const)
+        else:
+            sha.update(repr(const).encode())
+
+
+def _runChunk(bounds):
+    """
+    Compute one chunk of rows of the chunked stage in _CHUNK_JOB and write it to the output files in place.
+    """
+    func, inputs, params, files = _CHUNK_JOB
+    start, stop = bounds
+    kwargs = {}
+    for input, val in inputs.items():
+        # Memory-mapped inputs are given by file name and mapped afresh per chunk
+        # so that pages of earlier chunks don't stay resident
+        kwargs[input] = np.array(np.load(val, mmap_mode='r')[start:stop]) if isinstance(val, str) else val[start:stop]
+
+    vals = func(**kwargs, **params)
+    vals = (vals,) if len(files) == 1 else vals
+    for file, val in zip(files, vals):
+        if file is not None:
+            out = np.load(file, mmap_mode='r+')
+            out[start:stop] = val
+            out.flush()
+            del out
+
+
+class Stage:
+    """
+    One step of a Pipeline, computing outputs from outputs of upstream stages and parameters.
+    """
+    def __init__(self, name, func, outputs, inputs=(), params=None, files=(), chunk_size=None, n_jobs=1, static_outputs=()):
+        """
+        :param name: Unique stage name, also prefix of its checkpoints.
+        :type name: str
+        :param func: Function called as func(**inputs, **params), returning one output or a tuple of outputs in outputs order.
+        Every output has to be an array or list/tuple of arrays that DataStore.saveArrayData() can save.
+        Inputs must not be modified in place, so that inputs returned as is can be linked to their checkpoints.
+        :type func: callable
+        :param outputs: Names of outputs.
+        :type outputs: str or list/tuple(str)
+        :param inputs: Names of outputs of upstream stages passed to func as keyword arguments.
+        :type inputs: list/tuple(str), optional (default=())
+        :param params: Parameters passed to func as keyword arguments and hashed by their repr().
+        :type params: dict or None, optional (default=None)
+        :param files: Files read by func, e.g. raw fields, hashed by path, size and modification time.
+        :type files: list/tuple(str), optional (default=())
+        :param chunk_size: If not None, func has to be row-wise and is called on chunks of chunk_size rows of all inputs,
+        writing every chunk of outputs straight into disk-backed arrays so that memory is bounded by chunk_size.
+        Outputs are then always written to checkpoints. Results don't depend on chunk_size thus it's not hashed.
+        :type chunk_size: int or None, optional (default=None)
+        :param n_jobs: Number of processes computing chunks when chunk_size is not None. If -1, use number of CPUs.
+        :type n_jobs: int, optional (default=1)
+        :param static_outputs: Outputs of a chunked stage that aren't row-wise, e.g. feature labels, taken from the first chunk.
+        :type static_outputs: list/tuple(str), optional (default=())
+        """
+        self.name, self.func = name, func
+        self.outputs = (outputs,) if isinstance(outputs, str) else tuple(outputs)
+        self.inputs = tuple(inputs)
+        self.params = {} if params is None else dict(params)
+        self.files = tuple(files)
+        self.chunk_size, self.static_outputs = chunk_size, tuple(static_outputs)
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else max(n_jobs, 1)
+
+
+class Pipeline:
+    """
+    Directed acyclic graph of stages, e.g. read fields -> confine -> Sij/Rij -> Tij -> bij -> features -> split.
+    Every stage is keyed by a hash of its parameters, function code, input files, and keys of its upstream stages;
+    its outputs are checkpointed with DataStore under that key, and older checkpoints of the same output are removed.
+    Arrays that a stage passes through from its inputs unchanged are hard-linked from upstream checkpoints instead of written again.
+    Checkpointed outputs are kept memory-mapped rather than in RAM, and outputs are dropped once every stage using them has run.
+    Thus changing one parameter only recomputes the stage using it and everything downstream,
+    while any other stage is read from its checkpoint, or not touched at all if nothing downstream needs it.
+    """
+    def __init__(self, checkpoint_dir, save=True, force=()):
+        """
+        :param checkpoint_dir: Directory of checkpoints.
+        :type checkpoint_dir: str
+        :param save: Whether to save checkpoints of computed stages.
+        :type save: bool, optional (default=True)
+        :param force: Names of stages to recompute regardless of checkpoints. Downstream stages are recomputed as well.
+        :type force: list/tuple(str), optional (default=())
+        """
+        self.checkpoint_dir, self.save, self.force = checkpoint_dir, save, tuple(force)
+        self.stages, self.producers = {}, {}
+        # Keys and outputs of stages resolved so far, .npy files of checkpointed outputs, and stages run or read
+        self._keys, self._values, self._files, self._done = {}, {}, {}, set()
+
+    def addStage(self, name, func, outputs, inputs=(), params=None, files=(), chunk_size=None, n_jobs=1, static_outputs=()):
+        """
+        Add a Stage, see Stage for parameters. Upstream stages have to be added first.
+        """
+        stage = Stage(name, func, outputs, inputs, params, files, chunk_size, n_jobs, static_outputs)
+        if chunk_size is not None and len(stage.inputs) == 0:
+            raise ValueError("\nChunked stage " + name + " needs inputs to chunk!\n")
+
+        if name in self.stages:
+            raise ValueError("\nStage " + name + " already exists!\n")
+
+        for input in stage.inputs:
+            if input not in self.producers:
+                raise ValueError("\nInput " + input + " of stage " + name + " is not an output of any earlier stage!\n")
+
+        for output in stage.outputs:
+            if output in self.producers:
+                raise ValueError("\nOutput " + output + " of stage " + name + " is already produced by stage " + self.producers[output] + "!\n")
+
+            self.producers[output] = name
+
+        self.stages[name] = stage
+
+    def getKey(self, name):
+        """
+        Key of a stage, hash of its parameters, function code, input files, and keys of upstream stages.
+
+        :param name: Stage name.
+        :type name: str
+
+        :return: Hexadecimal key.
+        :rtype: str
+        """
+        if name not in self._keys:
+            stage = self.stages[name]
+            sha = hashlib.sha1()
+            sha.update(name.encode())
+            sha.update(repr(sorted(stage.params.items())).encode())
+            code = getattr(stage.func, '__code__', None)
+            if code is not None:
+                _updateCodeHash(sha, code)
+
+            for file in stage.files:
+                stat = os.stat(file)
+                sha.update(repr((file, stat.st_size, stat.st_mtime_ns)).encode())
+
+            for input in stage.inputs:
+                sha.update((input + self.getKey(self.producers[input])).encode())
+
+            # A forced stage gets a unique key so that it and everything downstream are recomputed
+            if name in self.force:
+                sha.update(os.urandom(16))
+
+            self._keys[name] = sha.hexdigest()[:16]
+
+        return self._keys[name]
+
+    def _checkpointName(self, name, output):
+        return name + '_' + output + '_' + self.getKey(name)
+
+    def isCached(self, name):
+        """
+        Whether all outputs of a stage have a checkpoint with its current key.
+
+        :param name: Stage name.
+        :type name: str
+
+        :return: Whether stage is cached.
+        :rtype: bool
+        """
+        return all(readArrayManifest(self.checkpoint_dir, self._checkpointName(name, output)) is not None
+                   for output in self.stages[name].outputs)
+
+    def get(self, output):
+        """
+        Get an output, reading its stage checkpoint if cached, otherwise computing its stage,
+        which recursively gets only the upstream outputs that are needed.
+
+        :param output: Output name.
+        :type output: str
+
+        :return: Output, memory-mapped if checkpointed.
+        :rtype: np.ndarray or list/tuple(np.ndarray)
+        """
+        if output not in self._values:
+            name = self.producers[output]
+            stage = self.stages[name]
+            if self.isCached(name):
+                print('\nStage {0} is up to date, reading its checkpoint'.format(name))
+                for out in stage.outputs:
+                    self._values[out] = readArrayData(self.checkpoint_dir, self._checkpointName(name, out))
+                    self._files[out] = [entry['file'] for entry in readArrayManifest(self.checkpoint_dir, self._checkpointName(name, out))['arrays']]
+            elif stage.chunk_size is not None:
+                self._runChunked(name)
+            else:
+                kwargs = {input: self.get(input) for input in stage.inputs}
+                kwargs.update(stage.params)
+                print('\nRunning stage {0}...'.format(name))
+                vals = stage.func(**kwargs)
+                vals = (vals,) if len(stage.outputs) == 1 else vals
+                for out, val in zip(stage.outputs, vals):
+                    self._values[out] = val
+                    if self.save:
+                        saveArrayData(self.checkpoint_dir, val, self._checkpointName(name, out),
+                                      links=self._passedFiles(val, stage.inputs))
+                        self._addCheckpoint(name, out)
+                        # Keep the checkpoint memory-mapped instead of the result in RAM
+                        self._values[out] = readArrayData(self.checkpoint_dir, self._checkpointName(name, out))
+
+                del vals, val, kwargs
+
+            self._done.add(name)
+            self._evictInputs(name)
+
+        return self._values[output]
+
+    def _runChunked(self, name):
+        # Run a chunked stage, writing row-wise outputs chunk by chunk into disk-backed checkpoints
+        global _CHUNK_JOB
+        stage = self.stages[name]
+        inputs = {input: self.get(input) for input in stage.inputs}
+        n_rows = len(inputs[stage.inputs[0]])
+        bounds = [(start, min(start + stage.chunk_size, n_rows)) for start in range(0, n_rows, stage.chunk_size)] or [(0, 0)]
+        print('\nRunning stage {0} in {1} chunk(s) of {2} rows with {3} process(es)...'.format(name, len(bounds), stage.chunk_size,
+                                                                                          min(stage.n_jobs, len(bounds))))
+        # First chunk tells shapes and dtypes of outputs
+        start, stop = bounds[0]
+        vals = stage.func(**{input: val[start:stop] for input, val in inputs.items()}, **stage.params)
+        vals = (vals,) if len(stage.outputs) == 1 else vals
+        arrays = {}
+        for out, val in zip(stage.outputs, vals):
+            if out in stage.static_outputs:
+                self._values[out] = val
+                saveArrayData(self.checkpoint_dir, val, self._checkpointName(name, out))
+                self._addCheckpoint(name, out)
+            else:
+                arrays[out] = openArrayData(self.checkpoint_dir, self._checkpointName(name, out), (n_rows,) + np.shape(val)[1:], np.asarray(val).dtype)
+                arrays[out][start:stop] = val
+
+        del vals
+        files = [arrays[out].filename if out in arrays else None for out in stage.outputs]
+        # Read-only memory-mapped inputs are passed by file name, copy-on-write ones may have been modified in RAM thus not
+        inputs = {input: val.filename if isinstance(val, np.memmap) and val.filename is not None and val.mode == 'r' else val
+                  for input, val in inputs.items()}
+        _CHUNK_JOB = (stage.func, inputs, stage.params, files)
+        try:
+            if stage.n_jobs == 1 or len(bounds) <= 2:
+                for chunk in bounds[1:]:
+                    _runChunk(chunk)
+            else:
+                # Fork so that workers inherit the job, including memory-mapped inputs, instead of pickling it
+                mp_context = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else None
+                with ProcessPoolExecutor(max_workers=min(stage.n_jobs, len(bounds) - 1), mp_context=mp_context) as executor:
+                    list(executor.map(_runChunk, bounds[1:]))
+
+        finally:
+            _CHUNK_JOB = None
+
+        for out, arr in arrays.items():
+            closeArrayData(self.checkpoint_dir, self._checkpointName(name, out), arr)
+            self._addCheckpoint(name, out)
+            self._values[out] = readArrayData(self.checkpoint_dir, self._checkpointName(name, out))
+
+    def _passedFiles(self, val, inputs):
+        # Checkpoint files of arrays in val that are checkpointed inputs passed through as is, by element index of val
+        arrays = val if isinstance(val, (list, tuple)) else (val,)
+        files = {}
+        for input in inputs:
+            if input not in self._files:
+                continue
+
+            input_val, input_files = self._values[input], self._files[input]
+            input_arrays = input_val if isinstance(input_val, (list, tuple)) else (input_val,)
+            for j, arr in enumerate(arrays):
+                for input_arr, file in zip(input_arrays, input_files):
+                    if arr is input_arr:
+                        files[j] = file
+
+        return files
+
+    def _evictInputs(self, name):
+        # Drop inputs of a stage once every stage consuming them has run, e.g. the whole domain fields after confine,
+        # so that they aren't held for the rest of the run. They are read from their checkpoint, or recomputed, if asked for again
+        for input in self.stages[name].inputs:
+            if all(consumer in self._done for consumer, stage in self.stages.items() if input in stage.inputs):
+                self._values.pop(input, None)
+
+    def _addCheckpoint(self, name, output):
+        # Record the .npy files of a new checkpoint and remove checkpoints of the same output with other keys,
+        # e.g. of earlier parameters or forced runs. Published stores are hard links thus unaffected
+        checkpoint = self._checkpointName(name, output)
+        self._files[output] = [entry['file'] for entry in readArrayManifest(self.checkpoint_dir, checkpoint)['arrays']]
+        pattern = re.compile(re.escape(name + '_' + output + '_') + r'[0-9a-f]{16}\.npys')
+        for store in os.listdir(self.checkpoint_dir):
+            if pattern.fullmatch(store) and store != checkpoint + '.npys':
+                shutil.rmtree(os.path.join(self.checkpoint_dir, store), ignore_errors=True)
+
+    def run(self, *outputs):
+        """
+        Get multiple outputs, see get().
+
+        :param outputs: Output names.
+        :type outputs: str
+
+        :return: Dictionary of outputs with output names as keys.
+        :rtype: dict
+        """
+        return {output: self.get(output) for output in outputs}
+
+    def publish(self, output, result_path, filename):
+        """
+        Make an output available under a fixed name for other scripts, e.g. "list_data_test_Confined2",
+        by hard-linking its checkpoint so that no data is duplicated.
+        If checkpoints are not saved, the output is saved instead.
+
+        :param output: Output name.
+        :type output: str
+        :param result_path: Directory to publish to.
+        :type result_path: str
+        :param filename: Store name without extension.
+        :type filename: str
+        """
+        name = self.producers[output]
+        val = self.get(output)
+        if self.isCached(name):
+            linkArrayData(self.checkpoint_dir, self._checkpointName(name, output), result_path, filename)
+        else:
+            saveArrayData(result_path, val, filename)
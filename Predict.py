@@ -102,8 +102,7 @@ if bij_novelty == 'excl':
     # ccy_test = cc[:, 1][~nan_mask]
     # ccz_test = cc[:, 2][~nan_mask]
     y_pred_test = y_pred_test[~nan_mask]
-    for _ in range(2):
-        y_pred_test = makeRealizable(y_pred_test)
+    y_pred_test = makeRealizable(y_pred_test, max_iter=2)
 
 # Rotate field
 y_pred_test = expandSymmetricTensor(y_pred_test).reshape((-1, 3, 3))
@@ -3,6 +3,7 @@ import sys
 sys.path.append('/home/yluan/Documents/SOWFA PostProcessing/SOWFA-Postprocess')
 from joblib import load
 from FieldData import FieldData
+from DataStore import saveArrayData, readArrayData
 from SliceData import SliceProperties
 from DataBase import *
 from Preprocess.Tensor import processReynoldsStress, getBarycentricMapData, expandSymmetricTensor, contractSymmetricTensor, makeRealizable
@@ -62,6 +63,8 @@ figfolder = 'Result'
 fieldrot = 30.  # float
 # When plotting, the mesh has to be uniform by interpolation, specify target size
 uniform_mesh_size = 1e5  # int
+# Folder in test case directory to cache interpolation weights across runs, None to disable
+interp_cache_folder = 'InterpolationCache'  # str or None
 contour_lvl = 200
 figheight_multiplier = 1.  # float
 # Limit for bij plot
@@ -154,6 +157,7 @@ elif test_casename == 'ALM_N_H_ParTurb_HiSpeed':
     time = ''
 
 estimator_fullpath = casedir + '/' + ml_casename + '/' + estimator_folder + '/'
+interp_cache_dir = casedir + '/' + test_casename + '/' + interp_cache_folder if interp_cache_folder is not None else None
 if 'TBRF' in estimator_folder or 'tbrf' in estimator_folder:
     estimator_name = 'TBRF'
 elif 'TBDT' in estimator_folder or 'tbdt' in estimator_folder:
@@ -230,7 +234,7 @@ for i, slicename in enumerate(slicenames):
     else:
         slicedir = 'vertical'
 
-    list_data_test = case.readPickleData(time, 'list_data_test_' + slicename)
+    list_data_test = readArrayData(case.result_paths[time], 'list_data_test_' + slicename)
     ccx_test = list_data_test[0][:, 0]
     ccy_test = list_data_test[0][:, 1]
     ccz_test = list_data_test[0][:, 2]
@@ -262,8 +266,7 @@ for i, slicename in enumerate(slicenames):
         ccy_test = ccy_test[~nan_mask]
         ccz_test = ccz_test[~nan_mask]
         y_pred_test = y_pred_test[~nan_mask]
-        for _ in range(2):
-            y_pred_test = makeRealizable(y_pred_test)
+        y_pred_test = makeRealizable(y_pred_test, max_iter=2)
 
     # Rotate field
     y_pred_test = expandSymmetricTensor(y_pred_test).reshape((-1, 3, 3))
@@ -285,7 +288,7 @@ for i, slicename in enumerate(slicenames):
     if filter:
         cc2_test = ccz_test if slicedir == 'vertical' else ccy_test
         ccx_test_mesh, cc2_test_mesh, _, y_predtest_mesh = fieldSpatialSmoothing(y_pred_test, ccx_test, cc2_test, is_bij=True, bij_bnd_multiplier=bijbnd_multiplier,
-                                                                                 xlim=(None,)*2, ylim=(None,)*2, mesh_target=uniform_mesh_size)
+                                                                                 xlim=(None,)*2, ylim=(None,)*2, mesh_target=uniform_mesh_size, cache_dir=interp_cache_dir)
         # Collapse mesh grid
         y_pred_test = y_predtest_mesh.reshape((-1, 6))
         # Interpolate 3rd axis, either y or z, to mesh grid size and flatten it
@@ -326,7 +329,7 @@ for i, slicename in enumerate(slicenames):
         ccx_test_mesh, ccy_test_mesh, ccz_test_mesh, rgb_pred_test_mesh = case_slice.interpolateDecomposedSliceData_Fast(ccx_test, ccy_test, ccz_test, rgb_bary_pred_test, slice_orient=slicedir, target_meshsize=uniform_mesh_size,
                                                                                                              interp_method='nearest', confinebox=confinebox[i])
         list_rgb.append(rgb_pred_test_mesh)
-        if save_data: case.savePickleData(time, (list_rgb,), ('Pred_' + str(slicenames) + '_list_rgb',))
+        if save_data: saveArrayData(case.result_paths[time], list_rgb, 'Pred_' + str(slicenames) + '_list_rgb')
 
     if 'bij' in plot_property or '*' in plot_property:
         ccx_test_mesh, ccy_test_mesh, ccz_test_mesh, bij_pred_test_mesh = case_slice.interpolateDecomposedSliceData_Fast(ccx_test,
@@ -338,7 +341,7 @@ for i, slicename in enumerate(slicenames):
                                                                                                              interp_method=interp_method,
                                                                                                              confinebox=confinebox[i])
         list_bij.append(bij_pred_test_mesh)
-        if save_data: case.savePickleData(time, (list_bij,), ('Pred_' + str(slicenames) + '_list_bij',))
+        if save_data: saveArrayData(case.result_paths[time], list_bij, 'Pred_' + str(slicenames) + '_list_bij')
 
     # If Gaussian filter has been used, then ccy_test_mesh needs to manually flipped upside down
     # as it was not working in interpolateDecomposedSliceData
@@ -350,9 +353,9 @@ for i, slicename in enumerate(slicenames):
     list_y.append(ccy_test_mesh)
     list_z.append(ccz_test_mesh)
     if save_data:
-        case.savePickleData(time, (list_x,), ('Pred_' + str(slicenames) + '_list_x',))
-        case.savePickleData(time, (list_y,), ('Pred_' + str(slicenames) + '_list_y',))
-        case.savePickleData(time, (list_z,), ('Pred_' + str(slicenames) + '_list_z',))
+        saveArrayData(case.result_paths[time], list_x, 'Pred_' + str(slicenames) + '_list_x')
+        saveArrayData(case.result_paths[time], list_y, 'Pred_' + str(slicenames) + '_list_y')
+        saveArrayData(case.result_paths[time], list_z, 'Pred_' + str(slicenames) + '_list_z')
 
 
 """
@@ -3,8 +3,10 @@ import sys
 sys.path.append('/home/yluan/Documents/SOWFA PostProcessing/SOWFA-Postprocess')
 from joblib import load
 from FieldData import FieldData
+from DataStore import readArrayData
 from Preprocess.Tensor import processReynoldsStress, getBarycentricMapData, expandSymmetricTensor, contractSymmetricTensor
-from Utility import interpolateGridData, rotateData
+from Preprocess.FeatureExtraction import ListData
+from Utility import GridInterpolator, rotateData
 import time as t
 from PlottingTool import BaseFigure, Plot2D, Plot2D_Image, PlotContourSlices3D, PlotSurfaceSlices3D, PlotImageSlices3D
 import os
@@ -48,6 +50,8 @@ xlabel = 'Distance [m]'
 fieldrot = 30.  # float
 # When plotting, the mesh has to be uniform by interpolation, specify target size
 uniform_mesh_size = 1e6  # int
+# Folder in test case directory to cache interpolation weights across runs, None to disable
+interp_cache_folder = 'InterpolationCache'  # str or None
 # Subsample for barymap coordinates, jump every "subsample"
 subsample = 50  # int
 figheight_multiplier = 1.  # float
@@ -144,6 +148,7 @@ else:
     time = str(time)
 
 estimator_fullpath = casedir + '/' + ml_casename + '/' + estimator_folder + '/'
+interp_cache_dir = casedir + '/' + test_casename + '/' + interp_cache_folder if interp_cache_folder is not None else None
 if 'TBRF' in estimator_folder or 'tbrf' in estimator_folder:
     estimator_name = 'TBRF'
 elif 'TBDT' in estimator_folder or 'tbdt' in estimator_folder:
@@ -202,14 +207,14 @@ if plotslices:
             slicedir = 'rz'
 
         # Read slice data
-        k = case.readPickleData(time, 'TKE_' + slicename)
-        grad_u = case.readPickleData(time, 'grad(U)_' + slicename)
-        g_tke = case.readPickleData(time, 'G_' + slicename)
-        div_devr = case.readPickleData(time, 'div(dev(R))_' + slicename)
-        list_data_test = case.readPickleData(time, 'list_data_test_' + slicename)
-        ccx_test = list_data_test[0][:, 0]
-        ccy_test = list_data_test[0][:, 1]
-        ccz_test = list_data_test[0][:, 2]
+        k = readArrayData(case.result_paths[time], 'TKE_' + slicename)
+        grad_u = readArrayData(case.result_paths[time], 'grad(U)_' + slicename)
+        g_tke = readArrayData(case.result_paths[time], 'G_' + slicename)
+        div_devr = readArrayData(case.result_paths[time], 'div(dev(R))_' + slicename)
+        list_data_test = ListData(case.result_paths[time], 'list_data_test_' + slicename)
+        ccx_test = list_data_test.cc[:, 0]
+        ccy_test = list_data_test.cc[:, 1]
+        ccz_test = list_data_test.cc[:, 2]
         # First axis is radial for vertical slice and x for horizontal slice
         if slicedir == 'rz':
             cc1_test = ccx_test/np.sin(fieldrot) if 'alongWind' not in slicename else ccx_test/np.cos(fieldrot)
@@ -226,11 +231,11 @@ if plotslices:
         #     cc2_test = cc_test[:, 1]
         #     del cc_test
 
-        x_test = list_data_test[1]
+        x_test = list_data_test.x
         x_test[x_test > 1e10] = 1e10
         x_test[x_test < -1e10] = 1e10
-        y_test_unrot = list_data_test[2]
-        tb_test = list_data_test[3]
+        y_test_unrot = list_data_test.y
+        tb_test = list_data_test.tb
         del list_data_test
         # Rotate field
         y_test = expandSymmetricTensor(y_test_unrot).reshape((-1, 3, 3))
@@ -299,23 +304,18 @@ if plotslices:
             extent_test = (cc1_test.min(), cc1_test.max(), cc2_test.min(), cc2_test.max())
 
         t0 = t.time()
-        ccx_test_mesh, ccy_test_mesh, _, rgb_bary_test_mesh = interpolateGridData(cc1_test, cc2_test, rgb_bary_test,
-                                                                                  xlim=c1lim, ylim=c2lim,
-                                                                                  mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
-        _, _, _, rgb_bary_predtest_mesh = interpolateGridData(cc1_test, cc2_test, rgb_bary_pred_test,
-                                                              xlim=c1lim, ylim=c2lim,
-                                                              mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
+        # Triangulation and interpolation weights are built once and shared by all interpolated fields
+        interpolator = GridInterpolator(cc1_test, cc2_test, xlim=c1lim, ylim=c2lim,
+                                        mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3, cache_dir=interp_cache_dir)
+        ccx_test_mesh, ccy_test_mesh = interpolator.xmesh, interpolator.ymesh
+        rgb_bary_test_mesh = interpolator(rgb_bary_test)
+        rgb_bary_predtest_mesh = interpolator(rgb_bary_pred_test)
         t1 = t.time()
         print('\nFinished interpolating mesh data for barycentric map in {:.4f} s'.format(t1 - t0))
 
         t0 = t.time()
-        _, _, _, y_test_mesh = interpolateGridData(cc1_test, cc2_test, y_test,
-                                                   xlim=c1lim,
-                                                   ylim=c2lim,
-                                                   mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
-        _, _, _, y_predtest_mesh = interpolateGridData(cc1_test, cc2_test, y_pred_test,
-                                                       xlim=c1lim, ylim=c2lim,
-                                                       mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
+        y_test_mesh = interpolator(y_test)
+        y_predtest_mesh = interpolator(y_pred_test)
         t1 = t.time()
         print('\nFinished interpolating mesh data for bij in {:.4f} s'.format(t1 - t0))
 
@@ -421,20 +421,21 @@ if plotlines:
         x_bary_pred_all, y_bary_pred_all = [], []
         x_bary_all, y_bary_all = [], []
         for orient in ('H', 'V'):
-            k = case.readPickleData(time, 'TKE_' + set_type + '_' + orient)
-            grad_u = case.readPickleData(time, 'grad(U)_' + set_type + '_' + orient)
-            g_tke = case.readPickleData(time, 'G_' + set_type + '_' + orient)
-            div_devr = case.readPickleData(time, 'div(dev(R))_' + set_type + '_' + orient)
-            list_data_test = case.readPickleData(time, 'list_data_test_' + set_type + '_' + orient)
-            distance_test = list_data_test[0]
+            k = readArrayData(case.result_paths[time], 'TKE_' + set_type + '_' + orient)
+            grad_u = readArrayData(case.result_paths[time], 'grad(U)_' + set_type + '_' + orient)
+            g_tke = readArrayData(case.result_paths[time], 'G_' + set_type + '_' + orient)
+            div_devr = readArrayData(case.result_paths[time], 'div(dev(R))_' + set_type + '_' + orient)
+            list_data_test = ListData(case.result_paths[time], 'list_data_test_' + set_type + '_' + orient,
+                                      names=('distance', 'x', 'y', 'tb'))
+            distance_test = list_data_test.distance
             # Subsampled distance data
             distance_test_subsamp = distance_test[::subsample]
-            x_test = list_data_test[1]
+            x_test = list_data_test.x
             # Cap too large input features
             x_test[x_test > 1e10] = 1e10
             x_test[x_test < -1e10] = 1e10
-            y_test_unrot = list_data_test[2]
-            tb_test = list_data_test[3]
+            y_test_unrot = list_data_test.y
+            tb_test = list_data_test.tb
             del list_data_test
             # Rotate field
             y_test = expandSymmetricTensor(y_test_unrot).reshape((-1, 3, 3))
@@ -1,9 +1,10 @@
 from joblib import load
 from Preprocess.Tensor import processReynoldsStress, getBarycentricMapData, expandSymmetricTensor, contractSymmetricTensor,makeRealizable
+from Preprocess.FeatureExtraction import ListData
 import time as t
 import numpy as np
-import pickle
 import os
+from FoamData import writeFoamField
 
 """
 User Inputs, Anything Can Be Changed Here
@@ -28,6 +29,10 @@ filter = False
 # Whatever is outside bounds is treated as NaN.
 # Whatever between bounds and realizable limits are made realizable
 bijbnd_multiplier = 2.
+# Boundary patches of the mesh, written as calculated with 0 value in predicted OpenFOAM fields
+patches = ('lower', 'upper', 'south', 'west', 'east', 'north')  # list/tuple(str)
+# Whether write predicted OpenFOAM fields in binary, much faster than ASCII for large meshes
+binary_format = True  # bool
 
 estimator_fullpath = casedir + '/' + ml_casename + '/' + estimator_folder + '/'
 estimator_name += '_Confined' + str(confinezone)
@@ -45,18 +50,17 @@ Load Data and Regressor
 """
 print('\nLoading regressor and data... ')
 regressor = load(estimator_fullpath + estimator_name + '.joblib')
-list_data_test = pickle.load(open(casedir + '/' + test_casename + '/list_data_test_Confined' + str(confinezone) + '.p', 'rb'),
-                             encoding='ASCII')
-# ccx_test = list_data_test[0][:, 0]
-# ccy_test = list_data_test[0][:, 1]
-# ccz_test = list_data_test[0][:, 2]
+list_data_test = ListData(casedir + '/' + test_casename, 'list_data_test_Confined' + str(confinezone))
+# ccx_test = list_data_test.cc[:, 0]
+# ccy_test = list_data_test.cc[:, 1]
+# ccz_test = list_data_test.cc[:, 2]
 
-x_test = list_data_test[1]
+x_test = list_data_test.x
 x_test[x_test > 1e10] = 1e10
 x_test[x_test < -1e10] = 1e10
-y_test = list_data_test[2]
-tb_test = list_data_test[3]
-mask = list_data_test[4]
+y_test = list_data_test.y
+tb_test = list_data_test.tb
+mask = list_data_test.mask
 del list_data_test
 
 
@@ -74,231 +78,16 @@ if bij_novelty == 'excl':
     # ccy_test = ccy_test[~nan_mask]
     # ccz_test = ccz_test[~nan_mask]
     y_pred = y_pred[~nan_mask]
-    for _ in range(2):
-        y_pred = makeRealizable(y_pred)
+    y_pred = makeRealizable(y_pred, max_iter=2)
 
 t1 = t.time()
 print('\nFinished bij prediction in {:.4f} s'.format(t1 - t0))
 
-print('\nAssigning predicted domain bij back to full domain, with unpredicted region being 0...')
-y_pred_all = np.zeros((len(mask), 6))
-y_pred_all[mask] = y_pred
-
-
 """
 Write Predicted bij back to OpenFOAM File
 """
-fieldname = 'bij_pred'
-print('\nWriting bij prediction to OpenFOAM format...')
-header_symmtensor = """/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  2.4.0                                 |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\*---------------------------------------------------------------------------*/
-FoamFile
-{
-    version     2.0;
-    format      ascii;
-    class       volSymmTensorField;
-    location    "%s";
-    object      %s;
-}
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-dimensions      [0 0 0 0 0 0 0];
-
-internalField   nonuniform List<symmTensor> 
-%d
-(
-""" % (time, fieldname, len(mask))
-
-footer_symmtensor = """)
-;
-
-boundaryField
-{
-    lower
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0);
-    }
-    upper
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0);
-    }
-    south
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0);
-    }
-    west
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0);
-    }
-    east
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0);
-    }
-    north
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0);
-    }
-}
-
-// ************************************************************************* //
-"""
-
-fh = open(result_dir + fieldname, 'w')
-fh.write(header_symmtensor)
-np.savetxt(fh, y_pred_all, fmt="(%.10f %.10f %.10f %.10f %.10f %.10f)")
-fh.write(footer_symmtensor)
-fh.close()
-print('\nFinished writing bij prediction to OpenFOAM format')
-del y_pred_all
-
-
-"""
-OpenFOAM Header and Footer for Vectors and Full Tensor
-"""
-def headerVecOF(time, fieldname, n_cells):
-    header_vec = """/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  2.4.0                                 |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\*---------------------------------------------------------------------------*/
-FoamFile
-{
-    version     2.0;
-    format      ascii;
-    class       volVectorField;
-    location    "%s";
-    object      %s;
-}
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-dimensions      [0 0 0 0 0 0 0];
-
-internalField   nonuniform List<vector> 
-%d
-(
-"""%(time, fieldname, n_cells)
-
-    return header_vec
-
-footer_vec = """)
-;
-
-boundaryField
-{
-    lower
-    {
-        type            calculated;
-        value           uniform (0 0 0);
-    }
-    upper
-    {
-        type            calculated;
-        value           uniform (0 0 0);
-    }
-    south
-    {
-        type            calculated;
-        value           uniform (0 0 0);
-    }
-    west
-    {
-        type            calculated;
-        value           uniform (0 0 0);
-    }
-    east
-    {
-        type            calculated;
-        value           uniform (0 0 0);
-    }
-    north
-    {
-        type            calculated;
-        value           uniform (0 0 0);
-    }
-}
-
-// ************************************************************************* //
-"""
-
-def headerTensorOF(time, fieldname, n_cells):
-    header_tensor = """/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  2.4.0                                 |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\*---------------------------------------------------------------------------*/
-FoamFile
-{
-    version     2.0;
-    format      ascii;
-    class       volTensorField;
-    location    "%s";
-    object      %s;
-}
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-dimensions      [0 0 0 0 0 0 0];
-
-internalField   nonuniform List<tensor> 
-%d
-(
-"""%(time, fieldname, n_cells)
-
-    return header_tensor
-
-footer_tensor = """)
-;
-
-boundaryField
-{
-    lower
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0 0 0 0);
-    }
-    upper
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0 0 0 0);
-    }
-    south
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0 0 0 0);
-    }
-    west
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0 0 0 0);
-    }
-    east
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0 0 0 0);
-    }
-    north
-    {
-        type            calculated;
-        value           uniform (0 0 0 0 0 0 0 0 0);
-    }
-}
-
-// ************************************************************************* //
-"""
+# Unpredicted region is 0
+writeFoamField(result_dir + 'bij_pred', y_pred, patches, mask=mask, time=time, binary=binary_format)
 
 
 """
@@ -317,33 +106,9 @@ print('\nFinished calculating eigenvals and eigenvecs in {:.4f} s'.format(t1 - t
 """
 Write Eigenvecs back to OpenFOAM File
 """
-print('\nAssigning true eigenvec of confined domain to the whole domain, with out-of confinement eigenvec being (0, 0, 0, 0, 0, 0, 0, 0, 0)...')
-fieldname = 'Eigenvec'
-eigvec_all = np.zeros((len(mask), 9))
-eigvec_all[mask] = eigvec_test.reshape((eigval_test.shape[0], 9))
-print('\nWriting true eigenvec to OpenFOAM format...')
-header_tensor = headerTensorOF(time, fieldname, len(mask))
-fh = open(result_dir + fieldname, 'w')
-fh.write(header_tensor)
-np.savetxt(fh, eigvec_all, fmt="(%.10f %.10f %.10f %.10f %.10f %.10f %.10f %.10f %.10f)")
-fh.write(footer_tensor)
-fh.close()
-print('\nFinished writing true eigenvec to OpenFOAM format')
-del eigvec_all
-
-print('\nAssigning predicted eigenvec of confined domain to the whole domain, with out-of confinement RGB being (0, 0, 0, 0, 0, 0, 0, 0, 0)...')
-fieldname = 'Eigenvec_pred'
-eigvec_pred_all = np.zeros((len(mask), 9))
-eigvec_pred_all[mask] = eigvec_pred.reshape((eigvec_pred.shape[0], 9))
-print('\nWriting predicted eigenvec to OpenFOAM format...')
-header_tensor = headerTensorOF(time, fieldname, len(mask))
-fh = open(result_dir + fieldname, 'w')
-fh.write(header_tensor)
-np.savetxt(fh, eigvec_pred_all, fmt="(%.10f %.10f %.10f %.10f %.10f %.10f %.10f %.10f %.10f)")
-fh.write(footer_tensor)
-fh.close()
-print('\nFinished writing predicted eigenvec to OpenFOAM format')
-del eigvec_pred_all
+# Out-of confinement eigenvec is (0, 0, 0, 0, 0, 0, 0, 0, 0)
+writeFoamField(result_dir + 'Eigenvec', eigvec_test.reshape((eigval_test.shape[0], 9)), patches, mask=mask, time=time, binary=binary_format)
+writeFoamField(result_dir + 'Eigenvec_pred', eigvec_pred.reshape((eigvec_pred.shape[0], 9)), patches, mask=mask, time=time, binary=binary_format)
 
 
 """
@@ -365,67 +130,18 @@ rgb_bary_pred[rgb_bary_pred > 1.] = 1.
 """
 Write Barycentric RGB back to OpenFOAM File
 """
-print('\nAssigning true RGB values of confined domain to the whole domain, with out-of confinement RGB being (0, 0, 0)...')
-fieldname = 'RGB'
-rgb_bary_all = np.zeros((len(mask), 3))
-rgb_bary_all[mask] = rgb_bary
+# Out-of confinement RGB is (0, 0, 0)
+writeFoamField(result_dir + 'RGB', rgb_bary, patches, mask=mask, time=time, binary=binary_format)
 del rgb_bary
-print('\nWriting true barycentric RGB to OpenFOAM format...')
-header_vec = headerVecOF(time, fieldname, len(mask))
-fh = open(result_dir + fieldname, 'w')
-fh.write(header_vec)
-np.savetxt(fh, rgb_bary_all, fmt="(%.10f %.10f %.10f)")
-fh.write(footer_vec)
-fh.close()
-print('\nFinished writing true barycentric RGB to OpenFOAM format')
-del rgb_bary_all
-
-print('\nAssigning predicted RGB values of confined domain to the whole domain, with out-of confinement RGB being (0, 0, 0)...')
-fieldname = 'RGB_pred'
-rgb_bary_pred_all = np.zeros((len(mask), 3))
-rgb_bary_pred_all[mask] = rgb_bary_pred
+writeFoamField(result_dir + 'RGB_pred', rgb_bary_pred, patches, mask=mask, time=time, binary=binary_format)
 del rgb_bary_pred
-print('\nWriting predicted barycentric RGB to OpenFOAM format...')
-header_vec = headerVecOF(time, fieldname, len(mask))
-fh = open(result_dir + fieldname, 'w')
-fh.write(header_vec)
-np.savetxt(fh, rgb_bary_pred_all, fmt="(%.10f %.10f %.10f)")
-fh.write(footer_vec)
-fh.close()
-print('\nFinished writing predicted barycentric RGB to OpenFOAM format')
-del rgb_bary_pred_all
 
 
 """
 Write Barycentric Map Coordinate back to OpenFOAM File
 """
-print('\nAssigning true barycentric map coordinate of confined domain to the whole domain, with out-of confinement coordinate being (0, 0, 0)...')
-fieldname = 'XYbary'
-xy_bary_all = np.zeros((len(mask), 3))
-xy_bary_all[:, :2][mask] = xy_bary
+# Out-of confinement coordinate is (0, 0, 0). Last D is dummy
+writeFoamField(result_dir + 'XYbary', np.hstack((xy_bary, np.zeros((len(xy_bary), 1)))), patches, mask=mask, time=time, binary=binary_format)
 del xy_bary
-print('\nWriting true barycentric xy-coordinate to OpenFOAM format...')
-header_vec = headerVecOF(time, fieldname, len(mask))
-fh = open(result_dir + fieldname, 'w')
-fh.write(header_vec)
-# Last D is dummy
-np.savetxt(fh, xy_bary_all, fmt="(%.10f %.10f %d)")
-fh.write(footer_vec)
-fh.close()
-print('\nFinished writing true barycentric map coordinate to OpenFOAM format')
-del xy_bary_all
-
-print('\nAssigning predicted barycentric map coordinate of confined domain to the whole domain, with out-of confinement coordinate being (0, 0, 0)...')
-fieldname = 'XYbary_pred'
-xy_bary_pred_all = np.zeros((len(mask), 3))
-xy_bary_pred_all[:, :2][mask] = xy_bary_pred
+writeFoamField(result_dir + 'XYbary_pred', np.hstack((xy_bary_pred, np.zeros((len(xy_bary_pred), 1)))), patches, mask=mask, time=time, binary=binary_format)
 del xy_bary_pred
-print('\nWriting predicted barycentric xy-coordinate to OpenFOAM format...')
-header_vec = headerVecOF(time, fieldname, len(mask))
-fh = open(result_dir + fieldname, 'w')
-fh.write(header_vec)
-# Last D is dummy
-np.savetxt(fh, xy_bary_pred_all, fmt="(%.10f %.10f %d)")
-fh.write(footer_vec)
-fh.close()
-print('\nFinished writing predicted barycentric map coordinate to OpenFOAM format')
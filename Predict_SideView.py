@@ -3,8 +3,9 @@ import sys
 sys.path.append('/home/yluan/Documents/SOWFA PostProcessing/SOWFA-Postprocess')
 from joblib import load
 from FieldData import FieldData
+from DataStore import readArrayData
 from Preprocess.Tensor import processReynoldsStress, getBarycentricMapData, expandSymmetricTensor, contractSymmetricTensor
-from Utility import interpolateGridData, rotateData
+from Utility import GridInterpolator, rotateData
 import time as t
 from PlottingTool import BaseFigure, Plot2D, Plot2D_Image, PlotContourSlices3D, PlotSurfaceSlices3D, PlotImageSlices3D
 import os
@@ -32,6 +33,8 @@ time = 'last'  # str/float/int or 'last'
 seed = 123  # int
 # Interpolation method when interpolating mesh grids
 interp_method = "nearest"  # "nearest", "linear", "cubic"
+# Whether slices are a (rotated) structured lattice to skip triangulation when interpolating, "auto" to detect
+structured_slice = 'auto'  # bool or "auto"
 # The case folder name storing the estimator
 estimator_folder = "ML/TBDT"  # str
 confinezone = '2'  # str
@@ -49,6 +52,8 @@ figfolder = 'Result'
 fieldrot = 30.  # float
 # When plotting, the mesh has to be uniform by interpolation, specify target size
 uniform_mesh_size = 1e5  # int
+# Folder in test case directory to cache interpolation weights across runs, None to disable
+interp_cache_folder = 'InterpolationCache'  # str or None
 contour_lvl = 10
 figheight_multiplier = 1.  # float
 # Limit for bij plot
@@ -130,6 +135,7 @@ else:
     time = str(time)
 
 estimator_fullpath = casedir + '/' + ml_casename + '/' + estimator_folder + '/'
+interp_cache_dir = casedir + '/' + test_casename + '/' + interp_cache_folder if interp_cache_folder is not None else None
 if 'TBRF' in estimator_folder or 'tbrf' in estimator_folder:
     estimator_name = 'TBRF'
 elif 'TBDT' in estimator_folder or 'tbdt' in estimator_folder:
@@ -184,7 +190,7 @@ if plotslices:
         else:
             slicedir = 'rz'
 
-        list_data_test = case.readPickleData(time, 'list_data_test_' + slicename)
+        list_data_test = readArrayData(case.result_paths[time], 'list_data_test_' + slicename)
         ccx_test = list_data_test[0][:, 0]
         ccy_test = list_data_test[0][:, 1]
         ccz_test = list_data_test[0][:, 2]
@@ -279,23 +285,19 @@ if plotslices:
             extent_test = (cc1_test.min(), cc1_test.max(), cc2_test.min(), cc2_test.max())
 
         t0 = t.time()
-        ccx_test_mesh, ccy_test_mesh, _, rgb_bary_test_mesh = interpolateGridData(cc1_test, cc2_test, rgb_bary_test,
-                                                                                  xlim=c1lim, ylim=c2lim,
-                                                                                  mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
-        _, _, _, rgb_bary_predtest_mesh = interpolateGridData(cc1_test, cc2_test, rgb_bary_pred_test,
-                                                              xlim=c1lim, ylim=c2lim,
-                                                              mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
+        # Triangulation and interpolation weights are built once and shared by all interpolated fields
+        interpolator = GridInterpolator(cc1_test, cc2_test, xlim=c1lim, ylim=c2lim,
+                                        mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3, cache_dir=interp_cache_dir,
+                                        structured=structured_slice)
+        ccx_test_mesh, ccy_test_mesh = interpolator.xmesh, interpolator.ymesh
+        rgb_bary_test_mesh = interpolator(rgb_bary_test)
+        rgb_bary_predtest_mesh = interpolator(rgb_bary_pred_test)
         t1 = t.time()
         print('\nFinished interpolating mesh data for barycentric map in {:.4f} s'.format(t1 - t0))
 
         t0 = t.time()
-        _, _, _, y_test_mesh = interpolateGridData(cc1_test, cc2_test, y_test,
-                                                   xlim=c1lim,
-                                                   ylim=c2lim,
-                                                   mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
-        _, _, _, y_predtest_mesh = interpolateGridData(cc1_test, cc2_test, y_pred_test,
-                                                       xlim=c1lim, ylim=c2lim,
-                                                       mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
+        y_test_mesh = interpolator(y_test)
+        y_predtest_mesh = interpolator(y_pred_test)
         t1 = t.time()
         print('\nFinished interpolating mesh data for bij in {:.4f} s'.format(t1 - t0))
         # Accumulate slices to plot in one
@@ -3,9 +3,11 @@ import sys
 sys.path.append('/home/yluan/Documents/SOWFA PostProcessing/SOWFA-Postprocess')
 from joblib import load
 from FieldData import FieldData
+from DataStore import readArrayData
 from SliceData import SliceProperties
 from DataBase import *
 from Preprocess.Tensor import processReynoldsStress, getBarycentricMapData, expandSymmetricTensor, contractSymmetricTensor,makeRealizable
+from Preprocess.FeatureExtraction import ListData
 from Utility import interpolateGridData, rotateData, fieldSpatialSmoothing
 import time as t
 from PlottingTool import BaseFigure, Plot2D, Plot2D_Image, PlotContourSlices3D, PlotSurfaceSlices3D, PlotImageSlices3D
@@ -62,6 +64,8 @@ xlabel = 'Distance [m]'
 fieldrot = 30.  # float
 # When plotting, the mesh has to be uniform by interpolation, specify target size
 uniform_mesh_size = 1e4  # int
+# Folder in test case directory to cache interpolation weights across runs, None to disable
+interp_cache_folder = 'InterpolationCache'  # str or None
 # Subsample for barymap coordinates, jump every "subsample"
 subsample = 50  # int
 figheight_multiplier = 1.  # float
@@ -121,6 +125,7 @@ else:
     turbloc_h = (1913.916, 1768.424, 1477.439)
 
 estimator_fullpath = casedir + '/' + ml_casename + '/' + estimator_folder + '/' + estimator_name + '/'
+interp_cache_dir = casedir + '/' + test_casename + '/' + interp_cache_folder if interp_cache_folder is not None else None
 estimator_name += '_Confined' + str(confinezone)
 # Average fields of interest for reading and processing
 if 'grad(TKE)_grad(p)' in fs:
@@ -175,21 +180,21 @@ for i, slicename in enumerate(slicenames):
     else:
         slicedir = 'vertical'
 
-    list_data_test = case.readPickleData(time, 'list_data_test_' + slicename)
-    ccx_test = list_data_test[0][:, 0]
-    ccy_test = list_data_test[0][:, 1]
-    ccz_test = list_data_test[0][:, 2]
+    list_data_test = ListData(case.result_paths[time], 'list_data_test_' + slicename)
+    ccx_test = list_data_test.cc[:, 0]
+    ccy_test = list_data_test.cc[:, 1]
+    ccz_test = list_data_test.cc[:, 2]
 
-    x_test = list_data_test[1]
+    x_test = list_data_test.x
     x_test[x_test > 1e10] = 1e10
     x_test[x_test < -1e10] = 1e10
-    y_test = list_data_test[2]
-    tb_test = list_data_test[3]
+    y_test = list_data_test.y
+    tb_test = list_data_test.tb
     del list_data_test
     # Load truth div(dev(R)), where R is -ui'uj' here
-    divdev_r = case.readPickleData(time, 'div(dev(R))_' + slicename)
+    divdev_r = readArrayData(case.result_paths[time], 'div(dev(R))_' + slicename)
     # Furthermore load ddev(Rab)/db to complete predicted div(dev(R)) later, where R is ui'uj' here
-    ddevr_dj = case.readPickleData(time, 'ddev(Rab)_db_' + slicename)
+    ddevr_dj = readArrayData(case.result_paths[time], 'ddev(Rab)_db_' + slicename)
     # Only ddev(Ri3)/dz is used here if horizontal slice
     if slicedir == 'horizontal':
         ddevri3_dz = np.vstack((ddevr_dj[:, 2], ddevr_dj[:, 5], ddevr_dj[:, 8])).T
@@ -197,7 +202,7 @@ for i, slicename in enumerate(slicenames):
     else:
         ddevri3_dz = np.vstack((ddevr_dj[:, 1], ddevr_dj[:, 4], ddevr_dj[:, 7])).T
 
-    k = case.readPickleData(time, 'TKE_' + slicename)
+    k = readArrayData(case.result_paths[time], 'TKE_' + slicename)
     
     """
     Predict
@@ -212,8 +217,7 @@ for i, slicename in enumerate(slicenames):
         ccy_test = ccy_test[~nan_mask]
         ccz_test = ccz_test[~nan_mask]
         y_pred = y_pred[~nan_mask]
-        for _ in range(2):
-            y_pred = makeRealizable(y_pred)
+        y_pred = makeRealizable(y_pred, max_iter=2)
 
     # Rotate field
     y_pred = expandSymmetricTensor(y_pred).reshape((-1, 3, 3))
@@ -238,7 +242,7 @@ for i, slicename in enumerate(slicenames):
                                                                                  is_bij=True,
                                                                                  bij_bnd_multiplier=bijbnd_multiplier,
                                                                                  xlim=(None,)*2, ylim=(None,)*2,
-                                                                                 mesh_target=uniform_mesh_size)
+                                                                                 mesh_target=uniform_mesh_size, cache_dir=interp_cache_dir)
         # Collapse mesh grid
         y_pred = y_pred_mesh.reshape((-1, 6))
         # Interpolate 3rd axis, either y or z, to mesh grid size and flatten it
@@ -1,11 +1,12 @@
 # cython: language_level = 3str
 # cython: embedsignature = True
 cimport numpy as np
+from cython cimport floating
 
 cpdef tuple getInvariantFeatureSet(np.ndarray sij, np.ndarray rij,
                                    np.ndarray grad_k=*, np.ndarray grad_p=*,
                                    np.ndarray k=*, np.ndarray eps=*,
-                                   np.ndarray u=*, np.ndarray grad_u=*, double rho=*)
+                                   np.ndarray u=*, np.ndarray grad_u=*, double rho=*, object features=*, object dtype=*)
 
 cpdef tuple getSupplementaryInvariantFeatures(np.ndarray k, np.ndarray d, np.ndarray epsilon, np.ndarray nu, np.ndarray sij=*, np.ndarray r=*)
 
@@ -16,7 +17,15 @@ cpdef np.ndarray getRadialTurbineDistance(np.ndarray x, np.ndarray y, np.ndarray
 # -----------------------------------------------------
 # Supporting Functions, Not Intended to Be Called From Python
 # -----------------------------------------------------
-cdef tuple _getInvaraintFeatureSet(np.ndarray[np.float_t, ndim=2] sij, np.ndarray[np.float_t, ndim=2] rij,
-                                        np.ndarray grad1=*, np.ndarray grad2=*, np.ndarray grad1_scaler=*, np.ndarray grad2_scaler=*)
-
-
+cdef tuple _getInvaraintFeatureSet(np.ndarray sij, np.ndarray rij,
+                                        np.ndarray grad1=*, np.ndarray grad2=*, np.ndarray grad1_scaler=*, np.ndarray grad2_scaler=*,
+                                   object features=*, object dtype=*)
+
+cdef void _getInvariantFeaturesSet(floating[:, :] sij, floating[:, :] rij,
+                                   floating[:, :] a1, double[:] a1_scaler, floating[:, :] a2, double[:] a2_scaler,
+                                   int n_grad, int[::1] features, int[::1] need, floating[:, ::1] inv) noexcept
+
+cdef void _getInvariantFeatures(double s00, double s01, double s02, double s11, double s12, double s22,
+                                double rxy, double rxz, double ryz,
+                                floating[:] g1, double g1_scaler, floating[:] g2, double g2_scaler,
+                                int n_grad, const int* features, int n_features, const int* need, floating* inv) noexcept nogil
@@ -6,16 +6,35 @@
 import numpy as np
 cimport numpy as np
 from libc.stdio cimport printf
+from cython.parallel cimport prange
+from cython cimport floating
 from warnings import warn
-from Tensor cimport _mapVectorToAntisymmetricTensor
 from Tensor import contractSymmetricTensor, expandSymmetricTensor
 from Utility import collapseMeshGridFeatures
 
 
+# Intermediate products shared among invariant features, in the order of the flags passed to _getInvariantFeatures()
+_INTERMEDIATES = ('sijsij', 'rijsij', 'rijsijsij', 'sijrijsijsij',
+                  'a1sij', 'a1sijsij', 'sija1sijsij', 'a2sij', 'a2sijsij', 'sija2sijsij', 'rija1', 'rija2')
+# Intermediate products that an intermediate product is built from
+_INTERMEDIATE_DEPENDENCIES = {'rijsijsij': ('sijsij',), 'sijrijsijsij': ('rijsijsij',),
+                              'a1sijsij': ('sijsij',), 'sija1sijsij': ('a1sijsij',),
+                              'a2sijsij': ('sijsij',), 'sija2sijsij': ('a2sijsij',)}
+# Intermediate products each of the 47 invariant features depends on, in column order.
+# With only 1 scalar gradient, the 19 invariant features are the first 19 of these
+_FEATURE_DEPENDENCIES = ((), ('sijsij',), (), ('rijsij',), ('rijsijsij',), ('sijrijsijsij',),
+                         (), ('a1sij',), ('a1sijsij',), ('sija1sijsij',), (), ('a1sij',), ('a1sijsij',),
+                         ('a1sij',), ('rijsij',), ('a1sijsij',), ('rijsijsij',), ('sija1sijsij',), ('sijrijsijsij',),
+                         (), ('a2sij',), ('a2sijsij',), ('sija2sijsij',), (), ('a2sij',), ('a2sijsij',),
+                         ('a2sij',), ('rijsij',), ('a2sijsij',), ('rijsijsij',), ('sija2sijsij',), ('sijrijsijsij',),
+                         (), ('a2sij',), ('a2sijsij',), ('a2sij',), ('a1sij',), ('a2sijsij',), ('a1sijsij',), ('sija2sijsij',), ('sija1sijsij',),
+                         ('rija1',), ('rija1', 'a2sij'), ('rija2', 'a1sij'), ('rija1', 'a2sijsij'), ('rija2', 'a1sijsij'), ('rija1', 'sija2sijsij'))
+
+
 cpdef tuple getInvariantFeatureSet(np.ndarray sij, np.ndarray rij,
                      np.ndarray grad_k=None, np.ndarray grad_p=None,
                      np.ndarray k=None, np.ndarray eps=None,
-                     np.ndarray u=None, np.ndarray grad_u=None, double rho=1.225):
+                     np.ndarray u=None, np.ndarray grad_u=None, double rho=1.225, object features=None, object dtype=None):
     """
     Get invariant features based on at least dimensionless strain and rotation rate tensor Sij, Rij of shape (n_samples / mesh grid, 3, 3); 
     and possibly grad(TKE) and/or grad(p) of shape (n_samples / mesh grid, 3).
@@ -63,19 +82,25 @@ cpdef tuple getInvariantFeatureSet(np.ndarray sij, np.ndarray rij,
     :param rho: Fluid density used for non-dimensionalizing grad(p).
     If grad(p) is None, then rho has no effect.
     :type rho: float, optional (default=1.225)
+    :param features: Invariant features to calculate, either as string labels, 
+    or a boolean support mask / integer indices of the full 6/19/47 invariant feature set, e.g. selector.get_support() of a fitted feature selector.
+    Only these features and the intermediate products they depend on are calculated, in the column order of the full feature set.
+    If None, all 6/19/47 invariant features are calculated.
+    :type features: list/tuple of str, ndarray[n_features] of bool/int, or None, optional (default=None)
+    :param dtype: Precision of the invariant features, see _getInvaraintFeatureSet().
+    If None, float32 if sij is float32 and float64 else.
+    :type dtype: np.float32, np.float64, or None, optional (default=None)
     
-    :return: 6/19/47 invariant features of shape (n_samples, n_features) if none, grad(p) or grad(TKE) or both gradients
+    :return: 6/19/47 invariant features (or the requested ones) of shape (n_samples, n_features) if none, grad(p) or grad(TKE) or both gradients
     are provided on top of Sij, Rij; and its corresponding string labels.
     :rtype: (ndarray[n_samples, n_features], tuple)
     """
     cdef np.ndarray scaler_k = None
     cdef np.ndarray scaler_p = None
-    cdef np.ndarray[np.float_t, ndim=2] inv_set
-    # U*grad(U) is (3,) for each sample
-    cdef np.ndarray[np.float_t] ugrad_u = np.empty(3)
-    cdef int i
+    cdef np.ndarray inv_set
     cdef tuple labels
 
+    if dtype is None: dtype = sij.dtype
     # n_samples x 6
     sij, _ = collapseMeshGridFeatures(sij, collapse_matrix=True)
     if sij.shape[1] == 9: sij = contractSymmetricTensor(sij)
@@ -104,18 +129,13 @@ cpdef tuple getInvariantFeatureSet(np.ndarray sij, np.ndarray rij,
             u, _ = collapseMeshGridFeatures(u, infer_matrix_form=False)
             # Mesh grid collapsed to 1D and grad(U) matrix collapsed to 1D, if grad(U) were provided in matrix form
             grad_u, _ = collapseMeshGridFeatures(grad_u, collapse_matrix=True)
-            # scaler_p is (n_samples,)
-            scaler_p = np.empty(grad_p.shape[0])
-            # Go through each sample, calculate 3 U*grad(U) and take its Frobenius norm for scaler_p scalar array
-            for i in range(grad_u.shape[0]):
-                ugrad_u[0] = u[i, 0]*grad_u[i, 0] + u[i, 1]*grad_u[i, 1] + u[i, 2]*grad_u[i, 2]
-                ugrad_u[1] = u[i, 0]*grad_u[i, 3] + u[i, 1]*grad_u[i, 4] + u[i, 2]*grad_u[i, 5]
-                ugrad_u[2] = u[i, 0]*grad_u[i, 6] + u[i, 1]*grad_u[i, 7] + u[i, 2]*grad_u[i, 8]
-                scaler_p[i] = 1./(rho*np.linalg.norm(ugrad_u))
+            # scaler_p is (n_samples,), from the Frobenius norm of the 3 U*grad(U) of each sample
+            scaler_p = 1./(rho*np.linalg.norm(np.einsum('nij,nj->ni', grad_u.reshape((-1, 3, 3)), u), axis=1))
 
     # Calculate invariant features based on Sij, Rij (mandatory), grad(TKE) (optional), grad(p) (optional).
     # grad(TKE), grad(p) will receive anti-symmetric tensor mapping (and non-dimensionalization) in _getInvariantFeatureSet()
-    inv_set, labels = _getInvaraintFeatureSet(sij, rij, grad1=grad_k, grad2=grad_p, grad1_scaler=scaler_k, grad2_scaler=scaler_p)
+    inv_set, labels = _getInvaraintFeatureSet(sij, rij, grad1=grad_k, grad2=grad_p, grad1_scaler=scaler_k, grad2_scaler=scaler_p,
+                                              features=features, dtype=dtype)
 
     return inv_set, labels
 
@@ -146,8 +166,8 @@ cpdef tuple getSupplementaryInvariantFeatures(np.ndarray k, np.ndarray d, np.nda
     :return: 3 or 4 supplementary features in a 2D array and labels
     :rtype: (ndarray[n_samples x 3/4], tuple)
     """
-    cdef np.ndarray[np.float_t] sijnorm
-    cdef np.ndarray[np.float_t, ndim=2] features
+    cdef np.ndarray sijnorm
+    cdef np.ndarray features
     cdef tuple labels
 
     # 1D array treatment
@@ -166,7 +186,8 @@ cpdef tuple getSupplementaryInvariantFeatures(np.ndarray k, np.ndarray d, np.nda
         sij = None
 
     # Features array has shape (n_samples, n_features), 4 if radial distance to turbine center is given
-    features = np.empty((k.shape[0], 3)) if r is None else np.empty((k.shape[0], 4))
+    # Precision follows k, at least float32
+    features = np.empty((k.shape[0], 3 if r is None else 4), dtype=np.result_type(k.dtype, np.float32))
     # Feature 1: Wall-distance based Re number
     features[:, 0] = np.minimum(np.sqrt(k)*d/(50.*nu), 2.)
     # Feature 2: Turbulence intensity
@@ -237,8 +258,9 @@ cpdef np.ndarray getRadialTurbineDistance(np.ndarray x, np.ndarray y, np.ndarray
 # -----------------------------------------------------
 # Supporting Functions, Not Intended to Be Called From Python
 # -----------------------------------------------------
-cdef tuple _getInvaraintFeatureSet(np.ndarray[np.float_t, ndim=2] sij, np.ndarray[np.float_t, ndim=2] rij,
-                                                np.ndarray grad1=None, np.ndarray grad2=None, np.ndarray grad1_scaler=None, np.ndarray grad2_scaler=None):
+cdef tuple _getInvaraintFeatureSet(np.ndarray sij, np.ndarray rij,
+                                                np.ndarray grad1=None, np.ndarray grad2=None, np.ndarray grad1_scaler=None, np.ndarray grad2_scaler=None,
+                                   object features=None, object dtype=np.float64):
     """
     Calculate invariant features for samples, given at least non-dimensionalized strain rate and rotation rate tensor Sij, Rij.
     If only non-dimensionalized Sij of shape (n_samples, 6) and Rij of shape (n_samples, 9) are provided, 
@@ -247,8 +269,14 @@ cdef tuple _getInvaraintFeatureSet(np.ndarray[np.float_t, ndim=2] sij, np.ndarra
     then 19 invariant features will be calculated.
     Else if extra 2 scalar gradients of shape (n_samples, 3) are provided, 
     then 47 invariant features will be calculated.
-    Scalar gradient(s) is first mapped to an anti-symmetric tensor and non-dimensionalized if corresponding scaler is provided, 
+    Scalar gradient(s) is mapped to an anti-symmetric tensor and non-dimensionalized if corresponding scaler is provided, 
     before calculating invariant features.
+    Every invariant is a trace tr(X*Y) of two intermediate products evaluated as the contraction X_ij*Y_ji,
+    in parallel over the samples.
+    If features is given, only those invariants and the intermediate products they depend on are calculated.
+    Invariants are always evaluated in double precision, only inputs and features are stored in dtype.
+    Compared with float64, float32 features from float32 inputs are within 1e-6 relative to the largest magnitude of each feature
+    for the Sij, Rij invariants and within 1e-5 for the gradient invariants, whose products are of up to 5th order.
     
     From Appendix C of Wu et al., Physics-Informed Machine Learning Approach for Augmenting Turbulence Models: A Comprehensive Framework.
     
@@ -269,42 +297,35 @@ cdef tuple _getInvaraintFeatureSet(np.ndarray[np.float_t, ndim=2] sij, np.ndarra
     :param grad2_scaler: Scaler for grad2 to non-dimensionalize/normalize it.
     If grad2 is None, then grad2_scaler has no effect. 
     :type grad2_scaler: ndarray[n_samples] or None, optional (default=None)
+    :param features: String labels, or boolean support mask / integer indices of the full 6/19/47 feature set, to calculate.
+    If None, all features are calculated.
+    :type features: list/tuple of str, ndarray[n_features] of bool/int, or None, optional (default=None)
+    :param dtype: Precision of the invariant features. Inputs of another precision are converted first.
+    :type dtype: np.float32 or np.float64, optional (default=np.float64)
     
-    :return: 6/19/47 invariant features of shape (n_samples, n_features) if 0/1/2 scalar gradients are provided on top of Sij, Rij; 
+    :return: 6/19/47 invariant features (or the requested ones) of shape (n_samples, n_features) if 0/1/2 scalar gradients are provided on top of Sij, Rij; 
     and its corresponding string labels.
     :rtype: (ndarray[n_samples, n_features], tuple)
     """
-    cdef np.ndarray[np.float_t, ndim=2] asymm_tensor1, asymm_tensor2
     cdef tuple labels
-    cdef int milestone = 10
-    cdef unsigned int i, j, n_inv, n_grad
-    cdef double progress
-    cdef list ij_6to9 = [0, 1, 2, 1, 3, 4, 2, 4, 5]
-    cdef list ij_uniq = [0, 1, 2, 4, 5, 8]
-    cdef np.ndarray[np.float_t, ndim=2] sij_i, rij_i, asymm_tensor1_i, asymm_tensor2_i
-    cdef np.ndarray[np.float_t, ndim=2] inv_set, sijsij, rijrij, rijsij, rijsijsij, sijrijsijsij
-    cdef np.ndarray[np.float_t, ndim=2] a1sij, rija1, a1sijsij, a1rijrij, sija1sijsij, a2sij, rija2, a2sijsij, a2rijrij, sija2sijsij
-    cdef np.ndarray[np.float_t, ndim=2] a, asij, rija, asijsij, arijrij, sijasijsij
-
-    # First map given scalar gradient to anti-symmetric tensor,
-    # with A_scalar = [-I x grad(scalar)]*scaler. Shape (n_samples, 9)
-    if grad1 is not None:
-        asymm_tensor1 = _mapVectorToAntisymmetricTensor(grad1, grad1_scaler)
-        
-    # If two gradient fields provided, interactions between them are also considered
-    if grad2 is not None:
-        asymm_tensor2 = _mapVectorToAntisymmetricTensor(grad2, grad2_scaler)
+    cdef int n_inv, n_grad, n_features
+    cdef Py_ssize_t n_samples = sij.shape[0]
+    cdef np.ndarray inv_set, a1, a2
+    cdef double[:] a1_scaler_view, a2_scaler_view
+    cdef int[::1] features_view, need_view
+    cdef np.ndarray cols
+    cdef set needed, missing
 
     # Determine number of invariants and corresponding string labels
     if grad1 is None and grad2 is None:
         n_inv, n_grad = 6, 0
         labels = ('S^2', 'S^3', 'R^2', 'R^2*S', 'R^2*S^2', 'R^2*S*R*S^2')
-        print("\nCalculating 6 invariant features with only Sij and Rij... ")
     elif any((grad1 is None, grad2 is None)):
         n_inv, n_grad = 19, 1
         labels = ('S^2', 'S^3', 'R^2', 'R^2*S', 'R^2*S^2', 'R^2*S*R*S^2',
                   'A^2', 'A^2*S', 'A^2*S^2', 'A^2*S*A*S^2', 'R*A', 'R*A*S', 'R*A*S^2', 'R^2*A*S', 'A^2*R*S', 'R^2*A*S^2', 'A^2*R*S^2', 'R^2*S*A*S^2', 'A^2*S*R*S^2')
-        print("\nCalculating 19 invariant features with Sij, Rij, and a scalar gradient... ")
+        # The only scalar gradient always goes to the 1st slot
+        if grad1 is None: grad1, grad1_scaler = grad2, grad2_scaler
     else:
         n_inv, n_grad = 47, 2
         labels = ('S^2', 'S^3', 'R^2', 'R^2*S', 'R^2*S^2', 'R^2*S*R*S^2',
@@ -314,150 +335,265 @@ cdef tuple _getInvaraintFeatureSet(np.ndarray[np.float_t, ndim=2] sij, np.ndarra
                   'R^2*A2*S', 'A2^2*R*S', 'R^2*A2*S^2', 'A2^2*R*S^2', 'R^2*S*A2*S^2', 'A2^2*S*R*S^2',
                   'A1*A2', 'A1*A2*S', 'A1*A2*S^2', 'A1^2*A2*S', 'A2^2*A1*S', 'A1^2*A2*S^2', 'A2^2*A1*S^2', 'A1^2*S*A2*S^2', 'A2^2*S*A1*S^2',
                   'R*A1*A2', 'R*A1*A2*S', 'R*A2*A1*S', 'R*A1*A2*S^2', 'R*A2*A1*S^2', 'R*A1*S*A2*S^2')
-        print("\nCalculating 47 invariant features with Sij, Rij, and 2 scalar gradients... ")
-
-    # Invariants feature set is n_samples x n_invariants
-    inv_set = np.empty((sij.shape[0], n_inv))
-    # Go through every sample and calculate invariants
-    for i in range(sij.shape[0]):
-        # Recall Sij has 6 unique components, expand it to 9
-        sij_i = sij[i, ij_6to9].reshape((3, 3))
-        rij_i = rij[i].reshape((3, 3))
-        asymm_tensor1_i, asymm_tensor2_i = asymm_tensor1[i].reshape((3, 3)), asymm_tensor2[i].reshape((3, 3))
-        # Common shortcuts
-        sijsij = sij_i @ sij_i
-        rijrij = rij_i @ rij_i
-        rijsij = rij_i @ sij_i
-        rijsijsij = rij_i @ sijsij
-        sijrijsijsij = sij_i @ rijsijsij
-        # Extra shortcuts if at least one of grad1/2 is provided
-        if grad1 is not None:
-            a1sij = asymm_tensor1_i @ sij_i
-            rija1 = rij_i @ asymm_tensor1_i
-            a1sijsij = asymm_tensor1_i @ sijsij
-            a1rijrij = asymm_tensor1_i @ rijrij
-            sija1sijsij = sij_i @ a1sijsij
-        
-        if grad2 is not None:
-            a2sij = asymm_tensor2_i @ sij_i
-            rija2 = rij_i @ asymm_tensor2_i
-            a2sijsij = asymm_tensor2_i @ sijsij
-            a2rijrij = asymm_tensor2_i @ rijrij
-            sija2sijsij = sij_i @ a2sijsij
 
+    # Column indices of requested features in the full feature set
+    if features is None:
+        cols = np.arange(n_inv)
+    else:
+        cols = np.asarray(features).ravel()
+        if cols.dtype.kind == 'b':
+            if len(cols) != n_inv:
+                raise ValueError("\nSupport mask of " + str(len(cols)) + " features doesn't match " + str(n_inv) + " invariant features!\n")
+
+            cols = np.flatnonzero(cols)
+        elif cols.dtype.kind in 'iu':
+            cols = np.unique(cols)
+            if len(cols) > 0 and (cols.min() < 0 or cols.max() >= n_inv):
+                raise ValueError("\nFeature indices out of range of " + str(n_inv) + " invariant features!\n")
+
+        else:
+            missing = set(features) - set(labels)
+            if len(missing) > 0:
+                raise ValueError("\nUnknown invariant feature labels " + str(sorted(missing)) + " for " + str(n_inv) + " invariant features!\n")
+
+            cols = np.array(sorted(labels.index(label) for label in set(features)))
+
+    n_features = len(cols)
+    labels = tuple(labels[col] for col in cols)
+    # Resolve intermediate products needed by requested features, through the dependency graph
+    needed = set()
+    for col in cols:
+        needed.update(_FEATURE_DEPENDENCIES[col])
+
+    missing = needed
+    while len(missing) > 0:
+        missing = set(dep for name in missing for dep in _INTERMEDIATE_DEPENDENCIES.get(name, ())) - needed
+        needed.update(missing)
+
+    features_view = cols.astype(np.intc)
+    need_view = np.array([name in needed for name in _INTERMEDIATES], dtype=np.intc)
+    print("\nCalculating " + str(n_features) + " of " + str(n_inv) + " invariant features with Sij, Rij, and " + str(n_grad) + " scalar gradient(s)... ")
+    dtype = np.float32 if dtype == np.float32 else np.float64
+    sij, rij = np.asarray(sij, dtype=dtype), np.asarray(rij, dtype=dtype)
+    # Unused gradient slots are dummies that are never read
+    a1 = np.asarray(grad1, dtype=dtype) if n_grad > 0 else np.zeros((1, 3), dtype=dtype)
+    a2 = np.asarray(grad2, dtype=dtype) if n_grad > 1 else np.zeros((1, 3), dtype=dtype)
+    # Scaling the gradient vector is the same as scaling its anti-symmetric tensor
+    a1_scaler_view = np.ones(n_samples) if grad1_scaler is None or n_grad == 0 else np.asarray(grad1_scaler, dtype=np.float64).reshape(-1)
+    a2_scaler_view = np.ones(n_samples) if grad2_scaler is None or n_grad < 2 else np.asarray(grad2_scaler, dtype=np.float64).reshape(-1)
+    # Invariants feature set is n_samples x n_features
+    inv_set = np.empty((n_samples, n_features), dtype=dtype)
+    if n_features > 0:
+        if dtype == np.float32:
+            _getInvariantFeaturesSet[float](sij, rij, a1, a1_scaler_view, a2, a2_scaler_view, n_grad, features_view, need_view, inv_set)
+        else:
+            _getInvariantFeaturesSet[double](sij, rij, a1, a1_scaler_view, a2, a2_scaler_view, n_grad, features_view, need_view, inv_set)
+
+    print("\n" + str(n_features) + " invariant features calculated and stored column-wise ")
+    return inv_set, labels
+
+
+cdef void _getInvariantFeaturesSet(floating[:, :] sij, floating[:, :] rij,
+                                   floating[:, :] a1, double[:] a1_scaler, floating[:, :] a2, double[:] a2_scaler,
+                                   int n_grad, int[::1] features, int[::1] need, floating[:, ::1] inv) noexcept:
+    """
+    Requested invariants of every sample in parallel, see _getInvaraintFeatureSet().
+    """
+    cdef Py_ssize_t i, n_samples = sij.shape[0]
+    cdef int n_features = inv.shape[1]
+    # Indices of Rxy, Rxz, Ryz
+    cdef int ixy = 1 if rij.shape[1] == 9 else 0
+    cdef int ixz = 2 if rij.shape[1] == 9 else 1
+    cdef int iyz = 5 if rij.shape[1] == 9 else 2
+
+    # Go through every sample in parallel and calculate requested invariants
+    for i in prange(n_samples, nogil=True, schedule='static'):
+        _getInvariantFeatures(sij[i, 0], sij[i, 1], sij[i, 2], sij[i, 3], sij[i, 4], sij[i, 5],
+                              rij[i, ixy], rij[i, ixz], rij[i, iyz],
+                              a1[i if n_grad > 0 else 0], a1_scaler[i],
+                              a2[i if n_grad > 1 else 0], a2_scaler[i],
+                              n_grad, &features[0], n_features, &need[0], &inv[i, 0])
+
+
+cdef inline double _contract(const double* x, const double* y) noexcept nogil:
+    """
+    tr(x*y) of two 3 x 3 matrices of 9 components, i.e. x_ij*y_ji.
+    """
+    return (x[0]*y[0] + x[1]*y[3] + x[2]*y[6]
+            + x[3]*y[1] + x[4]*y[4] + x[5]*y[7]
+            + x[6]*y[2] + x[7]*y[5] + x[8]*y[8])
+
+
+cdef inline void _matMul(const double* a, const double* b, double* c) noexcept nogil:
+    """
+    c = a*b for 3 x 3 matrices of 9 components.
+    """
+    cdef int j, k
+
+    for j in range(3):
+        for k in range(3):
+            c[3*j + k] = a[3*j]*b[k] + a[3*j + 1]*b[3 + k] + a[3*j + 2]*b[6 + k]
+
+
+cdef inline void _setAntisymmetricTensor(double xy, double xz, double yz, double* a, double* aa) noexcept nogil:
+    """
+    Set anti-symmetric tensor a of 9 components from its 3 unique components xy, xz, yz,
+    and its symmetric square aa in closed form.
+    """
+    a[0] = a[4] = a[8] = 0.
+    a[1], a[2], a[5] = xy, xz, yz
+    a[3], a[6], a[7] = -xy, -xz, -yz
+    aa[0] = -(xy*xy + xz*xz)
+    aa[4] = -(xy*xy + yz*yz)
+    aa[8] = -(xz*xz + yz*yz)
+    aa[1] = aa[3] = -xz*yz
+    aa[2] = aa[6] = xy*yz
+    aa[5] = aa[7] = -xy*xz
+
+
+cdef void _getInvariantFeatures(double s00, double s01, double s02, double s11, double s12, double s22,
+                                double rxy, double rxz, double ryz,
+                                floating[:] g1, double g1_scaler, floating[:] g2, double g2_scaler,
+                                int n_grad, const int* features, int n_features, const int* need, floating* inv) noexcept nogil:
+    """
+    Calculate requested invariant features of one sample for n_grad = 0/1/2 scalar gradients g1, g2.
+    features are column indices of the full 6/19/47 feature set and need flags the intermediate products to build, 
+    in the order of _INTERMEDIATES.
+    A scalar gradient g is mapped to the anti-symmetric tensor A = -I x g*scaler,
+    i.e. Axy = gz, Axz = -gy, Ayz = gx.
+    """
+    cdef double s[9]
+    cdef double ss[9]
+    cdef double r[9]
+    cdef double rr[9]
+    cdef double rs[9]
+    cdef double rss[9]
+    cdef double srss[9]
+    cdef double a1[9]
+    cdef double a1a1[9]
+    cdef double a1s[9]
+    cdef double a1ss[9]
+    cdef double sa1ss[9]
+    cdef double ra1[9]
+    cdef double a2[9]
+    cdef double a2a2[9]
+    cdef double a2s[9]
+    cdef double a2ss[9]
+    cdef double sa2ss[9]
+    cdef double ra2[9]
+    cdef double* a
+    cdef double* aa
+    cdef double* a_s
+    cdef double* ass
+    cdef double* sass
+    cdef double val
+    cdef int c, f, k
+
+    s[0], s[4], s[8] = s00, s11, s22
+    s[1] = s[3] = s01
+    s[2] = s[6] = s02
+    s[5] = s[7] = s12
+    _setAntisymmetricTensor(rxy, rxz, ryz, r, rr)
+    # Shared intermediate products, only built if any requested feature depends on them
+    if need[0]: _matMul(s, s, ss)
+    if need[1]: _matMul(r, s, rs)
+    if need[2]: _matMul(r, ss, rss)
+    if need[3]: _matMul(s, rss, srss)
+    if n_grad > 0:
+        _setAntisymmetricTensor(g1[2]*g1_scaler, -g1[1]*g1_scaler, g1[0]*g1_scaler, a1, a1a1)
+        if need[4]: _matMul(a1, s, a1s)
+        if need[5]: _matMul(a1, ss, a1ss)
+        if need[6]: _matMul(s, a1ss, sa1ss)
+        if need[10]: _matMul(r, a1, ra1)
+
+    if n_grad > 1:
+        _setAntisymmetricTensor(g2[2]*g2_scaler, -g2[1]*g2_scaler, g2[0]*g2_scaler, a2, a2a2)
+        if need[7]: _matMul(a2, s, a2s)
+        if need[8]: _matMul(a2, ss, a2ss)
+        if need[9]: _matMul(s, a2ss, sa2ss)
+        if need[11]: _matMul(r, a2, ra2)
+
+    for c in range(n_features):
+        f = features[c]
         # Invariant features involving only Sij and Rij, 6 in total
-        # S^2
-        inv_set[i, 0] = np.trace(sijsij)
-        # S^3
-        inv_set[i, 1] = np.trace(sij_i @ sijsij)
-        # R^2
-        inv_set[i, 2] = np.trace(rijrij)
-        # R^2*S
-        inv_set[i, 3] = np.trace(rij_i @ rijsij)
-        # R^2*S^2
-        inv_set[i, 4] = np.trace(rij_i @ rijsijsij)
-        # R^2*S*R*S^2
-        inv_set[i, 5] = np.trace(rij_i @ (rij_i @ sijrijsijsij))
-        # For each sample, go through number of gradients, either 1 or 2.
-        # If n_grad = 1 or 2, then one or both of grad1 and grad2 will be included
-        for j in range(n_grad):
-            # If only grad1 is provided
-            if grad2 is None:
-                a = asymm_tensor1_i
-                asij, rija = a1sij, rija1
-                asijsij, arijrij = a1sijsij, a1rijrij
-                sijasijsij = sija1sijsij
-            # Else if only grad 2 is provided
-            elif grad1 is None:
-                a = asymm_tensor2_i
-                asij, rija = a2sij, rija2
-                asijsij, arijrij = a2sijsij, a2rijrij
-                sijasijsij = sija2sijsij
-            # Else if both grad1 and grad2 are provided
+        if f < 6:
+            # S^2
+            if f == 0: val = _contract(s, s)
+            # S^3
+            elif f == 1: val = _contract(s, ss)
+            # R^2
+            elif f == 2: val = _contract(r, r)
+            # R^2*S
+            elif f == 3: val = _contract(r, rs)
+            # R^2*S^2
+            elif f == 4: val = _contract(r, rss)
+            # R^2*S*R*S^2
+            else: val = _contract(rr, srss)
+        # Invariant features involving a gradient, total 13 for a gradient, grad1 then grad2
+        elif f < 32:
+            if f < 19:
+                a, aa, a_s, ass, sass = a1, a1a1, a1s, a1ss, sa1ss
+                k = f - 6
             else:
-                # Then go through grad1 then grad2
-                if j == 0:
-                    a = asymm_tensor1_i
-                    asij, rija = a1sij, rija1
-                    asijsij, arijrij = a1sijsij, a1rijrij
-                    sijasijsij = sija1sijsij
-                else:
-                    a = asymm_tensor2_i
-                    asij, rija = a2sij, rija2
-                    asijsij, arijrij = a2sijsij, a2rijrij
-                    sijasijsij = sija2sijsij
-
-            # Invariant features involving a gradient, total 13 for a gradient
+                a, aa, a_s, ass, sass = a2, a2a2, a2s, a2ss, sa2ss
+                k = f - 19
+
             # A^2
-            inv_set[i, 6 + j*13] = np.trace(a @ a)
+            if k == 0: val = _contract(a, a)
             # A^2*S
-            inv_set[i, 7 + j*13] = np.trace(a @ asij)
+            elif k == 1: val = _contract(a, a_s)
             # A^2*S^2
-            inv_set[i, 8 + j*13] = np.trace(a @ asijsij)
+            elif k == 2: val = _contract(a, ass)
             # A^2*S*A*S^2
-            inv_set[i, 9 + j*13] = np.trace(a @ (a @ sijasijsij))
+            elif k == 3: val = _contract(aa, sass)
             # R*A
-            inv_set[i, 10 + j*13] = np.trace(rija)
+            elif k == 4: val = _contract(r, a)
             # R*A*S
-            inv_set[i, 11 + j*13] = np.trace(rij_i @ asij)
+            elif k == 5: val = _contract(r, a_s)
             # R*A*S^2
-            inv_set[i, 12 + j*13] = np.trace(rij_i @ asijsij)
+            elif k == 6: val = _contract(r, ass)
             # R^2*A*S
-            inv_set[i, 13 + j*13] = np.trace(rij_i @ (rij_i @ asij))
+            elif k == 7: val = _contract(rr, a_s)
             # A^2*R*S (cyclic-permutation of anti-symmetric tensor labels of feature 13)
-            inv_set[i, 14 + j*13] = np.trace(a @ (a @ rijsij))
+            elif k == 8: val = _contract(aa, rs)
             # R^2*A*S^2
-            inv_set[i, 15 + j*13] = np.trace(rij_i @ (rij_i @ asijsij))
+            elif k == 9: val = _contract(rr, ass)
             # A^2*R*S^2 (cyclic-permutation of anti-symmetric tensor labels of feature 15)
-            inv_set[i, 16 + j*13] = np.trace(a @ (a @ rijsijsij))
+            elif k == 10: val = _contract(aa, rss)
             # R^2*S*A*S^2
-            inv_set[i, 17 + j*13] = np.trace(rij_i @ (rij_i @ sijasijsij))
+            elif k == 11: val = _contract(rr, sass)
             # A^2*S*R*S^2 (cyclic-permutation of anti-symmetric tensor labels of feature 17)
-            inv_set[i, 18 + j*13] = np.trace(a @ (a @ sijrijsijsij))
-
-        # If both grad1 and grad2 provided, then calculate their interaction invariant features, 15 in total
-        if grad1 is not None and grad2 is not None:
-            # A1*A2
-            inv_set[i, 32] = np.trace(asymm_tensor1_i @ asymm_tensor2_i)
-            # A1*A2*S
-            inv_set[i, 33] = np.trace(asymm_tensor1_i @ a2sij)
-            # A1*A2*S^2
-            inv_set[i, 34] = np.trace(asymm_tensor1_i @ a2sijsij)
-            # A1^2*A2*S
-            inv_set[i, 35] = np.trace(asymm_tensor1_i @ (asymm_tensor1_i @ a2sij))
-            # A2^2*A1*S (cyclic-permutation of anti-symmetric tensor labels of feature 35)
-            inv_set[i, 36] = np.trace(asymm_tensor2_i @ (asymm_tensor2_i @ a1sij))
-            # A1^2*A2*S^2
-            inv_set[i, 37] = np.trace(asymm_tensor1_i @ (asymm_tensor1_i @ a2sijsij))
-            # A2^2*A1*S^2 (cyclic-permutation of anti-symmetric tensor labels of feature 37)
-            inv_set[i, 38] = np.trace(asymm_tensor2_i @ (asymm_tensor2_i @ a1sijsij))
-            # A1^2*S*A2*S^2
-            inv_set[i, 39] = np.trace(asymm_tensor1_i @ (asymm_tensor1_i @ sija2sijsij))
-            # A2^2*S*A1*S^2 (cyclic-permutation of anti-symmetric tensor labels of feature 39)
-            inv_set[i, 40] = np.trace(asymm_tensor2_i @ (asymm_tensor2_i @ sija1sijsij))
-            # R*A1*A2
-            inv_set[i, 41] = np.trace(rij_i @ (asymm_tensor1_i @ asymm_tensor2_i))
-            # R*A1*A2*S
-            inv_set[i, 42] = np.trace(rij_i @ (asymm_tensor1_i @ a2sij))
-            # R*A2*A1*S
-            inv_set[i, 43] = np.trace(rij_i @ (asymm_tensor2_i @ a1sij))
-            # R*A1*A2*S^2
-            inv_set[i, 44] = np.trace(rij_i @ (asymm_tensor1_i @ a2sijsij))
-            # R*A2*A1*S^2
-            inv_set[i, 45] = np.trace(rij_i @ (asymm_tensor2_i @ a1sijsij))
-            # R*A1*S*A2*S^2
-            inv_set[i, 46] = np.trace(rij_i @ (asymm_tensor1_i @ sija2sijsij))
-
-        # Gauge progress
-        progress = float(i)/(sij.shape[0] + 1)*100.
-        if progress >= milestone:
-            printf(' %d %%... ', milestone)
-            milestone += 10
-
-    print("\n" + str(n_inv) + " invariant features calculated and stored column-wise ")
-    return inv_set, labels
-
-
-
-
-
+            else: val = _contract(aa, srss)
+        # Interaction invariant features of grad1 and grad2, 15 in total
+        # A1*A2
+        elif f == 32: val = _contract(a1, a2)
+        # A1*A2*S
+        elif f == 33: val = _contract(a1, a2s)
+        # A1*A2*S^2
+        elif f == 34: val = _contract(a1, a2ss)
+        # A1^2*A2*S
+        elif f == 35: val = _contract(a1a1, a2s)
+        # A2^2*A1*S (cyclic-permutation of anti-symmetric tensor labels of feature 35)
+        elif f == 36: val = _contract(a2a2, a1s)
+        # A1^2*A2*S^2
+        elif f == 37: val = _contract(a1a1, a2ss)
+        # A2^2*A1*S^2 (cyclic-permutation of anti-symmetric tensor labels of feature 37)
+        elif f == 38: val = _contract(a2a2, a1ss)
+        # A1^2*S*A2*S^2
+        elif f == 39: val = _contract(a1a1, sa2ss)
+        # A2^2*S*A1*S^2 (cyclic-permutation of anti-symmetric tensor labels of feature 39)
+        elif f == 40: val = _contract(a2a2, sa1ss)
+        # R*A1*A2
+        elif f == 41: val = _contract(ra1, a2)
+        # R*A1*A2*S
+        elif f == 42: val = _contract(ra1, a2s)
+        # R*A2*A1*S
+        elif f == 43: val = _contract(ra2, a1s)
+        # R*A1*A2*S^2
+        elif f == 44: val = _contract(ra1, a2ss)
+        # R*A2*A1*S^2
+        elif f == 45: val = _contract(ra2, a1ss)
+        # R*A1*S*A2*S^2
+        else: val = _contract(ra1, sa2ss)
+
+        inv[c] = <floating>val
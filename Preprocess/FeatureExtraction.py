@@ -8,6 +8,7 @@ import numpy as np
 from PostProcess_Tensor import convertTensorTo2D
 from Utilities import nDto2D_TensorField, timer
 from numba import jit, njit, prange
+from DataStore import readArrayData, readArrayManifest
 
 @timer
 @jit(parallel=True, fastmath=True)
@@ -99,6 +100,165 @@ def splitTrainTestDataList(list_data, test_fraction=0.2, sample_size=None, repla
     return list_data_train, list_data_test
 
 
+class ListData:
+    """
+    Lazy container of list_data_* bundles, e.g. [cc, x, y, tb, mask], saved by DataStore.saveArrayData().
+    Each member is stored separately and only memory-mapped once it is accessed,
+    either by attribute, e.g. list_data.x, by name, e.g. list_data['tb'], or by index as with a list, e.g. list_data[1].
+    Slicing, e.g. list_data[:1000], gives a ListData of a row range without loading anything;
+    sample() gives a random subsample reading only the picked rows from disk.
+    Both only apply to members with one entry per sample row, others such as mask are returned as is.
+    If only a legacy pickle exists, the whole list is read once on the first access instead.
+    """
+    def __init__(self, result_path, filename, names=('cc', 'x', 'y', 'tb', 'mask'), mmap_mode='c'):
+        """
+        :param result_path: Directory of the store.
+        :type result_path: str
+        :param filename: Store name without extension, e.g. "list_data_test_Confined2".
+        :type filename: str
+        :param names: Attribute names of members in saved order.
+        Names of members beyond the provided ones are not defined but they're still accessible by index.
+        :type names: list/tuple(str), optional (default=('cc', 'x', 'y', 'tb', 'mask'))
+        :param mmap_mode: Memory-map mode of numpy.load(). If None, members are loaded fully into RAM on access.
+        :type mmap_mode: "r" or "r+" or "c" or None, optional (default="c")
+        """
+        self.result_path, self.filename, self.names, self.mmap_mode = result_path, filename, tuple(names), mmap_mode
+        self.manifest = readArrayManifest(result_path, filename)
+        # Loaded members, shared with every row range or subsample of this ListData
+        self._members = {}
+        # Rows of this ListData, either None for all rows, range object, or array of indices
+        self._rows = None
+        # Number of members and samples known from manifest without loading anything
+        if self.manifest is not None:
+            self.n_members = len(self.manifest['arrays'])
+            self._n_rows = self.manifest['arrays'][0]['shape'][0] if self.n_members > 0 else 0
+        else:
+            self._loadLegacy()
+
+    def _loadLegacy(self):
+        # Legacy pickle has no manifest thus is read fully here
+        data = readArrayData(self.result_path, self.filename)
+        data = [data] if isinstance(data, np.ndarray) else data
+        self.n_members = len(data)
+        self._n_rows = len(data[0]) if self.n_members > 0 else 0
+        for i in range(self.n_members):
+            self._members[i] = data[i]
+
+    @property
+    def n_samples(self):
+        """
+        Number of rows of this ListData, taking into account slicing and sampling.
+        """
+        return self._n_rows if self._rows is None else len(self._rows)
+
+    def __len__(self):
+        # Number of members, consistent with the list it replaces
+        return self.n_members
+
+    def __iter__(self):
+        for i in range(self.n_members):
+            yield self[i]
+
+    def __getattr__(self, name):
+        # Only called when regular attribute lookup fails, i.e. for member names
+        if name in self.__dict__.get('names', ()):
+            return self[self.names.index(name)]
+
+        raise AttributeError("\n" + name + " is not a member of " + self.__dict__.get('filename', 'ListData') + "!\n")
+
+    def __getitem__(self, key):
+        """
+        :param key: Member index or name to get the member of this ListData's rows,
+        or slice of rows to get a ListData of a row range.
+        :type key: int or str or slice
+
+        :return: Member, or ListData of a row range.
+        :rtype: np.ndarray or ListData
+        """
+        if isinstance(key, slice):
+            rows = range(self._n_rows) if self._rows is None else self._rows
+            return self._withRows(rows[key])
+        elif isinstance(key, str):
+            if key not in self.names:
+                raise ValueError("\n" + key + " is not a member of " + self.filename + "!\n")
+
+            key = self.names.index(key)
+
+        if key < 0:
+            key += self.n_members
+
+        if not 0 <= key < self.n_members:
+            raise IndexError("\nMember index out of range for " + self.filename + "!\n")
+
+        return self._getRows(self._getMember(key))
+
+    def _getMember(self, i):
+        # Memory-map the member on first access
+        if i not in self._members:
+            entry = self.manifest['arrays'][i]
+            self._members[i] = np.load(entry['file'], mmap_mode=self.mmap_mode if np.prod(entry['shape']) > 0 else None)
+
+        return self._members[i]
+
+    def _getRows(self, member):
+        # Members not of one entry per sample row, e.g. mask of the whole domain, are not row-selected
+        if self._rows is None or np.shape(member)[:1] != (self._n_rows,):
+            return member
+        elif isinstance(self._rows, range):
+            # A row range is a view of the member
+            stop = self._rows.stop if self._rows.stop >= 0 else None
+            return member[self._rows.start:stop:self._rows.step]
+        else:
+            # Read picked rows in ascending order for sequential disk access, then reorder
+            order = np.argsort(self._rows, kind='stable')
+            rows_sorted = member[self._rows[order]]
+            rows = np.empty_like(rows_sorted)
+            rows[order] = rows_sorted
+            return rows
+
+    def _withRows(self, rows):
+        # New ListData sharing the loaded members but with different rows
+        list_data = ListData.__new__(ListData)
+        list_data.__dict__.update(self.__dict__)
+        list_data._rows = rows
+        return list_data
+
+    def sample(self, sample_size=None, replace=False, seed=None):
+        """
+        Randomly subsample rows of this ListData without materializing full members.
+        Same seed gives the same samples in the same order as splitTrainTestDataList(test_fraction=0.)
+        so that sampling either in memory or from disk is reproducible.
+
+        :param sample_size: Number of samples. If None, all samples are used in random order.
+        Limited to number of rows.
+        :type sample_size: int or None, optional (default=None)
+        :param replace: Whether to draw samples with replacement.
+        :type replace: bool, optional (default=False)
+        :param seed: Whether to use seed for reproducibility.
+        If None, then seed is not provided.
+        :type seed: int or None, optional (default=None)
+
+        :return: ListData of sampled rows. Members are only read when accessed.
+        :rtype: ListData
+        """
+        n_samples = self.n_samples
+        sample_size = n_samples if sample_size is None else int(min(sample_size, n_samples))
+        # Same random indices as splitTrainTestDataList()
+        np.random.seed(seed)
+        rand_indices = np.random.choice(np.arange(n_samples), n_samples, replace=replace)[:sample_size]
+        rows = rand_indices if self._rows is None else np.asarray(self._rows)[rand_indices]
+        return self._withRows(rows)
+
+    def toList(self):
+        """
+        Load all members of this ListData's rows.
+
+        :return: List of members.
+        :rtype: list(np.ndarray)
+        """
+        return [self[i] for i in range(self.n_members)]
+
+
 @timer
 def splitTrainTestData(x, y, randState=None, testSize=0.2, scalerScheme=None, scaler=None):
     from warnings import warn
@@ -8,12 +8,19 @@ from sklearn.feature_selection import VarianceThreshold, SelectFromModel
 from sklearn.preprocessing import MaxAbsScaler, MinMaxScaler
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.ensemble import RandomForestRegressor, AdaBoostRegressor, GradientBoostingRegressor
-from shutil import rmtree
+from shutil import rmtree, move
 from sklearn.model_selection import ParameterGrid
 import copy
 from joblib import dump, load
 from sklearn.base import clone
 import time as t
+import os, tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+# Grid search job being evaluated by a worker, (estimator, tb kwarg, data, set_final, staged, model directory),
+# set once per worker by _initGridSearchJob()
+_GS_JOB = None
 
 
 def setupDecisionTreePipelineGridSearchCV(gs_max_features=(1.,), gs_min_samples_split=(2,), gs_alpha_g_split=(0.,),
@@ -419,9 +426,11 @@ def setupRandomForestPipelineGridSearch(n_estimators=8, gs_max_features=(1/3.,),
                                 scaler=None,
                                 rf_selector_n_estimators=0,
                                 rf_selector_threshold='median',
+                                gs_n_estimators=None,
                                 # [DEPRECATED]
                                 alpha_g_fit=0., 
                                 **kwargs):
+    # If gs_n_estimators is given, n_estimators is tuned too, which the GS drivers evaluate as one warm-started sweep
     # Setup feature selector and scaler, could both be None
     feat_selector, scaler = _setupFeatureSelector(var_threshold, scaler, rf_selector_n_estimators,
                                                   rf_selector_threshold,
@@ -430,6 +439,7 @@ def setupRandomForestPipelineGridSearch(n_estimators=8, gs_max_features=(1/3.,),
     if isinstance(gs_max_features, (int, float)): gs_max_features = (gs_max_features,)
     if isinstance(gs_min_samples_split, (int, float)): gs_min_samples_split = (gs_min_samples_split,)
     if isinstance(gs_alpha_g_split, (int, float)): gs_alpha_g_split = (gs_alpha_g_split,)
+    if isinstance(gs_n_estimators, int): gs_n_estimators = (gs_n_estimators,)
     # Initialize random forest regressor object
     rf = RandomForestRegressor(n_estimators=n_estimators, n_jobs=n_jobs, verbose=gs_verbose,
                                  oob_score=oob_score, random_state=rand_state,
@@ -473,6 +483,8 @@ def setupRandomForestPipelineGridSearch(n_estimators=8, gs_max_features=(1/3.,),
         # So is the kwarg to supply Tij to regressor.fit() method  
         fit_param_key = 'rf__tb'
 
+    if gs_n_estimators is not None: tuneparams[fit_param_key.replace('tb', 'n_estimators')] = gs_n_estimators
+
     return regressor, tuneparams, fit_param_key
 
 
@@ -646,9 +658,11 @@ def setupAdaBoostPipelineGridSearchCV(n_estimators=50, gs_max_features=(1/3.,),
                             scaler=None,
                             rf_selector_n_estimators=1000,
                             rf_selector_threshold='median',
+                            gs_n_estimators=None,
                             # [DEPRECATED]
                             alpha_g_fit=0.,
                             **kwargs):
+    # If gs_n_estimators is given, n_estimators is tuned too, which the GS drivers evaluate as one staged sweep
     # Setup feature selector and scaler, could both be None
     feat_selector, scaler = _setupFeatureSelector(var_threshold, scaler, rf_selector_n_estimators,
                                                   rf_selector_threshold,
@@ -658,6 +672,7 @@ def setupAdaBoostPipelineGridSearchCV(n_estimators=50, gs_max_features=(1/3.,),
     if isinstance(gs_max_depth, (int, float)): gs_max_depth = (gs_max_depth,)
     if isinstance(gs_alpha_g_split, (int, float)): gs_alpha_g_split = (gs_alpha_g_split,)
     if isinstance(gs_learning_rate, (int, float)): gs_learning_rate = (gs_learning_rate,)
+    if isinstance(gs_n_estimators, int): gs_n_estimators = (gs_n_estimators,)
 
     # Initialize wake tree learner object
     base = DecisionTreeRegressor(presort=presort, tb_verbose=tb_verbose,
@@ -704,6 +719,7 @@ def setupAdaBoostPipelineGridSearchCV(n_estimators=50, gs_max_features=(1/3.,),
         # So is the kwarg to supply Tij to regressor.fit() method
         fit_param_key = 'ab__tb'
 
+    if gs_n_estimators is not None: tuneparams[fit_param_key.replace('tb', 'n_estimators')] = gs_n_estimators
     # Construct GSCV for DT
     ab_gscv = GridSearchCV(regressor,
                            cv=cv,
@@ -912,11 +928,13 @@ def setupGradientBoostPipelineGridSearchCV(n_estimators=50, gs_max_features=(1/3
                                    validation_fraction=0.1,
                                    alpha=0.9,
                                    init='zero',
+                                   gs_n_estimators=None,
                             # [DEPRECATED]
                             alpha_g_fit=0.,
                             **kwargs):
     from sklearn.ensemble import GradientBoostingRegressor
 
+    # If gs_n_estimators is given, n_estimators is tuned too, which the GS drivers evaluate as one warm-started sweep
     # Setup feature selector and scaler, could both be None
     feat_selector, scaler = _setupFeatureSelector(var_threshold, scaler, rf_selector_n_estimators,
                                                   rf_selector_threshold,
@@ -926,6 +944,7 @@ def setupGradientBoostPipelineGridSearchCV(n_estimators=50, gs_max_features=(1/3
     if isinstance(gs_max_depth, (int, float)): gs_max_depth = (gs_max_depth,)
     if isinstance(gs_alpha_g_split, (int, float)): gs_alpha_g_split = (gs_alpha_g_split,)
     if isinstance(gs_learning_rate, (int, float)): gs_learning_rate = (gs_learning_rate,)
+    if isinstance(gs_n_estimators, int): gs_n_estimators = (gs_n_estimators,)
     # Initialize GradientBoosting object
     gb = GradientBoostingRegressor(subsample=subsample,
                                    criterion=criterion,
@@ -978,6 +997,8 @@ def setupGradientBoostPipelineGridSearchCV(n_estimators=50, gs_max_features=(1/3
                           gb__learning_rate=gs_learning_rate)
         fit_param_key = 'gb__tb'
 
+    if gs_n_estimators is not None: tuneparams[fit_param_key.replace('tb', 'n_estimators')] = gs_n_estimators
+
     # Construct GSCV for DT
     gb_gscv = GridSearchCV(regressor,
                            cv=cv,
@@ -1002,74 +1023,112 @@ def performEstimatorGridSearchCV_Dask(estimator_gscv, estimator_final, x_gs, y_g
                                       cores=32,
                                       walltime='24:00:00',
                                       memory='96GB',
+                                      cluster_factory=None,
+                                      cluster_kwargs=None,
+                                      verbose_tasks=True,
                                  **kwargs):
-    from dask_jobqueue import PBSCluster
+    """
+    GSCV on a Dask cluster. GS data are scattered to the workers once and every (hyper-parameter grid, CV fold) task
+    references them, fitting and scoring one fold. Transfer and compute timings of each task are reported.
+    Feature selectors of a pipeline are fitted locally before GSCV, the same way as fitting the pipeline would.
+
+    :param cores: Cores per job of the default PBSCluster.
+    :type cores: int, optional (default=32)
+    :param walltime: Walltime per job of the default PBSCluster.
+    :type walltime: str, optional (default='24:00:00')
+    :param memory: Memory per job of the default PBSCluster.
+    :type memory: str, optional (default='96GB')
+    :param cluster_factory: Cluster class or any callable returning a cluster, called as cluster_factory(**cluster_kwargs),
+    e.g. dask.distributed.LocalCluster to develop and benchmark on a single workstation.
+    If None, a PBSCluster of cores, walltime and memory is used.
+    :type cluster_factory: callable or None, optional (default=None)
+    :param cluster_kwargs: Keyword arguments of cluster_factory.
+    :type cluster_kwargs: dict or None, optional (default=None)
+    :param verbose_tasks: Whether to print timings of every task besides their summary.
+    :type verbose_tasks: bool, optional (default=True)
+
+    :return: The final estimator and best hyper-parameters.
+    :rtype: (estimator, dict)
+    """
     from dask.distributed import Client
     from joblib import parallel_backend
-    cluster = PBSCluster(cores=cores,
-                         interface='eth0',
-                         walltime=walltime,
-                         memory=memory)
-    client = Client(cluster)
-
-    # FIXME: memory=pipeline_cachedir in Pipeline() not working properly here
-    # If refit is enabled i.e. train after GSCV,
-    # and if any of the train data is not provided, assume data for train is the same as GSCV
-    if refit and x_train is None: x_train = x_gs.copy()
-    if refit and y_train is None: y_train = y_gs.copy()
-    if refit and tb_train is None: tb_train = tb_gs.copy()
-    # Tij fit kwarg to be passed to fit() method during GSCV
-    fit_param = {tb_kw: tb_gs}
-    # GSCV, will also fit feature selector if estimator_gscv is a pipeline
-    if gs:
-        print('\nPerforming estimator GSCV...')
-        with parallel_backend('dask'):
-            estimator_gscv.fit(x_gs, y_gs, **fit_param)
-
-        if save:
-            # Save the GSCV for further inspection
-            dump(estimator_gscv, savedir + '/' + gscv_name + '.joblib')
-            print('\nFitted {0} saved at {1}'.format(gscv_name, savedir))
-
-    is_pipeline = True if hasattr(estimator_gscv, 'steps') else False
-    # Best hyper-parameters found through GSCV.
-    # best_params_ stored in final step of the estimator_gs pipeline or directly in estimator_gs
-    best_params = estimator_gscv._final_estimator.best_params_ if is_pipeline else estimator_gscv.best_params_
-    # If there's feature selection i.e. estimator_gscv and estimator_final are pipelines
-    if is_pipeline:
-        # If pipeline, step names excl. the actual regressor name
-        selector_steps = [tuple[0] for tuple in estimator_gscv.steps[:-1]]
-        # Then assign the fitted selectors to the unfitted final estimator pipeline
-        for i, name in enumerate(selector_steps):
-            estimator_final.named_steps[name] = copy.deepcopy(estimator_gscv.named_steps[name])
-            estimator_final.steps[i] = copy.deepcopy(estimator_gscv.steps[i])
-            # If refit, use the fitted feature selector to transform training x
-            if refit:
-                with parallel_backend('dask'):#, scatter=[x_train]):
-                    x_train = estimator_final.named_steps[name].transform(x_train)
+    if cluster_factory is None:
+        from dask_jobqueue import PBSCluster
 
-        # Lastly, assign the found best hyper-parameters to estimator_final
-        estimator_final._final_estimator.set_params(**best_params)
+        cluster = PBSCluster(cores=cores,
+                             interface='eth0',
+                             walltime=walltime,
+                             memory=memory)
     else:
-        estimator_final.set_params(**best_params)
-
-    print('\nBest hyper-parameters assigned to regressor: {}'.format(best_params))
-    # Now we can start actual training, if refit is requested
-    if refit:
-        print('\nRe-fitting estimator with best hyper-parameters and training data...')
-        # If pipeline, only fit the regressor since the feature selector has been fitted already during GSCV.
-        # Also, x_train has been transformed by feature selector already above
-        with parallel_backend('dask'):#, scatter=[x_train, y_train, tb_train]):
-            if is_pipeline:
-                estimator_final._final_estimator.fit(x_train, y_train, tb=tb_train)
-            # Otherwise, estimator_final itself is the regressor object
-            else:
-                estimator_final.fit(x_train, y_train, tb=tb_train)
-
-        if save:
-            # Save the final fitted regressor
-            dump(estimator_final, savedir + '/' + final_name + '.joblib')
-            print('\nFitted {0} saved at {1}'.format(final_name, savedir))
+        cluster = cluster_factory(**({} if cluster_kwargs is None else cluster_kwargs))
+
+    client = None
+    try:
+        client = Client(cluster)
+        # FIXME: memory=pipeline_cachedir in Pipeline() not working properly here
+        # If refit is enabled i.e. train after GSCV,
+        # and if any of the train data is not provided, assume data for train is the same as GSCV
+        if refit and x_train is None: x_train = x_gs.copy()
+        if refit and y_train is None: y_train = y_gs.copy()
+        if refit and tb_train is None: tb_train = tb_gs.copy()
+        is_pipeline = True if hasattr(estimator_gscv, 'steps') else False
+        # GSCV, will also fit feature selector if estimator_gscv is a pipeline
+        if gs:
+            print('\nPerforming estimator GSCV...')
+            # If pipeline, fit the feature selectors and transform x, then GSCV is its final step
+            x_cv = x_gs
+            for _, step in (estimator_gscv.steps[:-1] if is_pipeline else []):
+                x_cv = step.fit_transform(x_cv, y_gs)
+
+            gscv = estimator_gscv._final_estimator if is_pipeline else estimator_gscv
+            # The tb kwarg of a pipeline is for its final step, i.e. the estimator of GSCV
+            _fitGridSearchCVDask(client, gscv, x_cv, y_gs, tb_gs, tb_kw=tb_kw.split('__', 1)[-1] if is_pipeline else tb_kw,
+                                 verbose_tasks=verbose_tasks)
+            if save:
+                # Save the GSCV for further inspection
+                dump(estimator_gscv, savedir + '/' + gscv_name + '.joblib')
+                print('\nFitted {0} saved at {1}'.format(gscv_name, savedir))
+
+        # Best hyper-parameters found through GSCV.
+        # best_params_ stored in final step of the estimator_gs pipeline or directly in estimator_gs
+        best_params = estimator_gscv._final_estimator.best_params_ if is_pipeline else estimator_gscv.best_params_
+        # If there's feature selection i.e. estimator_gscv and estimator_final are pipelines
+        if is_pipeline:
+            # If pipeline, step names excl. the actual regressor name
+            selector_steps = [tuple[0] for tuple in estimator_gscv.steps[:-1]]
+            # Then assign the fitted selectors to the unfitted final estimator pipeline
+            for i, name in enumerate(selector_steps):
+                estimator_final.named_steps[name] = copy.deepcopy(estimator_gscv.named_steps[name])
+                estimator_final.steps[i] = copy.deepcopy(estimator_gscv.steps[i])
+                # If refit, use the fitted feature selector to transform training x
+                if refit: x_train = estimator_final.named_steps[name].transform(x_train)
+
+            # Lastly, assign the found best hyper-parameters to estimator_final
+            estimator_final._final_estimator.set_params(**best_params)
+        else:
+            estimator_final.set_params(**best_params)
+
+        print('\nBest hyper-parameters assigned to regressor: {}'.format(best_params))
+        # Now we can start actual training, if refit is requested
+        if refit:
+            print('\nRe-fitting estimator with best hyper-parameters and training data...')
+            # If pipeline, only fit the regressor since the feature selector has been fitted already during GSCV.
+            # Also, x_train has been transformed by feature selector already above
+            with parallel_backend('dask'):
+                if is_pipeline:
+                    estimator_final._final_estimator.fit(x_train, y_train, tb=tb_train)
+                # Otherwise, estimator_final itself is the regressor object
+                else:
+                    estimator_final.fit(x_train, y_train, tb=tb_train)
+
+            if save:
+                # Save the final fitted regressor
+                dump(estimator_final, savedir + '/' + final_name + '.joblib')
+                print('\nFitted {0} saved at {1}'.format(final_name, savedir))
+
+    finally:
+        if client is not None: client.close()
+        cluster.close()
 
     # If transformers in pipelines have been cached, remove them after fitting
     if is_pipeline:
@@ -1159,8 +1218,17 @@ def performEstimatorGridSearch(estimator_gs, estimator_final, tuneparams, x_gs,
                                x_test=None, y_test=None, tb_test=None,
                                gs=True, refit=True,
                                save=True, savedir='./', gs_name='GS', final_name='final',
+                               gs_n_jobs=1, gs_share_dir=None, gs_keep_best=False, gs_warm_start=True,
                                **kwargs):
     # FIXME: memory=pipeline_cachedir in Pipeline() not working properly here
+    # If gs_n_jobs is not 1, grids are evaluated concurrently by gs_n_jobs processes (-1 means number of CPUs)
+    # that memory-map GS and test data placed once in a temporary directory under gs_share_dir (None means system default).
+    # Parallelism inside the estimator, i.e. its n_jobs, should then be reduced accordingly.
+    # Only the best hyper-parameters and score are tracked during GS. If save, the best fitted model so far is spilled
+    # uncompressed to gs_name.joblib instead. Only if gs_keep_best, the best fitted model is kept in memory
+    # and, if not refit, reused as the final regressor.
+    # If gs_warm_start, grids only differing in n_estimators are evaluated as one sweep, fitting boosting once
+    # with the most estimators and scoring its stages, and growing other ensembles e.g. random forest incrementally
     print('\nHyper-parameter grid: {0}'.format(tuneparams))
     # If refit is enabled i.e. train after GS,
     # and if any of the train/test data is not provided, assume data for train/test is the same as GS
@@ -1170,50 +1238,582 @@ def performEstimatorGridSearch(estimator_gs, estimator_final, tuneparams, x_gs,
     if refit and x_test is None: x_test = x_gs.copy()
     if refit and y_test is None: y_test = y_gs.copy()
     if refit and tb_test is None: tb_test = tb_gs.copy()
-    # Tij fit kwarg to be passed to fit() method during GS
-    fit_param = {tb_kw: tb_gs}
     is_pipeline = True if hasattr(estimator_gs, 'steps') else False
     if gs:
-        # Initialize best score and will be updated once found better
-        best_score = -np.inf
-        best_grid = {}
-        best_estimator = copy.deepcopy(estimator_gs)
+        grids = list(ParameterGrid(tuneparams))
         print('\nPerforming estimator GS...')
-        for grid in ParameterGrid(tuneparams):
-            if is_pipeline:
-                estimator_gs._final_estimator.set_params(**grid)
+        # Fit the GS data while also fitting feature selector if pipeline
+        scores, best_estimator = _evaluateGrids(estimator_gs, grids, tb_kw, x_gs, y_gs, tb_gs, x_test, y_test, tb_test,
+                                                set_final=is_pipeline, warm_start=gs_warm_start,
+                                                keep_best=_keepBestEstimator(is_pipeline, gs_n_jobs, gs_keep_best),
+                                                spill_file=savedir + '/' + gs_name + '.joblib' if save else None,
+                                                n_jobs=gs_n_jobs, share_dir=gs_share_dir)
+        best_score = max(scores)
+        best_grid = grids[scores.index(best_score)]
+        print(' Best [score] is {}'.format(best_score))
+        print(' Best [hyper-parameters] are \n  {}'.format(best_grid))
+        # Fitted best model found through GS has been saved for further inspection
+        if save: print('\nFitted {0} saved at {1}'.format(gs_name, savedir))
+        estimator_gs = _assignBestGrid(estimator_gs, best_estimator, best_grid, is_pipeline)
+
+    estimator_final = _refitBestEstimator(estimator_gs, estimator_final, x_train, y_train, tb_train,
+                                          refit=refit, save=save, savedir=savedir, final_name=final_name,
+                                          reuse_fitted=gs_keep_best)
+    # The pipeline or simply regressor after GS.
+    # If pipeline, the feature selector is already fitted while the actual regressor might not depending on whether train data is supplied
+    return estimator_final, best_grid
+
+
+def performEstimatorHalvingSearch(estimator_gs, estimator_final, tuneparams, x_gs, y_gs,
+                                  tb_kw='tb', tb_gs=None, x_train=None, y_train=None, tb_train=None,
+                                  x_test=None, y_test=None, tb_test=None,
+                                  resource='auto', min_resource=None, max_resource=None, factor=3, rand_state=None,
+                                  gs=True, refit=True,
+                                  save=True, savedir='./', gs_name='GS', final_name='final',
+                                  gs_n_jobs=1, gs_share_dir=None, gs_keep_best=False,
+                                  **kwargs):
+    """
+    Successive halving search alongside performEstimatorGridSearch(), with the same data, refit and save arguments.
+    All grids of tuneparams start with a small budget of a resource and only the best 1/factor of them
+    advance to the next rung with factor times the budget, until the last rung that uses max_resource.
+    If resource is "n_samples", the budget is the number of GS samples, drawn as nested random subsets
+    with x_gs, y_gs and tb_gs subsampled consistently. This suits (tensor basis) decision trees.
+    If resource is "n_estimators", the budget is the number of trees of the ensemble on all GS samples.
+    Candidates are scored as in performEstimatorGridSearch(), i.e. by OOB score if available, otherwise on test data,
+    and the best fitted model is spilled and kept in memory or not in the same way.
+
+    :param resource: Budget given to candidates. If "auto", "n_estimators" if the regressor has it, otherwise "n_samples".
+    :type resource: "auto" or "n_samples" or "n_estimators", optional (default="auto")
+    :param min_resource: Budget of the first rung, between 1 and max_resource.
+    If None, chosen so that the last rung is reached with max_resource.
+    :type min_resource: int or None, optional (default=None)
+    :param max_resource: Budget of the last rung. If None, number of GS samples or n_estimators of the regressor.
+    :type max_resource: int or None, optional (default=None)
+    :param factor: Budget growth and candidate reduction factor between rungs, greater than 1.
+    :type factor: int, optional (default=3)
+    :param rand_state: Seed of the sample subsets.
+    :type rand_state: int or None, optional (default=None)
+
+    :return: The final estimator and best hyper-parameters.
+    :rtype: (estimator, dict)
+    """
+    print('\nHyper-parameter grid: {0}'.format(tuneparams))
+    # If refit is enabled i.e. train after GS,
+    # and if any of the train data is not provided, assume data for train is the same as GS
+    if refit and x_train is None: x_train = x_gs.copy()
+    if refit and y_train is None: y_train = y_gs.copy()
+    if refit and tb_train is None: tb_train = tb_gs.copy()
+    # Candidates without OOB score are scored on the full GS data if no test data is provided
+    if x_test is None: x_test, y_test, tb_test = x_gs, y_gs, tb_gs
+    is_pipeline = True if hasattr(estimator_gs, 'steps') else False
+    regressor = estimator_gs._final_estimator if is_pipeline else estimator_gs
+    if resource == 'auto':
+        resource = 'n_estimators' if 'n_estimators' in regressor.get_params() else 'n_samples'
+
+    if resource not in ('n_samples', 'n_estimators'):
+        raise ValueError("\nresource has to be 'auto', 'n_samples' or 'n_estimators'!\n")
+
+    if max_resource is None:
+        max_resource = len(x_gs) if resource == 'n_samples' else regressor.get_params()['n_estimators']
+
+    if factor <= 1:
+        raise ValueError("\nfactor has to be greater than 1!\n")
+
+    if max_resource < 1 or (min_resource is not None and not 1 <= min_resource <= max_resource):
+        raise ValueError("\nmin_resource and max_resource have to satisfy 1 <= min_resource <= max_resource!\n")
+
+    best_grid = {}
+    if gs:
+        candidates = list(ParameterGrid(tuneparams))
+        # Number of rungs to narrow candidates down to 1, fewer if min_resource doesn't leave room for them
+        n_rungs = 1 + int(np.floor(np.log(len(candidates))/np.log(factor)))
+        if min_resource is None:
+            min_resource = max(max_resource//factor**(n_rungs - 1), 1)
+        else:
+            n_rungs = min(n_rungs, 1 + int(np.floor(np.log(max_resource/min_resource)/np.log(factor))))
+
+        # At least the last rung with max_resource
+        n_rungs = max(n_rungs, 1)
+
+        # Nested sample subsets, the same rows of x_gs, y_gs and tb_gs
+        perm = np.random.RandomState(rand_state).permutation(len(x_gs)) if resource == 'n_samples' else None
+        print('\nPerforming estimator successive halving GS of {0} candidates in {1} rung(s)...'.format(len(candidates), n_rungs))
+        t0 = t.time()
+        for rung in range(n_rungs):
+            # The last rung always uses the full budget
+            budget = max_resource if rung == n_rungs - 1 else min(min_resource*factor**rung, max_resource)
+            print('\n Rung {0}: {1} candidate(s) with {2} = {3}'.format(rung, len(candidates), resource, budget))
+            if resource == 'n_samples':
+                idx = np.sort(perm[:budget])
+                x_rung, y_rung = x_gs[idx], y_gs[idx]
+                tb_rung = tb_gs[idx] if tb_gs is not None else None
+                grids = candidates
             else:
-                estimator_gs.set_params(**grid)
-
-            # Fit the GS data while also fitting feature selector if pipeline
-            estimator_gs.fit(x_gs, y_gs, **fit_param)
-            # If the estimator uses out-of-bag samples, then the score is oob_score_ that uses the train data
-            estimator_gs_final = estimator_gs.steps[-1][1] if is_pipeline else estimator_gs
-            if hasattr(estimator_gs_final, 'oob_score_'):
-                print(' Using OOB score...')
-                score = estimator_gs_final.oob_score_
-            # Else, use the default/custom score method on the test data
+                x_rung, y_rung, tb_rung = x_gs, y_gs, tb_gs
+                grids = [dict(grid, n_estimators=budget) for grid in candidates]
+
+            # Only the fitted best of the last rung is of interest
+            last = rung == n_rungs - 1
+            scores, best_estimator = _evaluateGrids(estimator_gs, grids, tb_kw, x_rung, y_rung, tb_rung, x_test, y_test, tb_test,
+                                                    set_final=is_pipeline,
+                                                    keep_best=last and _keepBestEstimator(is_pipeline, gs_n_jobs, gs_keep_best),
+                                                    spill_file=savedir + '/' + gs_name + '.joblib' if save and last else None,
+                                                    n_jobs=gs_n_jobs, share_dir=gs_share_dir)
+            # Stable sort so that ties keep grid order as in performEstimatorGridSearch()
+            order = np.argsort(-np.array(scores), kind='stable')
+            if not last:
+                candidates = [candidates[i] for i in order[:int(np.ceil(len(candidates)/factor))]]
             else:
-                score = estimator_gs.score(x_test, y_test, tb=tb_test)
-
-            print(' Current score is {} for {}'.format(score, grid))
-            # Save if best
-            if score > best_score:
-                print(' Old best score is {0}'.format(best_score))
-                print(' New best score is {0}'.format(score))
-                best_score = score
-                best_grid = grid
-                best_estimator = copy.deepcopy(estimator_gs)
+                best_score, best_grid = scores[order[0]], grids[order[0]]
 
+        t1 = t.time()
+        print('\nFinished successive halving GS in {0:.4f} min'.format((t1 - t0)/60.))
         print(' Best [score] is {}'.format(best_score))
         print(' Best [hyper-parameters] are \n  {}'.format(best_grid))
-        # Reassign estimator_gs to the best fitted model so that it's reusable
-        estimator_gs = best_estimator
-        if save:
-            # Save the GS for further inspection
-            dump(estimator_gs, savedir + '/' + gs_name + '.joblib')
-            print('\nFitted {0} saved at {1}'.format(gs_name, savedir))
+        if save: print('\nFitted {0} saved at {1}'.format(gs_name, savedir))
+        estimator_gs = _assignBestGrid(estimator_gs, best_estimator, best_grid, is_pipeline)
+
+    estimator_final = _refitBestEstimator(estimator_gs, estimator_final, x_train, y_train, tb_train,
+                                          refit=refit, save=save, savedir=savedir, final_name=final_name,
+                                          reuse_fitted=gs_keep_best)
+    return estimator_final, best_grid
+
+
+@timer
+def performEstimatorPipelineGridSearch(estimator_gs, tuneparams, x_train, y_train,
+                               tb_kw='tb', tb_train=None, x_test=None, y_test=None, tb_test=None,
+                               staged=False, refit=False,
+                               gs_n_jobs=1, gs_share_dir=None, gs_warm_start=True,
+                               **kwargs):
+    # If gs_n_jobs is not 1, grids are evaluated concurrently by gs_n_jobs processes,
+    # and if gs_warm_start, n_estimators sweeps are warm-started, see performEstimatorGridSearch()
+    print(' {0}'.format(tuneparams))
+    fit_params = {}
+    fit_params[tb_kw] = tb_train
+    grids = list(ParameterGrid(tuneparams))
+    # Fit the train data for ML, only tracking the best hyper-parameters and score
+    scores, _ = _evaluateGrids(estimator_gs, grids, tb_kw, x_train, y_train, tb_train, x_test, y_test, tb_test,
+                               staged=staged, warm_start=gs_warm_start, keep_best=False,
+                               n_jobs=gs_n_jobs, share_dir=gs_share_dir)
+    best_score = max(scores)
+    best_grid = grids[scores.index(best_score)]
+    print(' Best [score] is {}'.format(best_score))
+    print(' Best [hyper-parameters] are \n  {}'.format(best_grid))
+
+    # Set the best hyper-parameters to the estimator
+    estimator_gs.set_params(**best_grid)
+    # The previous fits were cleared thus need to refit using the best hyper-parameters
+    if refit:
+        print(' Re-fitting the model using the best hyper-parameters...')
+        estimator_gs.fit(x_train, y_train, **fit_params)
+
+    return best_grid
+
+
+def _transformSelectors(x, estimator):
+    # Transform x by the fitted scaler and feature selector of a pipeline, i.e. every step before the final regressor
+    for _, step in getattr(estimator, 'steps', [])[:-1]:
+        x = step.transform(x)
+
+    return x
+
+
+def _scoreEstimator(estimator, x_test, y_test, tb_test, staged=False):
+    # If the estimator uses out-of-bag samples, then the score is oob_score_ that uses the train data
+    estimator_final = estimator.steps[-1][1] if hasattr(estimator, 'steps') else estimator
+    if hasattr(estimator_final, 'oob_score_'):
+        print(' Using OOB score...')
+        score = estimator_final.oob_score_
+    # Else, use the default/custom score method on the test data
+    else:
+        if staged and hasattr(estimator_final, 'staged_score'):
+            print('')
+            # The final regressor only takes test data transformed by the pipeline selectors
+            for iboost, score_staged in enumerate(estimator_final.staged_score(_transformSelectors(x_test, estimator),
+                                                                               y_test, tb=tb_test)):
+                # When iboost reaches the end, that score should be the best for this hyper-parameter grid
+                score = score_staged
+                print(' Staged score after boost {0}: {1}'.format(iboost + 1, score))
+            print('')
+        else:
+            score = estimator.score(x_test, y_test, tb=tb_test)
+
+    return score
+
+
+def _setGridParams(estimator, grid, set_final=False):
+    # Either the grid is for the final estimator of a pipeline or keys are already prefixed by step names
+    if set_final:
+        estimator._final_estimator.set_params(**grid)
+    else:
+        estimator.set_params(**grid)
+
+
+def _isBetter(score, i, best_score, best_i):
+    # Ties go to the earlier grid so that the best grid doesn't depend on evaluation order
+    return score > best_score or (score == best_score and i < best_i)
+
+
+def _groupSweeps(estimator, grids, set_final=False):
+    """
+    Group indices of grids that only differ in number of estimators of the regressor, each group sorted by it ascending,
+    so that a group can be evaluated as one sweep by _fitScoreSweep().
+
+    :return: Number of estimators key of grids, and list of groups of grid indices.
+    :rtype: (str, list(list(int)))
+    """
+    n_key = 'n_estimators' if set_final or not hasattr(estimator, 'steps') else estimator.steps[-1][0] + '__n_estimators'
+    sweeps = {}
+    for i, grid in enumerate(grids):
+        rest = repr(sorted((key, val) for key, val in grid.items() if key != n_key)) if n_key in grid else i
+        sweeps.setdefault(rest, []).append(i)
+
+    return n_key, [sorted(sweep, key=lambda i: grids[i].get(n_key, 0)) for sweep in sweeps.values()]
+
+
+def _fitScoreSweep(estimator, grids, n_key, tb_kw, x_gs, y_gs, tb_gs=None, x_test=None, y_test=None, tb_test=None,
+                   set_final=False, staged=False):
+    """
+    Fit and score an estimator with grids that only differ in number of estimators n_key, sorted by it ascending,
+    yielding position, score, and whether the estimator is currently fitted with that grid for every grid.
+    A regressor with staged_score(), i.e. boosting, is fitted once with the most estimators and scored at every number of them.
+    Any other regressor with warm_start, e.g. random forest, is grown incrementally and scored every time.
+    Otherwise, or for a single grid, every grid is fitted from scratch.
+    """
+    regressor = estimator.steps[-1][1] if hasattr(estimator, 'steps') else estimator
+    if len(grids) > 1 and hasattr(regressor, 'staged_score'):
+        _setGridParams(estimator, grids[-1], set_final)
+        estimator.fit(x_gs, y_gs, **{tb_kw: tb_gs})
+        # The final regressor only takes test data transformed by the pipeline selectors
+        scores = list(regressor.staged_score(_transformSelectors(x_test, estimator), y_test, tb=tb_test))
+        for j, grid in enumerate(grids):
+            # Boosting may terminate early, in which case more estimators give the same fit
+            yield j, scores[min(grid[n_key], len(scores)) - 1], j == len(grids) - 1
+
+    elif len(grids) > 1 and 'warm_start' in regressor.get_params():
+        warm_start = regressor.get_params()['warm_start']
+        try:
+            for j, grid in enumerate(grids):
+                _setGridParams(estimator, grid, set_final)
+                if j == 0:
+                    estimator.fit(x_gs, y_gs, **{tb_kw: tb_gs})
+                    # Afterwards, only the final regressor is grown, on data transformed once by the fitted pipeline selectors
+                    regressor.set_params(warm_start=True)
+                    x_fit = _transformSelectors(x_gs, estimator)
+                else:
+                    regressor.fit(x_fit, y_gs, **{tb_kw.split('__')[-1]: tb_gs})
+
+                yield j, _scoreEstimator(estimator, x_test, y_test, tb_test), True
+
+        finally:
+            regressor.set_params(warm_start=warm_start)
+
+    else:
+        for j, grid in enumerate(grids):
+            _setGridParams(estimator, grid, set_final)
+            estimator.fit(x_gs, y_gs, **{tb_kw: tb_gs})
+            yield j, _scoreEstimator(estimator, x_test, y_test, tb_test, staged=staged), True
+
+
+def _shareArrays(arrays, share_dir):
+    """
+    Place arrays once in .npy files of share_dir for grid search workers to memory-map instead of receiving copies.
+    Read-only arrays memory-mapped from a whole .npy file, e.g. read by DataStore.readArrayData(mmap_mode='r'), are referenced as is.
+    Copy-on-write arrays may differ from their file after in-place edits thus are saved like any other array.
+    """
+    files = []
+    for i, arr in enumerate(arrays):
+        if arr is None:
+            files.append(None)
+            continue
+
+        if isinstance(arr, np.memmap) and arr.filename is not None and arr.filename.endswith('.npy') \
+                and arr.mode == 'r' and arr.flags['C_CONTIGUOUS']:
+            ref = np.load(arr.filename, mmap_mode='r')
+            # A view of part of the file can't be referenced by the file name
+            if ref.shape == arr.shape and ref.dtype == arr.dtype:
+                files.append(arr.filename)
+                continue
+
+        files.append(os.path.join(share_dir, 'data' + str(i) + '.npy'))
+        np.save(files[-1], arr)
+
+    return files
+
+
+def _initGridSearchJob(job):
+    # Memory-map the shared data in each worker, copy-on-write so that estimators requiring writable arrays work too
+    global _GS_JOB
+    estimator, grids, n_key, tb_kw, files, set_final, staged, model_dir = job
+    data = tuple(None if file is None else np.load(file, mmap_mode='c') for file in files)
+    _GS_JOB = (estimator, grids, n_key, tb_kw, data, set_final, staged, model_dir)
+
+
+def _fitScoreSweepTask(sweep):
+    """
+    Fit a clone of the estimator in _GS_JOB with a sweep of grids, see _fitScoreSweep(), and score them in a worker.
+    If a model directory is given, the best fitted estimator of the sweep is dumped there uncompressed for the caller to keep if best.
+
+    :return: Score of every grid of the sweep, position of the best, whether its fitted model is dumped, the dump file, and run time.
+    :rtype: (list(float), int, bool, str or None, float)
+    """
+    estimator, grids, n_key, tb_kw, data, set_final, staged, model_dir = _GS_JOB
+    estimator = clone(estimator)
+    t0 = t.time()
+    scores, best_j, captured = [], None, False
+    model_file = None if model_dir is None else os.path.join(model_dir, 'model' + str(sweep[0]) + '.joblib')
+    for j, score, fitted in _fitScoreSweep(estimator, [grids[i] for i in sweep], n_key, tb_kw, *data,
+                                           set_final=set_final, staged=staged):
+        scores.append(score)
+        if best_j is None or _isBetter(score, sweep[j], scores[best_j], sweep[best_j]):
+            best_j, captured = j, fitted
+            if fitted and model_file is not None: dump(estimator, model_file, compress=0)
+
+    # A model dumped for an earlier position is stale
+    if model_file is not None and not captured and os.path.exists(model_file): os.remove(model_file)
+    return scores, best_j, captured, model_file if captured else None, t.time() - t0
+
+
+def _evaluateGrids(estimator, grids, tb_kw, x_gs, y_gs, tb_gs=None, x_test=None, y_test=None, tb_test=None,
+                   set_final=False, staged=False, warm_start=True, keep_best=False, spill_file=None, n_jobs=1, share_dir=None):
+    """
+    Fit and score an estimator with every hyper-parameter grid, serially or, if n_jobs is not 1, concurrently in a process pool.
+    Serially, the estimator itself is fitted grid by grid.
+    If warm_start, grids only differing in number of estimators are evaluated as one sweep, see _fitScoreSweep().
+    Only scores are tracked, the best fitted model is kept in memory only if keep_best
+    and dumped uncompressed to spill_file whenever improved if spill_file is not None.
+
+    :return: Score of every grid, and the best fitted estimator if keep_best else None.
+    :rtype: (list(float), estimator or None)
+    """
+    if warm_start:
+        n_key, sweeps = _groupSweeps(estimator, grids, set_final)
+    else:
+        n_key, sweeps = None, [[i] for i in range(len(grids))]
+
+    if n_jobs != 1:
+        scores, best_i, best_captured, best_estimator = _evaluateGridsParallel(estimator, grids, n_key, sweeps, tb_kw,
+                                                                               x_gs, y_gs, tb_gs, x_test, y_test, tb_test,
+                                                                               set_final=set_final, staged=staged,
+                                                                               keep_best=keep_best, spill_file=spill_file,
+                                                                               n_jobs=n_jobs, share_dir=share_dir)
+    else:
+        # Initialize best score and will be updated once found better
+        scores, best_score, best_i, best_captured, best_estimator = [None]*len(grids), -np.inf, len(grids), False, None
+        for sweep in sweeps:
+            for j, score, fitted in _fitScoreSweep(estimator, [grids[i] for i in sweep], n_key, tb_kw,
+                                                   x_gs, y_gs, tb_gs, x_test, y_test, tb_test,
+                                                   set_final=set_final, staged=staged):
+                i = sweep[j]
+                scores[i] = score
+                print(' Current score is {} for {}'.format(score, grids[i]))
+                # Save if best
+                if _isBetter(score, i, best_score, best_i):
+                    print(' Old best score is {0}'.format(best_score))
+                    print(' New best score is {0}'.format(score))
+                    best_score, best_i, best_captured = score, i, fitted
+                    if fitted and spill_file is not None: dump(estimator, spill_file, compress=0)
+                    if fitted and keep_best: best_estimator = copy.deepcopy(estimator)
+
+    # The best fitted model wasn't available if it's not the last stage of a boosting sweep, thus fit it once more
+    if (keep_best or spill_file is not None) and not best_captured:
+        print(' Re-fitting {0} to keep the best fitted model...'.format(grids[best_i]))
+        estimator = clone(estimator) if n_jobs != 1 else estimator
+        _setGridParams(estimator, grids[best_i], set_final)
+        estimator.fit(x_gs, y_gs, **{tb_kw: tb_gs})
+        if spill_file is not None: dump(estimator, spill_file, compress=0)
+        if keep_best: best_estimator = estimator
+
+    return scores, best_estimator
+
+
+def _evaluateGridsParallel(estimator, grids, n_key, sweeps, tb_kw, x_gs, y_gs, tb_gs=None, x_test=None, y_test=None, tb_test=None,
+                           set_final=False, staged=False, keep_best=False, spill_file=None, n_jobs=-1, share_dir=None):
+    """
+    Evaluate every sweep of grids concurrently in a process pool, see _evaluateGrids().
+    Data are placed once in memory-mapped files that workers attach to, and fitting as well as scoring run in the workers.
 
+    :return: Score of every grid, index of the best grid, whether its fitted model is available,
+    and the best fitted estimator if keep_best and available else None.
+    :rtype: (list(float), int, bool, estimator or None)
+    """
+    n_jobs = os.cpu_count() if n_jobs == -1 else max(n_jobs, 1)
+    n_jobs = min(n_jobs, len(sweeps))
+    scores, best_score, best_i, best_captured = [None]*len(grids), -np.inf, len(grids), False
+    best_file, best_estimator = None, None
+    share_dir = tempfile.mkdtemp(prefix='GS_', dir=share_dir)
+    print(' Evaluating {0} grids in {1} sweep(s) with {2} process(es)...'.format(len(grids), len(sweeps), n_jobs))
+    try:
+        files = _shareArrays((x_gs, y_gs, tb_gs, x_test, y_test, tb_test), share_dir)
+        # Workers only dump fitted models if the best one is wanted
+        job = (estimator, grids, n_key, tb_kw, files, set_final, staged,
+               share_dir if keep_best or spill_file is not None else None)
+        mp_context = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp_context,
+                                 initializer=_initGridSearchJob, initargs=(job,)) as executor:
+            for sweep, (sweep_scores, best_j, captured, model_file, elapsed) in zip(sweeps, executor.map(_fitScoreSweepTask, sweeps)):
+                for i, score in zip(sweep, sweep_scores):
+                    scores[i] = score
+                    print(' Current score is {0} for {1}'.format(score, grids[i]))
+
+                print(' Evaluated {0} grid(s) in {1:.4f} s'.format(len(sweep), elapsed))
+                # Save if best, only one fitted model is kept on disk besides the ones being evaluated
+                i = sweep[best_j]
+                if _isBetter(scores[i], i, best_score, best_i):
+                    print(' Old best score is {0}'.format(best_score))
+                    print(' New best score is {0}'.format(scores[i]))
+                    best_score, best_i, best_captured = scores[i], i, captured
+                    if best_file is not None: os.remove(best_file)
+                    best_file = model_file
+                elif model_file is not None:
+                    os.remove(model_file)
+
+        if best_file is not None:
+            if keep_best: best_estimator = load(best_file)
+            if spill_file is not None: move(best_file, spill_file)
+
+    finally:
+        rmtree(share_dir)
+
+    return scores, best_i, best_captured, best_estimator
+
+
+def _scoreFold(estimator, scorer, x, y, tb, rows):
+    # Score with the estimator's own score, which takes tb, unless another scorer is given
+    if scorer is None:
+        return estimator.score(x[rows], y[rows], tb=None if tb is None else tb[rows])
+    else:
+        return scorer(estimator, x[rows], y[rows])
+
+
+def _fitScoreFold(estimator, grid, x, y, tb, train, test, tb_kw='tb', scorer=None, train_score=False):
+    # Fit a clone of estimator with one hyper-parameter grid on the train fold and score it on the test fold,
+    # and optionally on the train fold, in a Dask worker
+    t0 = t.time()
+    estimator = clone(estimator).set_params(**grid)
+    estimator.fit(x[train], y[train], **{tb_kw: None if tb is None else tb[train]})
+    t1 = t.time()
+    score = _scoreFold(estimator, scorer, x, y, tb, test)
+    score_train = _scoreFold(estimator, scorer, x, y, tb, train) if train_score else None
+    return score, score_train, t1 - t0, t.time() - t1
+
+
+def _refitGrid(estimator, grid, x, y, tb, tb_kw='tb'):
+    # Fit a clone of estimator with one hyper-parameter grid on all data, in a Dask worker
+    t0 = t.time()
+    estimator = clone(estimator).set_params(**grid)
+    estimator.fit(x, y, **{tb_kw: tb})
+    return estimator, t.time() - t0
+
+
+def _fitGridSearchCVDask(client, gscv, x, y, tb=None, tb_kw='tb', verbose_tasks=True):
+    """
+    Fit an unfitted GridSearchCV on a Dask cluster, setting its best_params_, best_score_ and cv_results_,
+    and best_estimator_ and refit_time_ if its refit is set.
+    x, y and tb are scattered to all workers once, then every (grid, fold) task only references them.
+    Per task transfer, incl. deserialization, and compute timings are taken from the Dask task stream.
+    Its scoring, return_train_score and refit are honoured, except that a scoring other than None,
+    i.e. the estimator's score, can't pass tb thus can only be used without tb.
+    """
+    from dask.distributed import get_task_stream
+    from sklearn.model_selection import check_cv
+    from sklearn.metrics import check_scoring
+
+    if gscv.scoring is None:
+        scorer = None
+    elif not isinstance(gscv.scoring, str) and not callable(gscv.scoring):
+        raise ValueError("\nOnly a single metric scoring of GSCV is supported!\n")
+    elif tb is not None:
+        raise ValueError("\nscoring of GSCV can't pass tb, set it to None to use the score of the estimator!\n")
+    else:
+        scorer = check_scoring(gscv.estimator, gscv.scoring)
+
+    train_score = gscv.return_train_score
+    grids = list(ParameterGrid(gscv.param_grid))
+    folds = list(check_cv(gscv.cv, y).split(x, y))
+    t0 = t.time()
+    x_future, y_future, tb_future = client.scatter([x, y, tb], broadcast=True)
+    print(' Scattered GS data to {0} worker(s) in {1:.4f} s'.format(len(client.scheduler_info()['workers']), t.time() - t0))
+    with get_task_stream(client) as task_stream:
+        futures = [client.submit(_fitScoreFold, gscv.estimator, grid, x_future, y_future, tb_future, train, test, tb_kw,
+                                 scorer, train_score, pure=False)
+                   for grid in grids for train, test in folds]
+        results = client.gather(futures)
+
+    # Time spent per action of every task, e.g. transfer, deserialize, and compute
+    timings = {}
+    for task in task_stream.data:
+        actions = timings.setdefault(task['key'], {})
+        for startstop in task['startstops']:
+            actions[startstop['action']] = actions.get(startstop['action'], 0.) + startstop['stop'] - startstop['start']
+
+    transfers, computes = [], []
+    for j, future in enumerate(futures):
+        actions = timings.get(future.key, {})
+        transfers.append(actions.get('transfer', 0.) + actions.get('deserialize', 0.))
+        computes.append(actions.get('compute', results[j][2] + results[j][3]))
+        if verbose_tasks:
+            print(' Task {0} fold {1}: transfer {2:.4f} s, compute {3:.4f} s, score {4}'.format(grids[j//len(folds)], j%len(folds),
+                                                                                              transfers[-1], computes[-1], results[j][0]))
+
+    print(' {0} tasks: transfer {1:.4f} s in total, max {2:.4f} s; compute {3:.4f} s in total, max {4:.4f} s'.format(len(futures),
+          sum(transfers), max(transfers), sum(computes), max(computes)))
+    # Mean score of folds is not sample weighted
+    scores, scores_train, fit_times, score_times = (np.array([result[i] for result in results]).reshape((len(grids), len(folds)))
+                                                    for i in range(4))
+    mean_scores = scores.mean(axis=1)
+    gscv.cv_results_ = dict(params=grids,
+                            mean_test_score=mean_scores,
+                            std_test_score=scores.std(axis=1),
+                            rank_test_score=np.argsort(np.argsort(-mean_scores, kind='stable')) + 1,
+                            mean_fit_time=fit_times.mean(axis=1),
+                            std_fit_time=fit_times.std(axis=1),
+                            mean_score_time=score_times.mean(axis=1),
+                            std_score_time=score_times.std(axis=1),
+                            **{'split{0}_test_score'.format(i): scores[:, i] for i in range(len(folds))})
+    if train_score:
+        scores_train = scores_train.astype(float)
+        gscv.cv_results_.update(mean_train_score=scores_train.mean(axis=1), std_train_score=scores_train.std(axis=1),
+                                **{'split{0}_train_score'.format(i): scores_train[:, i] for i in range(len(folds))})
+
+    # A callable refit picks the best index from cv_results_
+    best = gscv.refit(gscv.cv_results_) if callable(gscv.refit) else int(np.argmax(mean_scores))
+    gscv.best_index_, gscv.best_params_, gscv.best_score_ = best, grids[best], mean_scores[best]
+    gscv.n_splits_ = len(folds)
+    print(' Best [score] is {}'.format(gscv.best_score_))
+    print(' Best [hyper-parameters] are \n  {}'.format(gscv.best_params_))
+    if gscv.refit:
+        # Refit on the scattered data as well
+        gscv.best_estimator_, gscv.refit_time_ = client.submit(_refitGrid, gscv.estimator, gscv.best_params_,
+                                                               x_future, y_future, tb_future, tb_kw, pure=False).result()
+        print(' Refitted best estimator in {0:.4f} s'.format(gscv.refit_time_))
+
+
+def _keepBestEstimator(is_pipeline, n_jobs, keep_best):
+    # Whether the best fitted model is needed in memory after GS. Besides being asked for,
+    # feature selectors of a pipeline have to be fitted and a process pool leaves the GS estimator unfitted
+    return keep_best or (is_pipeline and n_jobs != 1)
+
+
+def _assignBestGrid(estimator_gs, best_estimator, best_grid, is_pipeline):
+    # If not kept, the best hyper-parameters are assigned to the GS estimator, whose pipeline selectors are fitted already
+    # since they don't depend on the hyper-parameters of the final regressor
+    if best_estimator is not None: return best_estimator
+
+    if is_pipeline:
+        estimator_gs._final_estimator.set_params(**best_grid)
+    else:
+        estimator_gs.set_params(**best_grid)
+
+    return estimator_gs
+
+
+def _refitBestEstimator(estimator_gs, estimator_final, x_train, y_train, tb_train,
+                        refit=True, save=True, savedir='./', final_name='final', reuse_fitted=False):
+    # Assign the best estimator found by GS to the final estimator, and refit the final regressor on train data if refit.
+    # If reuse_fitted and not refit, the fitted best regressor of GS is reused instead
+    reuse_fitted = reuse_fitted and not refit
+    is_pipeline = True if hasattr(estimator_gs, 'steps') else False
     # If there's feature selection i.e. estimator_gs and estimator_final are pipelines
     if is_pipeline:
         # If pipeline, step names excl. the actual regressor name
@@ -1228,10 +1828,13 @@ def performEstimatorGridSearch(estimator_gs, estimator_final, tuneparams, x_gs,
         # Set the best hyper-parameters to the estimator
         regressor_name = estimator_gs.steps[-1][0]
         # estimator_final._final_estimator.set_params(**best_grid)
-        estimator_final.named_steps[regressor_name] = clone(estimator_gs.named_steps[regressor_name])
+        regressor = estimator_gs.named_steps[regressor_name]
+        regressor = regressor if reuse_fitted else clone(regressor)
+        estimator_final.named_steps[regressor_name] = regressor
+        estimator_final.steps[-1] = (regressor_name, regressor)
     else:
         # estimator_final.set_params(**best_grid)
-        estimator_final = clone(estimator_gs)
+        estimator_final = estimator_gs if reuse_fitted else clone(estimator_gs)
 
     print('\nBest hyper-parameters assigned to regressor')
     # The previous fits were cleared thus need to refit using the best hyper-parameters
@@ -1253,76 +1856,12 @@ def performEstimatorGridSearch(estimator_gs, estimator_final, tuneparams, x_gs,
             dump(estimator_final, savedir + '/' + final_name + '.joblib')
             print('\nFitted {0} saved at {1}'.format(final_name, savedir))
 
-        # If transformers in pipelines have been cached, remove them after fitting
+    # If transformers in pipelines have been cached, remove them after fitting
     if is_pipeline:
         if estimator_gs.memory is not None: rmtree(estimator_gs.memory)
         if refit and estimator_final.memory is not None: rmtree(estimator_final.memory)
 
-    # The pipeline or simply regressor after GS.
-    # If pipeline, the feature selector is already fitted while the actual regressor might not depending on whether train data is supplied
-    return estimator_final, best_grid
-
-
-@timer
-def performEstimatorPipelineGridSearch(estimator_gs, tuneparams, x_train, y_train,
-                               tb_kw='tb', tb_train=None, x_test=None, y_test=None, tb_test=None,
-                               staged=False, refit=False,
-                               **kwargs):
-    from sklearn.model_selection import ParameterGrid
-    import copy
-
-    print(' {0}'.format(tuneparams))
-    is_pipeline = True if hasattr(estimator_gs, 'steps') else False
-    fit_params = {}
-    fit_params[tb_kw] = tb_train
-    # Initialize best score and will be updated once found better
-    best_score = -np.inf
-    best_grid = {}
-    best_estimator = copy.deepcopy(estimator_gs)
-    for grid in ParameterGrid(tuneparams):
-        estimator_gs.set_params(**grid)
-        # Fit the train data for ML
-        estimator_gs.fit(x_train, y_train, **fit_params)
-        # If the estimator uses out-of-bag samples, then the score is oob_score_ that uses the train data
-        estimator_gs_final = estimator_gs.steps[-1][1] if is_pipeline else estimator_gs
-        if hasattr(estimator_gs_final, 'oob_score_'):
-            print(' Using OOB score...')
-            score = estimator_gs_final.oob_score_
-        # Else, use the default/custom score method on the test data
-        else:
-            if staged and hasattr(estimator_gs_final, 'staged_score'):
-                # FIXME: no transform is done here
-                print('')
-                for iboost, score_staged in enumerate(estimator_gs_final.staged_score(x_test, y_test, tb=tb_test)):
-                    # When iboost reaches the end, that score should be the best for this hyper-parameter grid
-                    score = score_staged
-                    print(' Staged score after boost {0}: {1}'.format(iboost + 1, score))
-                print('')
-            else:
-                score = estimator_gs.score(x_test, y_test, tb=tb_test)
-
-        print(' Current score is {} for {}'.format(score, grid))
-        # Save if best
-        if score > best_score:
-            print(' Old best score is {0}'.format(best_score))
-            print(' New best score is {0}'.format(score))
-            best_score = score
-            best_grid = grid
-            best_estimator = copy.deepcopy(estimator_gs)
-
-    print(' Best [score] is {}'.format(best_score))
-    print(' Best [hyper-parameters] are \n  {}'.format(best_grid))
-
-    # Reassign estimator_gs to the best trained model so that it's reusable
-    estimator_gs = best_estimator
-    # Set the best hyper-parameters to the estimator
-    estimator_gs.set_params(**best_grid)
-    # The previous fits were cleared thus need to refit using the best hyper-parameters
-    if refit:
-        print(' Re-fitting the model using the best hyper-parameters...')
-        estimator_gs.fit(x_train, y_train, **fit_params)
-
-    return best_grid
+    return estimator_final
 
 
 def _setupFeatureSelector(var_threshold=0., scaler=None, rf_selector_n_estimators=0, rf_selector_threshold='median',
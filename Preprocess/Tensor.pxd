@@ -1,8 +1,12 @@
 # cython: language_level = 3str
 # cython: embedsignature = True
 cimport numpy as np
+from cython cimport floating
 
-cpdef tuple processReynoldsStress(np.ndarray stress_tensor, bint make_anisotropic=*, int realization_iter=*, bint to_old_grid_shape=*)
+cpdef tuple processReynoldsStress(np.ndarray stress_tensor, bint make_anisotropic=*, int realization_iter=*, bint to_old_grid_shape=*,
+                                  double eig_tol=*)
+
+cpdef tuple getSymmetricEigenSystem(np.ndarray tensor, double tol=*, np.ndarray eigval=*, np.ndarray eigvec=*)
 
 cpdef tuple getBarycentricMapData(np.ndarray eigval, bint optimize_cmap=*, double c_offset=*, double c_exp=*, bint to_old_grid_shape=*)
 
@@ -10,17 +14,37 @@ cpdef np.ndarray expandSymmetricTensor(np.ndarray tensor)
 
 cpdef np.ndarray contractSymmetricTensor(np.ndarray tensor)
 
-cpdef tuple getStrainAndRotationRateTensor(np.ndarray grad_u, np.ndarray tke=*,  np.ndarray eps=*, double cap=*)
+cpdef tuple getStrainAndRotationRateTensor(np.ndarray grad_u, np.ndarray tke=*,  np.ndarray eps=*, double cap=*, tuple out=*,
+                                           object dtype=*)
 
-cpdef np.ndarray[np.float_t, ndim=3] getInvariantBases(np.ndarray sij, np.ndarray rij, bint quadratic_only=*, bint is_scale=*, bint zero_trace=*)
+cpdef np.ndarray getInvariantBases(np.ndarray sij, np.ndarray rij, bint quadratic_only=*, bint is_scale=*, bint zero_trace=*,
+                                   np.ndarray out=*, object dtype=*)
 
-cpdef np.ndarray makeRealizable(np.ndarray bij)
+cpdef np.ndarray makeRealizable(np.ndarray bij, int max_iter=*, double tol=*)
 
 
 # -----------------------------------------------------
 # Supporting Functions, Not Intended to Be Called From Python
 # -----------------------------------------------------
-cdef np.ndarray[np.float_t, ndim=2] _makeRealizable(np.ndarray[np.float_t, ndim=2] bij)
+cdef np.ndarray[np.float_t, ndim=2] _makeRealizable(np.ndarray[np.float_t, ndim=2] bij, int max_iter=*, double tol=*)
+
+cdef bint _makePointRealizable(double* b, double tol) noexcept nogil
+
+cdef int _getStrainAndRotationRateTensor(floating[:, :] g, floating[:] tke, floating[:] eps, bint is_scaled, double cap,
+                                         floating[:, ::1] sij, floating[:, ::1] rij) noexcept
+
+cdef int _getStrainAndRotationRate(const floating* g, Py_ssize_t g_stride, double half_tke_eps, double cap,
+                                   floating* sij, floating* rij) noexcept nogil
+
+cdef void _getInvariantBasesSet(floating[:, :] sij, floating[:, :] rij, floating[:, :, ::1] tb,
+                                bint zero_trace, double[::1] scale) noexcept
+
+cdef int _capArray(double* arr, int n, double cap) noexcept nogil
+
+cdef void _getInvariantBases(const floating* s6, Py_ssize_t s_stride, double rxy, double rxz, double ryz,
+                             floating* tb_out, int n_bases, bint zero_trace, const double* scale) noexcept nogil
+
+cdef void _eigenSymmetric3x3(const double* a, double* w, double* v, double tol) noexcept nogil
 
 cdef np.ndarray[np.float_t, ndim=2] _mapVectorToAntisymmetricTensor(np.ndarray[np.float_t, ndim=2] vec, np.ndarray scaler=*)
 
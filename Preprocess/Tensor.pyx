@@ -6,25 +6,31 @@
 import numpy as np
 cimport numpy as np
 from libc.stdio cimport printf
-from libc.math cimport sqrt
+from libc.math cimport sqrt, fabs
+from cython.parallel cimport prange
+from cython cimport floating
 from Utility import collapseMeshGridFeatures, reverseOldGridShape
 cimport cython
 
-cpdef tuple processReynoldsStress(np.ndarray stress_tensor, bint make_anisotropic=True, int realization_iter=0, bint to_old_grid_shape=True):
+cpdef tuple processReynoldsStress(np.ndarray stress_tensor, bint make_anisotropic=True, int realization_iter=0, bint to_old_grid_shape=True,
+                                  double eig_tol=1e-12):
     """
     Calculate anisotropy tensor bij, its eigenvalues and eigenvectors from given nD Reynolds stress of any shape.
     If make_anisotropic is disabled, then given Reynolds stress is assumed anisotropic.
-    If realization_iter > 0, then bij is made realizable by realization_iter iterations.
+    If realization_iter > 0, then bij is made realizable by at most realization_iter iterations.
     If to_old_grid_shape is enabled, then bij, eigenvalues, and eigenvectors are converted to old grid shape.
+    The eigen decomposition is done for all points at once by getSymmetricEigenSystem() with tolerance eig_tol.
 
     :param stress_tensor: Reynolds stress u_i'u_j' or anisotropy stress tensor bij.
     :type stress_tensor: ND array of dimension (n_points or 2/3D grid) x (3 x 3 or 6 or 9 components)
     :param make_anisotropic: Whether to convert to bij from given Reynolds stress.
     :type make_anisotropic: bool, optional (default=True)
-    :param realization_iter: How many iterations to make bij realizable. If 0, then no iteration is done.
+    :param realization_iter: Maximum iterations to make bij realizable. If 0, then no iteration is done.
     :type realization_iter: int, optional (default=0)
     :param to_old_grid_shape: Whether to convert bij, eigenvalues, eigenvectors to old grid shape.
     :type to_old_grid_shape: bool, optional (default=True)
+    :param eig_tol: Relative tolerance of the Jacobi eigen solver, see getSymmetricEigenSystem().
+    :type eig_tol: float, optional (default=1e-12)
 
     :return: Anisotropy tensor bij, eigenvalues, eigenvectors
     :rtype: (np.ndarray, np.ndarry, np.ndarray).
@@ -33,13 +39,11 @@ cpdef tuple processReynoldsStress(np.ndarray stress_tensor, bint make_anisotropi
     """
 
     # If ndim is not provided but np.float_t is provided, 1D is assumed
-    cdef np.ndarray[np.float_t] k, eigval_i
-    cdef np.ndarray[np.float_t, ndim=2] eigvec_i
+    cdef np.ndarray[np.float_t] k
     cdef np.ndarray bij, eigval, eigvec
     cdef tuple shape_old
     cdef list shape_old_grid, shape_old_eigval, shape_old_matrix
-    cdef int i, milestone
-    cdef double progress
+    cdef int i
 
     print('\nProcessing Reynolds stress... ')
     # Ensure stress tensor is 2D, (n_points, 9 or 6)
@@ -93,40 +97,22 @@ cpdef tuple processReynoldsStress(np.ndarray stress_tensor, bint make_anisotropi
         else:
             bij = stress_tensor
 
-    for i in range(realization_iter):
-        print('\nApplying realizability filter ' + str(i + 1))
-        bij = _makeRealizable(bij)
+    if realization_iter > 0:
+        print('\nApplying realizability filter for at most ' + str(realization_iter) + ' iterations')
+        bij = _makeRealizable(np.ascontiguousarray(bij, dtype=np.float64), realization_iter)
 
+    # Evaluate eigenvalues and eigenvectors of the symmetric tensor for all points at once
+    # eigval is n_points x 3 in descending order so that lambda1 >= lambda2 >= lambda3
+    # eigvec is n_points x 3 x 3, where each col is an eigenvector
+    bij = np.ascontiguousarray(bij, dtype=np.float64)
+    eigval, eigvec = getSymmetricEigenSystem(bij, tol=eig_tol)
     # Reshape the 3rd D to 3x3 instead of 9
     # Now bij is 3D, with shape (n_points, 3, 3)
     bij = bij.reshape((bij.shape[0], 3, 3))
-    # Evaluate eigenvalues and eigenvectors of the symmetric tensor
-    # eigval is n_points x 3
-    # eigvec is n_points x 9, where 9 is the flattened eigenvector matrix from np.linalg.eigh()
-    eigval, eigvec = np.empty((bij.shape[0], 3)), np.empty((bij.shape[0], 9))
-    # For gauging progress
-    milestone = 25
-    # Go through each grid point
-    # prange requires nogil that doesn't support python array slicing, and tuple, and numpy
-    for i in range(bij.shape[0]):
-        # eigval is in ascending order, reverse it so that lambda1 >= lambda2 >= lambda3
-        # Each col of eigvec is a vector, thus 3 x 3
-        eigval_i, eigvec_i = np.linalg.eigh(bij[i, :, :])
-        eigval_i, eigvec_i = np.flipud(eigval_i), np.fliplr(eigvec_i)
-        eigval[i, :] = eigval_i
-        # Each eigvec_i is a 3 x 3 matrix, flatten them add them to eigvec for point i
-        eigvec[i, :] = eigvec_i.ravel()
-
-        # Gauge progress
-        progress = float(i)/(bij.shape[0] + 1.)*100.
-        if progress >= milestone:
-            printf(' %d %%... ', milestone)
-            milestone += 25
 
     # Reshape eigval to old grid x 3, if requested
     # Also reshape eigvec from n_points x 9 to old grid x 3 x 3 if requested
     # so that each col of the 3 x 3 matrix is an eigenvector corresponding to an eigenvalue
-    eigvec = eigvec.reshape((bij.shape[0], 3, 3))
     if to_old_grid_shape:
         shape_old_eigval = shape_old_grid.copy()
         # [old grid, 3]
@@ -147,6 +133,54 @@ cpdef tuple processReynoldsStress(np.ndarray stress_tensor, bint make_anisotropi
     return bij, eigval, eigvec
 
 
+cpdef tuple getSymmetricEigenSystem(np.ndarray tensor, double tol=1e-12, np.ndarray eigval=None, np.ndarray eigvec=None):
+    """
+    Calculate eigenvalues and eigenvectors of many 3 x 3 real symmetric tensors at once, e.g. anisotropy tensor bij.
+    Each tensor is diagonalized by cyclic Jacobi rotations in parallel over all points without the GIL.
+    The rotations stop once the off-diagonal Frobenius norm is below tol times the Frobenius norm of the tensor,
+    so that eigenvalues match np.linalg.eigh() to within tol*||tensor|| (plus round-off),
+    and eigenvectors match up to sign.
+    If eigval and/or eigvec are provided, results are written in place to them.
+
+    :param tensor: Symmetric tensors to decompose. Only the upper triangle is used.
+    :type tensor: ndarray[n_points x 6 or 9] or ndarray[n_points x 3 x 3]
+    :param tol: Relative tolerance of the off-diagonal norm to stop Jacobi rotations.
+    1e-12 is practically identical to np.linalg.eigh(), 1e-6 is sufficient for plotting.
+    :type tol: float, optional (default=1e-12)
+    :param eigval: Preallocated C-contiguous eigenvalue array. If None, a new array is created.
+    :type eigval: ndarray[n_points x 3] or None, optional (default=None)
+    :param eigvec: Preallocated C-contiguous eigenvector array. If None, a new array is created.
+    :type eigvec: ndarray[n_points x 3 x 3] or None, optional (default=None)
+
+    :return: Eigenvalues in descending order lambda1 >= lambda2 >= lambda3,
+    and eigenvectors where each col is the eigenvector of the corresponding eigenvalue.
+    :rtype: (ndarray[n_points x 3], ndarray[n_points x 3 x 3])
+    """
+    cdef double[:, ::1] tensor_view, eigval_view
+    cdef double[:, :, ::1] eigvec_view
+    cdef Py_ssize_t i, n_points
+
+    if tensor.ndim == 3: tensor = tensor.reshape((tensor.shape[0], 9))
+    if tensor.shape[1] == 6: tensor = expandSymmetricTensor(tensor)
+    tensor = np.ascontiguousarray(tensor, dtype=np.float64)
+    n_points = tensor.shape[0]
+    if eigval is None: eigval = np.empty((n_points, 3))
+    if eigvec is None: eigvec = np.empty((n_points, 3, 3))
+    # The kernel doesn't check bounds, thus provided arrays have to match exactly
+    if np.shape(eigval) != (n_points, 3) or eigval.dtype != np.float64 or not eigval.flags['C_CONTIGUOUS']:
+        raise ValueError("\neigval must be a C-contiguous float64 array of shape " + str((n_points, 3)) + "!\n")
+
+    if np.shape(eigvec) != (n_points, 3, 3) or eigvec.dtype != np.float64 or not eigvec.flags['C_CONTIGUOUS']:
+        raise ValueError("\neigvec must be a C-contiguous float64 array of shape " + str((n_points, 3, 3)) + "!\n")
+
+    tensor_view, eigval_view, eigvec_view = tensor, eigval, eigvec
+    # Go through each point in parallel
+    for i in prange(n_points, nogil=True, schedule='static'):
+        _eigenSymmetric3x3(&tensor_view[i, 0], &eigval_view[i, 0], &eigvec_view[i, 0, 0], tol)
+
+    return eigval, eigvec
+
+
 cpdef tuple getBarycentricMapData(np.ndarray eigval, bint optimize_cmap=True, double c_offset=0.65, double c_exp=5., bint to_old_grid_shape=True):
     """
     Get the Barycentric map coordinates and RGB values to visualize turbulent states based on given eigenvalues of the anisotropy tensor bij.
@@ -292,11 +326,16 @@ cpdef np.ndarray contractSymmetricTensor(np.ndarray tensor):
     return tensor_compact
 
 
-cpdef tuple getStrainAndRotationRateTensor(np.ndarray grad_u, np.ndarray tke=None,  np.ndarray eps=None, double cap=1e9):
+cpdef tuple getStrainAndRotationRateTensor(np.ndarray grad_u, np.ndarray tke=None,  np.ndarray eps=None, double cap=1e9, tuple out=None,
+                                           object dtype=None):
     """
     Calculate strain rate tensor sij as well as rotation rate tensor rij, given velocity gradient grad_u.
     If TKE tke and energy dissipaton rate eps are both provided, sij and rij are non-dimensionalized.
     If cap is provided, sij and rij magnitudes are capped to cap.
+    The zero trace of sij is re-enforced after capping.
+    Everything is done in a single parallel pass over the points, reading grad_u in place.
+    Arithmetic is always done in double precision, only storage follows dtype.
+    Compared with float64, float32 Sij and Rij are within 1e-6 relative to the largest component, i.e. float32 round-off.
     
     :param grad_u: Velocity gradient
     :type grad_u: ndarray[mesh grid / n_samples x 3 x 3] or ndarray[mesh grid / n_samples x 9]
@@ -308,177 +347,128 @@ cpdef tuple getStrainAndRotationRateTensor(np.ndarray grad_u, np.ndarray tke=Non
     :type eps: ndarray[mesh grid / n_samples x 0/1] or None, optional (default=None)
     :param cap: Sij and Rij magnitude cap.
     :type cap: float, optional (default=1e9)
+    :param out: Preallocated C-contiguous (sij, rij) buffers to write to. If None, new arrays are created.
+    :type out: (ndarray[n_samples x 6], ndarray[n_samples x 9]) or None, optional (default=None)
+    :param dtype: Precision of Sij and Rij. Inputs of another precision are converted first.
+    If None, float32 if grad_u is float32 and float64 else. Provided out buffers have to be of this dtype.
+    :type dtype: np.float32, np.float64, or None, optional (default=None)
     
     :return: Strain and rotation rate tensor Sij and Rij. Only the 6 unique components of symmetric tensor Sij is returned.
     :rtype: ndarray[n_samples x 6], ndarray[n_samples x 9]
     """
-    cdef list ij_uniq, ii6, ii9, ij_6to9
-    cdef np.ndarray[np.float_t] tke_eps, sij_i, rij_i
-    cdef np.ndarray[np.float_t, ndim=2] grad_u_i
-    cdef double maxsij, maxrij, minsij, minrij, progress
-    cdef unsigned int i
-    cdef unsigned int milestone = 25
+    cdef np.ndarray sij, rij
+    cdef np.ndarray tke_arr = None
+    cdef np.ndarray eps_arr = None
+    cdef Py_ssize_t n_points
+    cdef bint is_scaled = tke is not None and eps is not None
+    cdef int n_capped
 
     print('\nCalculating strain and rotation rate tensor Sij and Rij...')
-    # Collapse mesh grid but don't collapse matrix form of (3, 3) to 9
-    grad_u, _ = collapseMeshGridFeatures(grad_u, collapse_matrix=False)
-    # Indices
-    ij_uniq = [0, 1, 2, 4, 5, 8]
-    ii6, ii9 = [0, 3, 5], [0, 4, 8]
-    ij_6to9 = [0, 1, 2, 1, 3, 4, 2, 4, 5]
-    # If either TKE or epsilon is None, no non-dimensionalization is done
-    if tke is None or eps is None:
-        tke = np.ones(grad_u.shape[0])
-        eps = np.ones(grad_u.shape[0])
-
-    # Cap epsilon to 1e-10 to avoid FPE, also assuming no back-scattering
-    eps[eps == 0.] = 1e-10
-    # Non-dimensionalization coefficient for strain and rotation rate tensor
-    tke_eps = tke.ravel()/eps.ravel()
+    # Collapse mesh grid and (3, 3) matrix form to 9, which is a view unless grad_u is not contiguous enough
+    if grad_u.ndim > 2: grad_u, _ = collapseMeshGridFeatures(grad_u, collapse_matrix=True)
+    if dtype is None: dtype = grad_u.dtype
+    dtype = np.float32 if dtype == np.float32 else np.float64
+    grad_u = np.asarray(grad_u, dtype=dtype)
+    n_points = grad_u.shape[0]
+    if is_scaled:
+        tke_arr = np.asarray(tke, dtype=dtype).reshape(-1)
+        eps_arr = np.asarray(eps, dtype=dtype).reshape(-1)
+
     # Sij is strain rate tensor, Rij is rotation rate tensor
     # Sij is symmetric tensor, thus 6 unique components, while Rij is anti-symmetric and 9 unique components
-    sij = np.empty((grad_u.shape[0], 6))
-    rij = np.empty((grad_u.shape[0], 9))
-    # Go through each point
-    for i in range(grad_u.shape[0]):
-        grad_u_i = grad_u[i].reshape((3, 3)) if len(np.shape(grad_u)) == 2 else grad_u[i]
-        # Basically Sij = 0.5TKE/epsilon*(grad_u_i + grad_u_j) that has 0 trace
-        sij_i = (tke_eps[i]*0.5*(grad_u_i + grad_u_i.T)).ravel()
-
-        # Basically Rij = 0.5TKE/epsilon*(grad_u_i - grad_u_j) that has 0 in the diagonal
-        rij_i = (tke_eps[i]*0.5*(grad_u_i - grad_u_i.T)).ravel()
-        sij[i] = sij_i[ij_uniq]
-        rij[i] = rij_i
-
-        # Gauge progress
-        progress = float(i)/(grad_u.shape[0] + 1)*100.
-        if progress >= milestone:
-            printf(' %d %%... ', milestone)
-            milestone += 25
-
-    # Maximum and minimum
-    maxsij, maxrij = np.max(sij.ravel()), np.max(rij.ravel())
-    minsij, minrij = np.min(sij.ravel()), np.min(rij.ravel())
-    print(' Max of Sij is ' + str(maxsij) + ', and of Rij is ' + str(maxrij) + ' capped to ' + str(cap))
-    print(' Min of Sij is ' + str(minsij) + ', and of Rij is ' + str(minrij)  + ' capped to ' + str(-cap))
-    sij[sij > cap], rij[rij > cap] = cap, cap
-    sij[sij < -cap], rij[rij < -cap] = -cap, -cap
-    # Because we enforced limits on Sij, we need to re-enforce trace of 0.
-    # Go through each point
-    if any((maxsij > cap, minsij < cap)):
-        for i in range(grad_u.shape[0]):
-            # Recall Sij is symmetric and has 6 unique components
-            sij[i, ii6] -=  ((1/3.*np.eye(3)*np.trace(sij[i, ij_6to9].reshape((3, 3)))).ravel()[ii9])
+    if out is None:
+        sij, rij = np.empty((n_points, 6), dtype=dtype), np.empty((n_points, 9), dtype=dtype)
+    else:
+        sij, rij = out
+        # The kernel doesn't check bounds, thus provided buffers have to match exactly
+        if np.shape(sij) != (n_points, 6) or sij.dtype != dtype or not sij.flags['C_CONTIGUOUS']:
+            raise ValueError("\nout sij must be a C-contiguous " + np.dtype(dtype).name + " array of shape " + str((n_points, 6)) + "!\n")
+
+        if np.shape(rij) != (n_points, 9) or rij.dtype != dtype or not rij.flags['C_CONTIGUOUS']:
+            raise ValueError("\nout rij must be a C-contiguous " + np.dtype(dtype).name + " array of shape " + str((n_points, 9)) + "!\n")
+
+    if dtype == np.float32:
+        n_capped = _getStrainAndRotationRateTensor[float](grad_u, tke_arr, eps_arr, is_scaled, cap, sij, rij)
+    else:
+        n_capped = _getStrainAndRotationRateTensor[double](grad_u, tke_arr, eps_arr, is_scaled, cap, sij, rij)
 
+    print(' ' + str(n_capped) + ' Sij and Rij components capped to +/-' + str(cap))
     return sij, rij
 
 
-cpdef np.ndarray[np.float_t, ndim=3] getInvariantBases(np.ndarray sij, np.ndarray rij, 
-                                                       bint quadratic_only=False, bint is_scale=True, bint zero_trace=False):
+cpdef np.ndarray getInvariantBases(np.ndarray sij, np.ndarray rij,
+                                   bint quadratic_only=False, bint is_scale=True, bint zero_trace=False,
+                                   np.ndarray out=None, object dtype=None):
     """
     Calculate 4 or 10 invariant bases of shape (n_samples, n_outputs, n_bases) given strain rate tensor sij and rotation rate tensor rij.
     If quadratic_only is True, only 4 bases will be calculated.
     If is_scale is True, the bases will be divided by [1, 10, 10, 10, 100, 100, 1000, 1000, 1000, 1000].
     If zero_trace is True, check for 0 trace of tb and enforce it.
+    Only the 6 unique components of Sij and the 3 unique components of anti-symmetric Rij are used.
+    Since every basis but 1, 3, 4 is of the form M - M^T with M = A*B and A, B (anti-)symmetric,
+    only M is evaluated per basis, in parallel over the points.
+    Arithmetic is always done in double precision, only storage follows dtype.
+    Compared with float64, float32 Tij from float32 Sij and Rij are within 1e-6 relative to the largest component of each basis.
     
     :param sij: strain rate tensor
     :type sij: ndarray[grid shape / n_samples x 6/9] or ndarray[grid shape / n_samples x 3 x 3]
-    :param rij: rotation rate tensor
-    :type rij: ndarray[grid shape / n_samples x 9] or ndarray[grid shape / n_samples x 3 x 3]
+    :param rij: rotation rate tensor. If 3 components, they are Rxy, Rxz, Ryz.
+    :type rij: ndarray[grid shape / n_samples x 3/9] or ndarray[grid shape / n_samples x 3 x 3]
     :param quadratic_only: True if only linear and quadratic terms are desired, n_bases = 4. False if full basis is desired, n_bases = 10.
     :type quadratic_only: bool, optional (default=False)
     :param is_scale: Whether scale Tij with [1, 10, 10, 10, 100, 100, 1000, 1000, 1000, 1000].
     :type is_scale: bool, optional (default=True)
     :param zero_trace: Whether enforce 0 trace of Tij.
     :type zero_trace: bool, optional (default=False)
+    :param out: Preallocated C-contiguous Tij buffer to write to. If None, a new array is created.
+    :type out: ndarray[n_samples x 6 x n_bases] or None, optional (default=None)
+    :param dtype: Precision of Tij. Inputs of another precision are converted first.
+    If None, float32 if sij is float32 and float64 else. A provided out buffer has to be of this dtype.
+    :type dtype: np.float32, np.float64, or None, optional (default=None)
     
     :return: Tij of shape (n_samples, 6, n_bases). 6 means taking the unique components of the symmetric tensor only.
     :rtype: ndarray[n_samples x 6 x n_bases]
     """
-    cdef list ij_uniq, ij_6to9, scale_factor
-    cdef unsigned int n_bases, i, j
-    cdef np.ndarray[np.float_t, ndim=3] tb
-    cdef np.ndarray[np.float_t, ndim=2] sij_i, rij_i, sijrij, rijsij, sijsij, rijrij
-    cdef unsigned int milestone = 10
-    cdef double progress
+    cdef int n_bases = 10 if not quadratic_only else 4
+    cdef np.ndarray tb, scale
+    cdef Py_ssize_t n_points
 
     print('\nCalculating invariant bases Tij...')
-    # Ensure n_samples x 6 for Sij and n_samples x 9 for Rij
-    sij, _ = collapseMeshGridFeatures(sij)
-    rij, _ = collapseMeshGridFeatures(rij)
+    # Ensure n_samples x 6 for Sij and n_samples x 9 or 3 for Rij
+    if sij.ndim > 2: sij, _ = collapseMeshGridFeatures(sij)
+    if rij.ndim > 2: rij, _ = collapseMeshGridFeatures(rij)
     if sij.shape[1] == 9: sij = contractSymmetricTensor(sij)
-    # Indices
-    ij_uniq = [0, 1, 2, 4, 5, 8]
-    ij_6to9 = [0, 1, 2, 1, 3, 4, 2, 4, 5]
-    # If 3D flow, then 10 tensor bases; else if 2D flow, then 4 tensor bases
-    n_bases = 10 if not quadratic_only else 4
-    # Tensor bases is nPoint x nBasis x 3 x 3
-    # tb = np.zeros((Sij.shape[0], n_bases, 3, 3))
-    tb = np.empty((sij.shape[0], 6, n_bases))
-    # Go through each point
-    for i in range(sij.shape[0]):
-        # Sij only has 6 unique components, convert it to 9 using ij_6to9
-        sij_i = sij[i, ij_6to9].reshape((3, 3))
-        # Rij has 9 unique components already
-        rij_i = rij[i].reshape((3, 3))
-        # Convenient pre-computations
-        sijrij = sij_i @ rij_i
-        rijsij = rij_i @ sij_i
-        sijsij = sij_i @ sij_i
-        rijrij = rij_i @ rij_i
-        # 10 tensor bases for each point and each (unique) bij component
-        # 1: Sij
-        tb[i, :, 0] = sij_i.ravel()[ij_uniq]
-        # 2: SijRij - RijSij
-        tb[i, :, 1] = (sijrij - rijsij).ravel()[ij_uniq]
-        # 3: Sij^2 - 1/3I*tr(Sij^2)
-        tb[i, :, 2] = (sijsij - 1./3.*np.eye(3)*np.trace(sijsij)).ravel()[ij_uniq]
-        # 4: Rij^2 - 1/3I*tr(Rij^2)
-        tb[i, :, 3] = (rijrij - 1./3.*np.eye(3)*np.trace(rijrij)).ravel()[ij_uniq]
-        # If more than 4 bases
-        if not quadratic_only:
-            # 5: RijSij^2 - Sij^2Rij
-            tb[i, :, 4] = (rij_i @ sijsij - sij_i @ sijrij).ravel()[ij_uniq]
-            # 6: Rij^2Sij + SijRij^2 - 2/3I*tr(SijRij^2)
-            tb[i, :, 5] = (rij_i @ rijsij
-                           + sij_i @ rijrij
-                           - 2./3.*np.eye(3)*np.trace(sij_i @ rijrij)).ravel()[ij_uniq]
-            # 7: RijSijRij^2 - Rij^2SijRij
-            tb[i, :, 6] = (rijsij @ rijrij - rijrij @ sijrij).ravel()[ij_uniq]
-            # 8: SijRijSij^2 - Sij^2RijSij
-            tb[i, :, 7] = (sijrij @ sijsij - sijsij @ rijsij).ravel()[ij_uniq]
-            # 9: Rij^2Sij^2 + Sij^2Rij^2 - 2/3I*tr(Sij^2Rij^2)
-            tb[i, :, 8] = (rijrij @ sijsij
-                           + sijsij @ rijrij
-                           - 2./3.*np.eye(3)*np.trace(sijsij @ rijrij)).ravel()[ij_uniq]
-            # 10: RijSij^2Rij^2 - Rij^2Sij^2Rij
-            tb[i, :, 9] = ((rij_i @ sijsij) @ rijrij
-                           - (rij_i @ rijsij) @ sijrij).ravel()[ij_uniq]
-
-        # If enforce zero trace for anisotropy for each basis
-        if zero_trace:
-            for j in range(n_bases):
-                # Recall tb is shape (n_samples, 6, n_bases)
-                tb[i, :, j] -= (1./3.*np.eye(3)*np.trace(tb[i, ij_6to9, j].reshape((3, 3)))).ravel()[ij_uniq]
-
-        # Gauge progress
-        progress = float(i)/(sij.shape[0] + 1)*100.
-        if progress >= milestone:
-            printf(' %d %%... ', milestone)
-            milestone += 10
-
+    if dtype is None: dtype = sij.dtype
+    dtype = np.float32 if dtype == np.float32 else np.float64
+    sij = np.asarray(sij, dtype=dtype)
+    rij = np.asarray(rij, dtype=dtype)
+    n_points = sij.shape[0]
     # Scale down to promote convergence
     if is_scale:
-        # Using tuple gives Numba error
-        scale_factor = [1, 10, 10, 10, 100, 100, 1000, 1000, 1000, 1000]
-        # Go through each basis
-        for j in range(1, n_bases):
-            tb[:, :, j] /= scale_factor[j]
+        scale = np.array((1., 10., 10., 10., 100., 100., 1000., 1000., 1000., 1000.))
+    else:
+        scale = np.ones(10)
+
+    if np.shape(sij) != (n_points, 6) or np.shape(rij) not in ((n_points, 3), (n_points, 9)):
+        raise ValueError("\nsij must have 6 or 9 and rij 3 or 9 components for all " + str(n_points) + " points!\n")
+
+    # Tensor bases is nPoint x 6 x nBasis
+    if out is None:
+        tb = np.empty((n_points, 6, n_bases), dtype=dtype)
+    # The kernel doesn't check bounds, thus a provided buffer has to match exactly
+    elif np.shape(out) != (n_points, 6, n_bases) or out.dtype != dtype or not out.flags['C_CONTIGUOUS']:
+        raise ValueError("\nout must be a C-contiguous " + np.dtype(dtype).name + " array of shape " + str((n_points, 6, n_bases)) + "!\n")
+    else:
+        tb = out
+    if dtype == np.float32:
+        _getInvariantBasesSet[float](sij, rij, tb, zero_trace, scale)
+    else:
+        _getInvariantBasesSet[double](sij, rij, tb, zero_trace, scale)
 
     return tb
 
 
-cpdef np.ndarray makeRealizable(np.ndarray bij):
+cpdef np.ndarray makeRealizable(np.ndarray bij, int max_iter=1, double tol=1e-12):
     """
     From Ling et al. (2016), see https://github.com/tbnn/tbnn.
     
@@ -486,19 +476,21 @@ cpdef np.ndarray makeRealizable(np.ndarray bij):
     Given the anisotropy tensor, this function forces realizability
     by shifting values within acceptable ranges for Aii > -1/3 and 2|Aij| < Aii + Ajj + 2/3
     Then, if eigenvalues negative, shift them to zero. Noteworthy that this step can undo
-    constraints from first step, so this function should be called iteratively to get convergence
-    to a realizable state.
+    constraints from first step, so this function iterates up to max_iter times to get convergence
+    to a realizable state. Each iteration only visits the points corrected in the previous iteration,
+    and the number of corrected points is reported for every iteration.
 
     :param bij: The predicted anisotropy tensor.
     :type bij: np.ndarray[n_points or mesh grid, 9 or 6 or 3 x 3]
+    :param max_iter: Maximum number of iterations. Iterations stop early once no point is corrected.
+    :type max_iter: int, optional (default=1)
+    :param tol: Tolerance of bound violation below which a point is considered realizable.
+    :type tol: float, optional (default=1e-12)
 
     :return: The predicted realizable anisotropy tensor, same shape as the input array.
     :type: np.ndarray[n_points or mesh grid, 6 or 9 or 3 x 3]
     """
-    cdef unsigned int n_points, i, j, old_lastdim
-    cdef np.ndarray[np.float_t, ndim=2] A, evectors
-    cdef np.ndarray[np.float_t] evalues
-    cdef list bii
+    cdef unsigned int old_lastdim
     cdef tuple oldshape
 
     # Collapse mesh grid and if 3 x 3 form, collapse matrix form too to 9
@@ -506,80 +498,23 @@ cpdef np.ndarray makeRealizable(np.ndarray bij):
     old_lastdim = len(oldshape) - 1
     # If bij is n_points x 6, expand it to full form of n_points x 9
     if bij.shape[1] == 6: bij = expandSymmetricTensor(bij)
+    bij = _makeRealizable(np.ascontiguousarray(bij, dtype=np.float64), max_iter, tol)
+    # Reverse to old shape of 6 components or 3 x 3 and possibly old mesh grid
+    if oldshape[old_lastdim] == 6:
+        bij = contractSymmetricTensor(bij)
+    elif oldshape[old_lastdim - 1:] == (3, 3):
+        bij = bij.reshape((bij.shape[0], 3, 3))
 
-    n_points = bij.shape[0]
-    bii = [0, 4, 8]
-    A = np.zeros((3, 3))
-    for i in range(n_points):
-        # Scales all on-diags to retain zero trace
-        if np.min(bij[i, [0, 4, 8]]) < -1./3.:
-            bij[i, [0, 4, 8]] *= -1./(3.*np.min(bij[i, [0, 4, 8]]))
-
-        if 2.*np.abs(bij[i, 1]) > bij[i, 0] + bij[i, 4] + 2./3.:
-            bij[i, 1] = (bij[i, 0] + bij[i, 4] + 2./3.)*.5*np.sign(bij[i, 1])
-            bij[i, 3] = (bij[i, 0] + bij[i, 4] + 2./3.)*.5*np.sign(bij[i, 1])
-        if 2.*np.abs(bij[i, 5]) > bij[i, 4] + bij[i, 8] + 2./3.:
-            bij[i, 5] = (bij[i, 4] + bij[i, 8] + 2./3.)*.5*np.sign(bij[i, 5])
-            bij[i, 7] = (bij[i, 4] + bij[i, 8] + 2./3.)*.5*np.sign(bij[i, 5])
-        if 2.*np.abs(bij[i, 2]) > bij[i, 0] + bij[i, 8] + 2./3.:
-            bij[i, 2] = (bij[i, 0] + bij[i, 8] + 2./3.)*.5*np.sign(bij[i, 2])
-            bij[i, 6] = (bij[i, 0] + bij[i, 8] + 2./3.)*.5*np.sign(bij[i, 2])
-
-        # Enforce positive semidefinite by pushing evalues to non-negative
-        A[0, 0] = bij[i, 0]
-        A[1, 1] = bij[i, 4]
-        A[2, 2] = bij[i, 8]
-        A[0, 1] = bij[i, 1]
-        A[1, 0] = bij[i, 1]
-        A[1, 2] = bij[i, 5]
-        A[2, 1] = bij[i, 5]
-        A[0, 2] = bij[i, 2]
-        A[2, 0] = bij[i, 2]
-        evalues, evectors = np.linalg.eig(A)
-        if np.max(evalues) < (3.*np.abs(np.sort(evalues)[1]) - np.sort(evalues)[1])/2.:
-            evalues = evalues*(3.*np.abs(np.sort(evalues)[1]) - np.sort(evalues)[1])/(2.*np.max(evalues))
-            A = np.dot(np.dot(evectors, np.diag(evalues)), np.linalg.inv(evectors))
-            for j in range(3):
-                bij[i, bii[j]] = A[j, j]
-
-            bij[i, 1] = A[0, 1]
-            bij[i, 5] = A[1, 2]
-            bij[i, 2] = A[0, 2]
-            bij[i, 3] = A[0, 1]
-            bij[i, 7] = A[1, 2]
-            bij[i, 6] = A[0, 2]
-
-        if np.max(evalues) > 1./3. - np.sort(evalues)[1]:
-            evalues = evalues*(1./3. - np.sort(evalues)[1])/np.max(evalues)
-            A = np.dot(np.dot(evectors, np.diag(evalues)), np.linalg.inv(evectors))
-            for j in range(3):
-                bij[i, bii[j]] = A[j, j]
-
-            bij[i, 1] = A[0, 1]
-            bij[i, 5] = A[1, 2]
-            bij[i, 2] = A[0, 2]
-            bij[i, 3] = A[0, 1]
-            bij[i, 7] = A[1, 2]
-            bij[i, 6] = A[0, 2]
-
-    # Preparing to reverse to old mesh grid incase old shape is at least 3D and last dimension is n_components
-    if old_lastdim > 1:
-        if oldshape[old_lastdim] == 6:
-            bij = contractSymmetricTensor(bij)
-        elif oldshape[old_lastdim - 1:] == (3, 3):
-            bij = bij.reshape((bij[0], 3, 3))
-
-        bij = reverseOldGridShape(bij, oldshape)
+    if old_lastdim > 1: bij = reverseOldGridShape(bij, oldshape)
 
     return bij
 
 
 
-
 # -----------------------------------------------------
 # Supporting Functions, Not Intended to Be Called From Python
 # -----------------------------------------------------
-cdef np.ndarray[np.float_t, ndim=2] _makeRealizable(np.ndarray[np.float_t, ndim=2] bij):
+cdef np.ndarray[np.float_t, ndim=2] _makeRealizable(np.ndarray[np.float_t, ndim=2] bij, int max_iter=1, double tol=1e-12):
     """
     From Ling et al. (2016), see https://github.com/tbnn/tbnn.
     
@@ -587,78 +522,382 @@ cdef np.ndarray[np.float_t, ndim=2] _makeRealizable(np.ndarray[np.float_t, ndim=
     Given the anisotropy tensor, this function forces realizability
     by shifting values within acceptable ranges for Aii > -1/3 and 2|Aij| < Aii + Ajj + 2/3
     Then, if eigenvalues negative, shifts them to zero. Noteworthy that this step can undo
-    constraints from first step, so this function should be called iteratively to get convergence
-    to a realizable state.
+    constraints from first step, so this function iterates up to max_iter times on the points
+    that were corrected in the previous iteration, to get convergence to a realizable state.
+    bij is modified in place.
 
-    :param bij: The predicted anisotropy tensor.
+    :param bij: The predicted anisotropy tensor, C-contiguous.
     :type bij: np.ndarray[n_points, 9]
+    :param max_iter: Maximum number of iterations.
+    :type max_iter: int, optional (default=1)
+    :param tol: Tolerance of bound violation below which a point is considered realizable.
+    :type tol: float, optional (default=1e-12)
 
     :return: The predicted realizable anisotropy tensor.
     :type: np.ndarray[n_points, 9]
     """
-    cdef unsigned int n_points, i, j
-    cdef np.ndarray[np.float_t, ndim=2] A, evectors
-    cdef np.ndarray[np.float_t] evalues
-    cdef list bii
-
-    n_points = bij.shape[0]
-    bii = [0, 4, 8]
-    A = np.zeros((3, 3))
-    for i in range(n_points):
-        # Scales all on-diags to retain zero trace
-        if np.min(bij[i, [0, 4, 8]]) < -1./3.:
-            bij[i, [0, 4, 8]] *= -1./(3.*np.min(bij[i, [0, 4, 8]]))
-
-        if 2.*np.abs(bij[i, 1]) > bij[i, 0] + bij[i, 4] + 2./3.:
-            bij[i, 1] = (bij[i, 0] + bij[i, 4] + 2./3.)*.5*np.sign(bij[i, 1])
-            bij[i, 3] = (bij[i, 0] + bij[i, 4] + 2./3.)*.5*np.sign(bij[i, 1])
-        if 2.*np.abs(bij[i, 5]) > bij[i, 4] + bij[i, 8] + 2./3.:
-            bij[i, 5] = (bij[i, 4] + bij[i, 8] + 2./3.)*.5*np.sign(bij[i, 5])
-            bij[i, 7] = (bij[i, 4] + bij[i, 8] + 2./3.)*.5*np.sign(bij[i, 5])
-        if 2.*np.abs(bij[i, 2]) > bij[i, 0] + bij[i, 8] + 2./3.:
-            bij[i, 2] = (bij[i, 0] + bij[i, 8] + 2./3.)*.5*np.sign(bij[i, 2])
-            bij[i, 6] = (bij[i, 0] + bij[i, 8] + 2./3.)*.5*np.sign(bij[i, 2])
-
-        # Enforce positive semidefinite by pushing evalues to non-negative
-        A[0, 0] = bij[i, 0]
-        A[1, 1] = bij[i, 4]
-        A[2, 2] = bij[i, 8]
-        A[0, 1] = bij[i, 1]
-        A[1, 0] = bij[i, 1]
-        A[1, 2] = bij[i, 5]
-        A[2, 1] = bij[i, 5]
-        A[0, 2] = bij[i, 2]
-        A[2, 0] = bij[i, 2]
-        evalues, evectors = np.linalg.eig(A)
-        if np.max(evalues) < (3.*np.abs(np.sort(evalues)[1]) - np.sort(evalues)[1])/2.:
-            evalues = evalues*(3.*np.abs(np.sort(evalues)[1]) - np.sort(evalues)[1])/(2.*np.max(evalues))
-            A = np.dot(np.dot(evectors, np.diag(evalues)), np.linalg.inv(evectors))
-            for j in range(3):
-                bij[i, bii[j]] = A[j, j]
-
-            bij[i, 1] = A[0, 1]
-            bij[i, 5] = A[1, 2]
-            bij[i, 2] = A[0, 2]
-            bij[i, 3] = A[0, 1]
-            bij[i, 7] = A[1, 2]
-            bij[i, 6] = A[0, 2]
-
-        if np.max(evalues) > 1./3. - np.sort(evalues)[1]:
-            evalues = evalues*(1./3. - np.sort(evalues)[1])/np.max(evalues)
-            A = np.dot(np.dot(evectors, np.diag(evalues)), np.linalg.inv(evectors))
-            for j in range(3):
-                bij[i, bii[j]] = A[j, j]
-
-            bij[i, 1] = A[0, 1]
-            bij[i, 5] = A[1, 2]
-            bij[i, 2] = A[0, 2]
-            bij[i, 3] = A[0, 1]
-            bij[i, 7] = A[1, 2]
-            bij[i, 6] = A[0, 2]
+    cdef double[:, ::1] bij_view = bij
+    cdef np.ndarray active = np.arange(bij.shape[0], dtype=np.intp)
+    cdef np.ndarray corrected
+    cdef Py_ssize_t[::1] active_view
+    cdef np.uint8_t[::1] corrected_view
+    cdef Py_ssize_t j, n_active
+    cdef int i
+
+    for i in range(max_iter):
+        active_view = active
+        n_active = active.shape[0]
+        corrected = np.zeros(n_active, dtype=np.uint8)
+        corrected_view = corrected
+        # Go through each active point in parallel
+        for j in prange(n_active, nogil=True, schedule='guided'):
+            corrected_view[j] = _makePointRealizable(&bij_view[active_view[j], 0], tol)
+
+        # Only points corrected in this iteration can still be unrealizable
+        active = active[corrected.view(np.bool_)]
+        print(' Realizability iteration ' + str(i + 1) + ': ' + str(active.shape[0]) + ' points corrected')
+        if active.shape[0] == 0: break
 
     return bij
 
 
+cdef bint _makePointRealizable(double* b, double tol) noexcept nogil:
+    """
+    One realizability pass of Ling et al. (2016) on one bij of 9 components in place.
+    Since the eigenvalue step scales all eigenvalues by the same factor, it scales bij as a whole
+    and only the eigenvalues of the symmetric bij are needed.
+    Returns whether bij was corrected.
+    """
+    cdef double w[3]
+    cdef double v[9]
+    cdef double bmin, bound, factor
+    cdef int j
+    cdef int[3] ij, ii, jj
+    cdef bint corrected = False
+
+    # Scales all on-diags to retain zero trace
+    bmin = min(b[0], b[4], b[8])
+    if bmin < -1./3. - tol:
+        factor = -1./(3.*bmin)
+        b[0] *= factor
+        b[4] *= factor
+        b[8] *= factor
+        corrected = True
+
+    # Off-diag index ij, bounded by the on-diags ii, jj
+    ij[0], ii[0], jj[0] = 1, 0, 4
+    ij[1], ii[1], jj[1] = 5, 4, 8
+    ij[2], ii[2], jj[2] = 2, 0, 8
+    for j in range(3):
+        bound = b[ii[j]] + b[jj[j]] + 2./3.
+        if 2.*fabs(b[ij[j]]) > bound + tol:
+            b[ij[j]] = bound*.5*((b[ij[j]] > 0.) - (b[ij[j]] < 0.))
+            # Symmetric counterpart, i.e. 3, 7, 6
+            b[3*(ij[j]%3) + ij[j]//3] = b[ij[j]]
+            corrected = True
+
+    # Enforce positive semidefinite by pushing evalues to non-negative
+    _eigenSymmetric3x3(b, w, v, 1e-12)
+    if w[0] != 0. and w[0] < (3.*fabs(w[1]) - w[1])/2. - tol:
+        factor = (3.*fabs(w[1]) - w[1])/(2.*w[0])
+        for j in range(3): w[j] *= factor
+        for j in range(9): b[j] *= factor
+        corrected = True
+
+    if w[0] > 1./3. - w[1] + tol:
+        factor = (1./3. - w[1])/w[0]
+        for j in range(9): b[j] *= factor
+        corrected = True
+
+    return corrected
+
+
+cdef int _getStrainAndRotationRateTensor(floating[:, :] g, floating[:] tke, floating[:] eps, bint is_scaled, double cap,
+                                         floating[:, ::1] sij, floating[:, ::1] rij) noexcept:
+    """
+    Sij and Rij of every point in parallel, see getStrainAndRotationRateTensor(). Return how many components were capped.
+    """
+    cdef Py_ssize_t i, n_points = g.shape[0]
+    cdef Py_ssize_t g_stride = g.strides[1]//sizeof(floating)
+    cdef double half_tke_eps, eps_i
+    cdef int n_capped = 0
+
+    # Go through each point in parallel
+    for i in prange(n_points, nogil=True, schedule='static'):
+        # Non-dimensionalization coefficient for strain and rotation rate tensor,
+        # capping epsilon to 1e-10 to avoid FPE, also assuming no back-scattering
+        if is_scaled:
+            eps_i = eps[i]
+            if eps_i == 0.: eps_i = 1e-10
+            half_tke_eps = tke[i]/eps_i*0.5
+        else:
+            half_tke_eps = 0.5
+
+        n_capped += _getStrainAndRotationRate(&g[i, 0], g_stride, half_tke_eps, cap, &sij[i, 0], &rij[i, 0])
+
+    return n_capped
+
+
+cdef int _getStrainAndRotationRate(const floating* g, Py_ssize_t g_stride, double half_tke_eps, double cap,
+                                   floating* sij, floating* rij) noexcept nogil:
+    """
+    Sij and Rij of one point given 9 grad(U) components with stride g_stride, evaluated in double precision first.
+    Return how many components were capped.
+    """
+    cdef double s[6]
+    cdef double r[9]
+    cdef double trace
+    cdef int c, n_capped
+
+    # Basically Sij = 0.5TKE/epsilon*(grad_u_i + grad_u_j)
+    # xx, xy, xz | 0, 1, 2
+    # yx, yy, yz | 3, 4, 5
+    # zx, zy, zz | 6, 7, 8
+    s[0] = half_tke_eps*(<double>g[0] + g[0])
+    s[1] = half_tke_eps*(<double>g[g_stride] + g[3*g_stride])
+    s[2] = half_tke_eps*(<double>g[2*g_stride] + g[6*g_stride])
+    s[3] = half_tke_eps*(<double>g[4*g_stride] + g[4*g_stride])
+    s[4] = half_tke_eps*(<double>g[5*g_stride] + g[7*g_stride])
+    s[5] = half_tke_eps*(<double>g[8*g_stride] + g[8*g_stride])
+    # Basically Rij = 0.5TKE/epsilon*(grad_u_i - grad_u_j) that has 0 in the diagonal
+    r[0] = r[4] = r[8] = 0.
+    r[1] = half_tke_eps*(<double>g[g_stride] - g[3*g_stride])
+    r[2] = half_tke_eps*(<double>g[2*g_stride] - g[6*g_stride])
+    r[5] = half_tke_eps*(<double>g[5*g_stride] - g[7*g_stride])
+    r[3] = -r[1]
+    r[6] = -r[2]
+    r[7] = -r[5]
+    # Cap magnitudes
+    n_capped = _capArray(s, 6, cap) + _capArray(r, 9, cap)
+    # Because we enforced limits on Sij, we need to re-enforce trace of 0.
+    # Also removes any divergence left in grad(U)
+    trace = (s[0] + s[3] + s[5])/3.
+    s[0] -= trace
+    s[3] -= trace
+    s[5] -= trace
+    for c in range(6): sij[c] = <floating>s[c]
+    for c in range(9): rij[c] = <floating>r[c]
+
+    return n_capped
+
+
+cdef void _getInvariantBasesSet(floating[:, :] sij, floating[:, :] rij, floating[:, :, ::1] tb,
+                                bint zero_trace, double[::1] scale) noexcept:
+    """
+    Tij of every point in parallel, see getInvariantBases().
+    """
+    cdef Py_ssize_t i, n_points = sij.shape[0]
+    cdef Py_ssize_t s_stride = sij.strides[1]//sizeof(floating)
+    cdef int n_bases = tb.shape[2]
+    # Indices of Rxy, Rxz, Ryz
+    cdef int ixy = 1 if rij.shape[1] == 9 else 0
+    cdef int ixz = 2 if rij.shape[1] == 9 else 1
+    cdef int iyz = 5 if rij.shape[1] == 9 else 2
+
+    for i in prange(n_points, nogil=True, schedule='static'):
+        _getInvariantBases(&sij[i, 0], s_stride, rij[i, ixy], rij[i, ixz], rij[i, iyz],
+                           &tb[i, 0, 0], n_bases, zero_trace, &scale[0])
+
+
+cdef int _capArray(double* arr, int n, double cap) noexcept nogil:
+    """
+    Cap n values of arr to [-cap, cap] in place and return how many were capped.
+    """
+    cdef int j
+    cdef int n_capped = 0
+
+    for j in range(n):
+        if arr[j] > cap:
+            arr[j] = cap
+            n_capped += 1
+        elif arr[j] < -cap:
+            arr[j] = -cap
+            n_capped += 1
+
+    return n_capped
+
+
+cdef inline void _matMul3x3(const double* a, const double* b, double* c) noexcept nogil:
+    """
+    c = a*b for 3 x 3 matrices of 9 components.
+    """
+    cdef int j, k
+
+    for j in range(3):
+        for k in range(3):
+            c[3*j + k] = a[3*j]*b[k] + a[3*j + 1]*b[3 + k] + a[3*j + 2]*b[6 + k]
+
+
+cdef inline void _setSymmetricBasis(const double* m, double* tb_j, int n_bases, double trace_coef) noexcept nogil:
+    """
+    Write the 6 unique components of m + m^T - trace_coef*tr(m)*I to col tb_j of tb that has n_bases cols.
+    """
+    cdef double diag = trace_coef*(m[0] + m[4] + m[8])
+
+    tb_j[0] = m[0] + m[0] - diag
+    tb_j[n_bases] = m[1] + m[3]
+    tb_j[2*n_bases] = m[2] + m[6]
+    tb_j[3*n_bases] = m[4] + m[4] - diag
+    tb_j[4*n_bases] = m[5] + m[7]
+    tb_j[5*n_bases] = m[8] + m[8] - diag
+
+
+cdef void _getInvariantBases(const floating* s6, Py_ssize_t s_stride, double rxy, double rxz, double ryz,
+                             floating* tb_out, int n_bases, bint zero_trace, const double* scale) noexcept nogil:
+    """
+    Calculate n_bases invariant bases of one point given 6 unique Sij components with stride s_stride and Rxy, Rxz, Ryz.
+    tb_out is the (6, n_bases) C-contiguous Tij of this point, evaluated in double precision first.
+    """
+    cdef double tb[60]
+    cdef double s[9]
+    cdef double r[9]
+    cdef double rr[9]
+    cdef double ss[9]
+    cdef double sr[9]
+    cdef double rs[9]
+    cdef double rss[9]
+    cdef double m[9]
+    cdef double trace
+    cdef int j, c
+
+    s[0] = s6[0]
+    s[1] = s[3] = s6[s_stride]
+    s[2] = s[6] = s6[2*s_stride]
+    s[4] = s6[3*s_stride]
+    s[5] = s[7] = s6[4*s_stride]
+    s[8] = s6[5*s_stride]
+    r[0] = r[4] = r[8] = 0.
+    r[1], r[2], r[5] = rxy, rxz, ryz
+    r[3], r[6], r[7] = -rxy, -rxz, -ryz
+    # Rij^2 is symmetric and explicitly known from the 3 unique components
+    rr[0] = -(rxy*rxy + rxz*rxz)
+    rr[4] = -(rxy*rxy + ryz*ryz)
+    rr[8] = -(rxz*rxz + ryz*ryz)
+    rr[1] = rr[3] = -rxz*ryz
+    rr[2] = rr[6] = rxy*ryz
+    rr[5] = rr[7] = -rxy*rxz
+    _matMul3x3(s, s, ss)
+    _matMul3x3(s, r, sr)
+    # RijSij = -(SijRij)^T
+    for j in range(3):
+        for c in range(3):
+            rs[3*j + c] = -sr[3*c + j]
+
+    # 1: Sij
+    for c in range(6):
+        tb[c*n_bases] = s6[c*s_stride]
+
+    # 2: SijRij - RijSij
+    _setSymmetricBasis(sr, tb + 1, n_bases, 0.)
+    # 3: Sij^2 - 1/3I*tr(Sij^2), with half since ss + ss^T = 2ss
+    for c in range(9): m[c] = 0.5*ss[c]
+    _setSymmetricBasis(m, tb + 2, n_bases, 2./3.)
+    # 4: Rij^2 - 1/3I*tr(Rij^2)
+    for c in range(9): m[c] = 0.5*rr[c]
+    _setSymmetricBasis(m, tb + 3, n_bases, 2./3.)
+    # If more than 4 bases
+    if n_bases == 10:
+        # 5: RijSij^2 - Sij^2Rij
+        _matMul3x3(r, ss, rss)
+        _setSymmetricBasis(rss, tb + 4, n_bases, 0.)
+        # 6: Rij^2Sij + SijRij^2 - 2/3I*tr(SijRij^2)
+        _matMul3x3(s, rr, m)
+        _setSymmetricBasis(m, tb + 5, n_bases, 2./3.)
+        # 7: RijSijRij^2 - Rij^2SijRij
+        _matMul3x3(rs, rr, m)
+        _setSymmetricBasis(m, tb + 6, n_bases, 0.)
+        # 8: SijRijSij^2 - Sij^2RijSij
+        _matMul3x3(sr, ss, m)
+        _setSymmetricBasis(m, tb + 7, n_bases, 0.)
+        # 9: Rij^2Sij^2 + Sij^2Rij^2 - 2/3I*tr(Sij^2Rij^2)
+        _matMul3x3(rr, ss, m)
+        _setSymmetricBasis(m, tb + 8, n_bases, 2./3.)
+        # 10: RijSij^2Rij^2 - Rij^2Sij^2Rij
+        _matMul3x3(rss, rr, m)
+        _setSymmetricBasis(m, tb + 9, n_bases, 0.)
+
+    for j in range(n_bases):
+        # If enforce zero trace for anisotropy for each basis
+        if zero_trace:
+            trace = (tb[j] + tb[3*n_bases + j] + tb[5*n_bases + j])/3.
+            tb[j] -= trace
+            tb[3*n_bases + j] -= trace
+            tb[5*n_bases + j] -= trace
+
+        # Scale down to promote convergence
+        if scale[j] != 1.:
+            for c in range(6):
+                tb[c*n_bases + j] /= scale[j]
+
+    for c in range(6*n_bases): tb_out[c] = <floating>tb[c]
+
+
+cdef void _eigenSymmetric3x3(const double* a, double* w, double* v, double tol) noexcept nogil:
+    """
+    Cyclic Jacobi eigen decomposition of one 3 x 3 symmetric tensor a of 9 components.
+    Eigenvalues w are sorted in descending order and v is 9 components with each col being an eigenvector.
+    """
+    cdef double m[3][3]
+    cdef double norm2 = 0.
+    cdef double off2, theta, t, c, s, mkp, mkq, tmp
+    cdef int sweep, p, q, k, j, jmax
+
+    for j in range(3):
+        for k in range(3):
+            # Symmetrize from upper triangle
+            m[j][k] = a[3*j + k] if k >= j else a[3*k + j]
+            v[3*j + k] = 1. if j == k else 0.
+            norm2 += m[j][k]*m[j][k]
+
+    # At most 50 sweeps, usually converged in 4-6 since Jacobi converges quadratically
+    for sweep in range(50):
+        off2 = m[0][1]*m[0][1] + m[0][2]*m[0][2] + m[1][2]*m[1][2]
+        if off2 <= tol*tol*norm2: break
+        # Annihilate (0, 1), (0, 2), (1, 2) in turn
+        for p in range(2):
+            for q in range(p + 1, 3):
+                if m[p][q] == 0.: continue
+                theta = (m[q][q] - m[p][p])/(2.*m[p][q])
+                # Smaller root of t^2 + 2t*theta - 1 = 0, avoiding overflow for huge theta
+                if fabs(theta) > 1e150:
+                    t = 0.5/theta
+                else:
+                    t = 1./(fabs(theta) + sqrt(theta*theta + 1.))
+                    if theta < 0.: t = -t
+
+                c = 1./sqrt(t*t + 1.)
+                s = t*c
+                # m = P^T*m*P, then v = v*P
+                for k in range(3):
+                    mkp, mkq = m[k][p], m[k][q]
+                    m[k][p] = c*mkp - s*mkq
+                    m[k][q] = s*mkp + c*mkq
+
+                for k in range(3):
+                    mkp, mkq = m[p][k], m[q][k]
+                    m[p][k] = c*mkp - s*mkq
+                    m[q][k] = s*mkp + c*mkq
+
+                for k in range(3):
+                    mkp, mkq = v[3*k + p], v[3*k + q]
+                    v[3*k + p] = c*mkp - s*mkq
+                    v[3*k + q] = s*mkp + c*mkq
+
+    for j in range(3):
+        w[j] = m[j][j]
+
+    # Selection sort to descending order, swapping eigenvector cols along
+    for j in range(2):
+        jmax = j
+        for k in range(j + 1, 3):
+            if w[k] > w[jmax]: jmax = k
+
+        if jmax != j:
+            tmp = w[j]; w[j] = w[jmax]; w[jmax] = tmp
+            for k in range(3):
+                tmp = v[3*k + j]; v[3*k + j] = v[3*k + jmax]; v[3*k + jmax] = tmp
+
+
 cdef np.ndarray[np.float_t, ndim=2] _mapVectorToAntisymmetricTensor(np.ndarray[np.float_t, ndim=2] vec, np.ndarray scaler=None):
     """
     Map a vector to the anti-symmetric tensor A by
@@ -3,6 +3,7 @@ import sys
 # See https://github.com/YuyangL/SOWFA-PostProcess
 sys.path.append('/home/yluan/Documents/SOWFA PostProcessing/SOWFA-Postprocess')
 from FieldData import FieldData
+from DataStore import readArrayData
 from Preprocess.GridSearchSetup import setupDecisionTreeGridSearchCV
 from Preprocess.Tensor import processReynoldsStress, getBarycentricMapData
 
@@ -20,7 +21,7 @@ from sklearn.tree import DecisionTreeRegressor
 from sklearn.multioutput import RegressorChain
 from joblib import load, dump
 import time as t
-from Utility import interpolateGridData
+from Utility import GridInterpolator
 from scipy import ndimage
 from matplotlib.path import Path
 from matplotlib.patches import PathPatch
@@ -249,7 +250,7 @@ elif estimator_name in ('TBRC', 'tbrc'):
 Read Train & Test Data
 """
 # First GSCV data
-list_data_gs = case.readPickleData(time, 'list_data_GS_' + confinedFieldNameSub)
+list_data_gs = readArrayData(case.result_paths[time], 'list_data_GS_' + confinedFieldNameSub)
 cc_gs = list_data_gs[0]
 x_gs = list_data_gs[1]
 y_gs = list_data_gs[2]
@@ -257,7 +258,7 @@ tb_gs = list_data_gs[3]
 del list_data_gs
 
 # Second train data
-list_data_train = case.readPickleData(time, 'list_data_train_' + confinedFieldNameSub)
+list_data_train = readArrayData(case.result_paths[time], 'list_data_train_' + confinedFieldNameSub)
 cc_train = list_data_train[0]
 x_train = list_data_train[1]
 y_train = list_data_train[2]
@@ -267,7 +268,7 @@ del list_data_train
 # Then test data which are various slices
 # TODO: make it a loop
 slice_type = sliceNames[0]
-list_data_test = case.readPickleData(time, 'list_data_test_' + slice_type)
+list_data_test = readArrayData(case.result_paths[time], 'list_data_test_' + slice_type)
 cc_test = list_data_test[0]
 ccx_test, ccy_test = cc_test[:, 0], cc_test[:, 1]
 x_test = list_data_test[1]
@@ -359,14 +360,17 @@ t1 = t.time()
 print('\nFinished getting Barycentric map data in {:.4f} s'.format(t1 - t0))
 
 t0 = t.time()
-ccx_test_mesh, ccy_test_mesh, _, rgb_bary_test_mesh = interpolateGridData(ccx_test, ccy_test, rgb_bary_test, mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
-_, _, _, rgb_bary_pred_test_mesh = interpolateGridData(ccx_test, ccy_test, rgb_bary_pred_test, mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
+# Triangulation and interpolation weights are built once and shared by all interpolated fields
+interpolator = GridInterpolator(ccx_test, ccy_test, mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
+ccx_test_mesh, ccy_test_mesh = interpolator.xmesh, interpolator.ymesh
+rgb_bary_test_mesh = interpolator(rgb_bary_test)
+rgb_bary_pred_test_mesh = interpolator(rgb_bary_pred_test)
 t1 = t.time()
 print('\nFinished interpolating mesh data for barycentric map in {:.4f} s'.format(t1 - t0))
 
 t0 = t.time()
-_, _, _, y_test_mesh = interpolateGridData(ccx_test, ccy_test, y_test, mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
-_, _, _, y_pred_test_mesh = interpolateGridData(ccx_test, ccy_test, y_pred_test, mesh_target=uniform_mesh_size, interp=interp_method, fill_val=0.3)
+y_test_mesh = interpolator(y_test)
+y_pred_test_mesh = interpolator(y_pred_test)
 t1 = t.time()
 print('\nFinished interpolating mesh data for bij in {:.4f} s'.format(t1 - t0))
 
@@ -1,8 +1,8 @@
-import pickle
 import os
 from Preprocess.GridSearchSetup import setupDecisionTreeGridSearchCV, setupRandomForestGridSearch, setupAdaBoostGridSearchCV, setupGradientBoostGridSearchCV, performEstimatorGridSearch, performEstimatorGridSearchCV
 from joblib import dump, load
 import time as t
+from DataStore import readArrayData
 
 """
 User Inputs
@@ -119,7 +119,7 @@ general_kwargs = dict(presort=presort,
 Load Train Data
 """
 t0 = t.time()
-list_data_gs = pickle.load(open(casedir + gsdata_name + '.p', 'rb'), encoding='ASCII')
+list_data_gs = readArrayData(casedir, gsdata_name)
 cc_gs = list_data_gs[0]
 x_gs = list_data_gs[1]
 y_gs = list_data_gs[2]
@@ -131,7 +131,7 @@ if unittest:
     y_train = y_gs
     tb_train = tb_gs
 else:
-    list_data_train = pickle.load(open(casedir + traindata_name + '.p', 'rb'), encoding='ASCII')
+    list_data_train = readArrayData(casedir, traindata_name)
     cc_train = list_data_train[0]
     x_train = list_data_train[1]
     y_train = list_data_train[2]
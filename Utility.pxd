@@ -8,9 +8,12 @@ ctypedef np.float_t flt
 ctypedef unsigned int unsignint
 ctypedef np.uint8_t uint8
 
-cpdef tuple interpolateGridData(np.ndarray[np.float_t] x, np.ndarray[np.float_t] y, np.ndarray val, np.ndarray z=*,
+cpdef tuple interpolateGridData(np.ndarray x, np.ndarray y, np.ndarray val, np.ndarray z=*,
                                 tuple xlim=*, tuple ylim=*, tuple zlim=*,
-                                double mesh_target=*, str interp=*, double fill_val=*)
+                                double mesh_target=*, str interp=*, double fill_val=*, str cache_dir=*,
+                                object structured=*)
+
+# class GridInterpolator
 
 cpdef tuple collapseMeshGridFeatures(np.ndarray meshgrid, bint infer_matrix_form=*, tuple matrix_shape=*, bint collapse_matrix=*)
 
@@ -18,15 +21,20 @@ cpdef np.ndarray reverseOldGridShape(np.ndarray arr, tuple shape_old, bint infer
 
 cpdef np.ndarray rotateData(np.ndarray ndarr, double anglex=*, double angley=*, double anglez=*, tuple matrix_shape=*)
 
-cpdef tuple fieldSpatialSmoothing(np.ndarray[np.float_t, ndim=2] val,
-                                       np.ndarray[np.float_t] x, np.ndarray[np.float_t] y, np.ndarray z=*,
+cpdef tuple fieldSpatialSmoothing(np.ndarray val,
+                                       np.ndarray x, np.ndarray y, np.ndarray z=*,
                                        tuple val_bnd=*, bint is_bij=*, double bij_bnd_multiplier=*,
                                        tuple xlim=*, tuple ylim=*, tuple zlim=*,
-                                       double mesh_target=*, str interp_method=*)
+                                       double mesh_target=*, str interp_method=*, str cache_dir=*, object structured=*)
 
 cpdef np.ndarray gaussianFilter(np.ndarray array, double sigma=*)
 
-cdef uint8[:] _confineFieldDomain3D(nparr[flt, ndim=2] cc,
-                                double box_l, double box_w, double box_h, tuple box_orig=*, double rot_z=*)
+cpdef np.ndarray gaussianFilterChannels(np.ndarray array, double sigma=*, str backend=*, bint inplace=*, double truncate=*)
+
+cpdef list confineFieldDomainIndices3D(np.ndarray cc, list boxes)
+
+cdef np.uint64_t _getBoxBits(double x, double y, double z, const double* boxes, int n_boxes) noexcept nogil
+
+cdef np.ndarray _fftGaussianFilter(np.ndarray array, double sigma, int n_axes, double truncate=*)
 
 # def timer(func)
@@ -6,15 +6,16 @@
 import numpy as np
 cimport numpy as np
 from libc.math cimport fmax, ceil, sqrt, cbrt, sin, cos
+from cython.parallel cimport prange
 from scipy import ndimage
 from Preprocess.Tensor import contractSymmetricTensor
-import functools, time
+import functools, time, os, hashlib
 import warnings
-from matplotlib import path
 
-cpdef tuple interpolateGridData(np.ndarray[np.float_t] x, np.ndarray[np.float_t] y, np.ndarray val, np.ndarray z=None,
+cpdef tuple interpolateGridData(np.ndarray x, np.ndarray y, np.ndarray val, np.ndarray z=None,
                                 tuple xlim=(None, None), tuple ylim=(None, None), tuple zlim=(None, None),
-                                double mesh_target=1e4, str interp="linear", double fill_val=np.nan):
+                                double mesh_target=1e4, str interp="linear", double fill_val=np.nan, str cache_dir=None,
+                                object structured=False):
     """
     Interpolate given coordinates and field properties to satisfy given summed mesh size, given x, y (and z) limits, with given interpolation method.
     If z is not given, then the interpolation is 2D. 
@@ -22,6 +23,7 @@ cpdef tuple interpolateGridData(np.ndarray[np.float_t] x, np.ndarray[np.float_t]
     The number of cells nx, ny, (nz) in each dimension is automatically determined to scale with physical dimension length lx, ly, (lz),
     so that nx = lx*nbase; ny = ly*nbase; (nz = lz*nbase), 
     and nx*ny = mesh_target or nx*ny*nz = mesh_target. 
+    Field properties of float32 are interpolated to a float32 mesh grid, everything else to float64.
     
     :param x: X coordinates.
     :type x: ndarray[n_points]
@@ -48,6 +50,12 @@ cpdef tuple interpolateGridData(np.ndarray[np.float_t] x, np.ndarray[np.float_t]
     :type interp: "nearest" or "linear" or "cubic", optional (default="linear")
     :param fill_val: Value to replace NaN.
     :type fill_val: float, optional (default=nan)
+    :param cache_dir: Directory to cache interpolation weights across runs, see GridInterpolator.
+    If None, no caching is done.
+    :type cache_dir: str or None, optional (default=None)
+    :param structured: Whether known coordinates form a (rotated) structured lattice, see GridInterpolator.
+    If "auto", the lattice is detected.
+    :type structured: bool or "auto", optional (default=False)
 
     :return: X, Y, Z mesh grid and field properties mesh grid.
     If Z was not given, then Z is returned as dummy array.
@@ -55,83 +63,328 @@ cpdef tuple interpolateGridData(np.ndarray[np.float_t] x, np.ndarray[np.float_t]
     :rtype: (ndarray[nx, ny], ndarray[nx, ny], empty(1), ndarray[nx, ny, n_features])
     or (ndarray[nx, ny, nz], ndarray[nx, ny, nz], ndarray[nx, ny, nz], ndarray[nx, ny, nz, n_features])
     """
-    from scipy.interpolate import griddata
-
-    cdef tuple shape_val = np.shape(val)
-    cdef double lx, ly, lz, nbase
-    cdef int nx, ny, nz, i, n_features
-    cdef np.ndarray[np.float_t, ndim=2] coor_known
-    cdef np.ndarray xmesh, ymesh, zmesh, val_mesh
-    cdef tuple coor_request
-    cdef double complex precision_x, precision_y, precision_z
-
-    print('\nInterpolating data to target mesh size ' + str(mesh_target) + ' with ' + str(interp) + ' method...')
-    # Ensure val is at least 2D with shape (n_points, 1) if it was 1D
-    if len(shape_val) == 1:
-        val = np.transpose(np.atleast_2d(val))
-
-    n_features = val.shape[1]
-    # Limit new mesh if requested
-    xmin = x.min() if xlim[0] is None else xlim[0]
-    xmax = x.max() if xlim[1] is None else xlim[1]
-    ymin = y.min() if ylim[0] is None else ylim[0]
-    ymax = y.max() if ylim[1] is None else ylim[1]
-    if z is not None:
-        zmin = z.min() if zlim[0] is None else zlim[0]
-        zmax = z.max() if zlim[1] is None else zlim[1]
-    else:
-        zmin = zmax = None
-
-    # Get x, y, z's length, and prevent 0 since they will be divided later
-    lx, ly = fmax(xmax - xmin, 0.0001), fmax(ymax - ymin, 0.0001)
-    lz = fmax(zmax - zmin, 0.0001) if z is not None else 0.
-
-    # Since we want number of cells in x, y, z to scale with lx, ly, lz, create a base number of cells nbase and
-    # let (lx*nbase)*(ly*nbase)*(lz*nbase) = mesh_target,
-    # then nbase = [mesh_target/(lx*ly*lz)]^(1/3)
-    nbase = cbrt(mesh_target/(lx*ly*lz)) if z is not None else sqrt(mesh_target/(lx*ly))
-
-    nx, ny = <int>ceil(lx*nbase), <int>ceil(ly*nbase)
-    nz = <int>ceil(lz*nbase) if z is not None else 1
-    print("\nTarget resolution is {} x {} (x {})".format(nx, ny, nz))
-    precision_x = nx*1j
-    precision_y = ny*1j
-    if z is not None: precision_z = nz*1j
-
-    if z is not None:
-        # Known coordinates with shape (3, n_points) trasposed to (n_points, 3)
-        coor_known = np.transpose(np.vstack((x, y, z)))
-        xmesh, ymesh, zmesh = np.mgrid[xmin:xmax:precision_x,
-                              ymin:ymax:precision_y,
-                              zmin:zmax:precision_z]
-        coor_request = (xmesh, ymesh, zmesh)
-        val_mesh = np.empty((xmesh.shape[0], xmesh.shape[1], xmesh.shape[2], n_features))
-    else:
-        coor_known = np.transpose(np.vstack((x, y)))
-        xmesh, ymesh = np.mgrid[xmin:xmax:precision_x,
-                       ymin:ymax:precision_y]
-        # Dummy array for zmesh in 2D
-        zmesh = np.empty(1)
-        coor_request = (xmesh, ymesh)
-        val_mesh = np.empty((xmesh.shape[0], xmesh.shape[1], n_features))
-
-    # Interpolate for each value column
-    for i in range(n_features):
-        print('\n Interpolating value ' + str(i + 1) + '...')
+    cdef object interpolator = GridInterpolator(x, y, z=z, xlim=xlim, ylim=ylim, zlim=zlim,
+                                                mesh_target=mesh_target, interp=interp, fill_val=fill_val, cache_dir=cache_dir,
+                                                structured=structured)
+    cdef np.ndarray val_mesh = interpolator(val)
+
+    return interpolator.xmesh, interpolator.ymesh, interpolator.zmesh, val_mesh
+
+
+class GridInterpolator:
+    """
+    Interpolator from scattered known coordinates to a target mesh, built once and applied to any number of field properties.
+    The target mesh is determined the same way as interpolateGridData().
+    For "linear" and "nearest" interpolation, the Delaunay triangulation/nearest neighbors and interpolation weights are computed once
+    and stored as a sparse matrix of shape (n_mesh_points, n_points),
+    so that interpolating field properties is a single sparse matrix product, identical to scipy.interpolate.griddata.
+    For "cubic" interpolation (2D only), the Delaunay triangulation is reused.
+    If cache_dir is given, "linear" and "nearest" weights are saved to/loaded from cache_dir,
+    keyed by a hash of the known coordinates, target mesh limits and size, and interpolation method,
+    so that interpolating the same slice to the same mesh in another run skips triangulation.
+    Least recently used cache files are removed once the cache exceeds cache_max_size bytes.
+    If known coordinates form a structured (rectilinear) lattice, optionally rotated in the x-y plane, e.g. SOWFA slices,
+    and structured is True or "auto", values are reshaped to the lattice and interpolated with 
+    scipy.interpolate.RegularGridInterpolator instead, avoiding the triangulation.
+    Note "linear" is then multi-linear on the lattice cells instead of linear on triangles.
+    Field properties of float32 are interpolated with float32 weights to a float32 mesh grid, halving its memory,
+    within 1e-6 relative to the largest magnitude of the float64 interpolation. Everything else is interpolated in float64.
+    
+    Example:
+        interpolator = GridInterpolator(x, y, mesh_target=1e4)
+        val1_mesh, val2_mesh = interpolator(val1), interpolator(val2)
+    """
+    def __init__(self, x, y, z=None, xlim=(None, None), ylim=(None, None), zlim=(None, None),
+                 mesh_target=1e4, interp="linear", fill_val=np.nan, cache_dir=None, cache_max_size=2e9,
+                 structured=False, lattice_tol=1e-6):
+        """
+        :param x: X coordinates.
+        :type x: ndarray[n_points]
+        :param y: Y coordinates.
+        :type y: ndarray[n_points]
+        :param z: Z coordinates in case of 3D.
+        :type z: ndarray[n_points] or None, optional (default=None)
+        :param xlim: X limit of the target mesh, in a tuple of minimum x and maximum x.
+        If minimum x is None, min() of the known x is used. The same for maximum x.
+        :type xlim: tuple, optional (default=(None, None))
+        :param ylim: Y limit of the target mesh, in a tuple of minimum y and maximum y.
+        If minimum y is None, min() of the known x is used. The same for maximum y.
+        :type ylim: tuple, optional (default=(None, None))
+        :param zlim: Z limit of the target mesh, in a tuple of minimum z and maximum z.
+        If z is not provided, zlim has no effect.
+        If z is provided and minimum z is None, min() of the known z is used. The same for maximum z.
+        :type zlim: tuple, optional (default=(None, None))
+        :param mesh_target: Summed size of the target mesh. 
+        The interpolator takes this value and assign cells to each dimension based on physical dimension length.
+        :type mesh_target: float, optional (default=1e4)
+        :param interp: Interpolation method, the same as scipy.interpolate.griddata.
+        :type interp: "nearest" or "linear" or "cubic", optional (default="linear")
+        :param fill_val: Value to replace NaN, i.e. outside the convex hull of known coordinates.
+        Has no effect for "nearest" interpolation.
+        :type fill_val: float, optional (default=nan)
+        :param cache_dir: Directory to save/load interpolation weights. Created if not existent.
+        If None or interp is "cubic", no caching is done.
+        :type cache_dir: str or None, optional (default=None)
+        :param cache_max_size: Maximum total size of cache files in cache_dir in bytes.
+        If cache_dir is None, this has no effect.
+        :type cache_max_size: float, optional (default=2e9)
+        :param structured: Whether known coordinates form a structured lattice, optionally rotated in the x-y plane.
+        If True, raise ValueError if no lattice is found. 
+        If "auto", the lattice is detected and scattered interpolation is used if no lattice is found.
+        If False, scattered interpolation is always used.
+        :type structured: bool or "auto", optional (default=False)
+        :param lattice_tol: Tolerance relative to the coordinate range, 
+        within which coordinates are considered the same lattice line.
+        If structured is False, this has no effect.
+        :type lattice_tol: float, optional (default=1e-6)
+        """
+        from scipy.spatial import Delaunay
+
+        print('\nBuilding interpolator to target mesh size ' + str(mesh_target) + ' with ' + str(interp) + ' method...')
+        self.interp, self.fill_val = interp, fill_val
+        # Limit new mesh if requested
+        xmin = x.min() if xlim[0] is None else xlim[0]
+        xmax = x.max() if xlim[1] is None else xlim[1]
+        ymin = y.min() if ylim[0] is None else ylim[0]
+        ymax = y.max() if ylim[1] is None else ylim[1]
+        if z is not None:
+            zmin = z.min() if zlim[0] is None else zlim[0]
+            zmax = z.max() if zlim[1] is None else zlim[1]
+        else:
+            zmin = zmax = None
+
+        # Get x, y, z's length, and prevent 0 since they will be divided later
+        lx, ly = fmax(xmax - xmin, 0.0001), fmax(ymax - ymin, 0.0001)
+        lz = fmax(zmax - zmin, 0.0001) if z is not None else 0.
+
+        # Since we want number of cells in x, y, z to scale with lx, ly, lz, create a base number of cells nbase and
+        # let (lx*nbase)*(ly*nbase)*(lz*nbase) = mesh_target,
+        # then nbase = [mesh_target/(lx*ly*lz)]^(1/3)
+        nbase = cbrt(mesh_target/(lx*ly*lz)) if z is not None else sqrt(mesh_target/(lx*ly))
+
+        nx, ny = <int>ceil(lx*nbase), <int>ceil(ly*nbase)
+        nz = <int>ceil(lz*nbase) if z is not None else 1
+        print("\nTarget resolution is {} x {} (x {})".format(nx, ny, nz))
+        precision_x = nx*1j
+        precision_y = ny*1j
+        if z is not None: precision_z = nz*1j
+
         if z is not None:
-            val_mesh[:, :, :, i] = griddata(coor_known, val[:, i], coor_request, method=interp, fill_value=fill_val)
+            # Known coordinates with shape (3, n_points) trasposed to (n_points, 3)
+            self.coor_known = np.transpose(np.vstack((x, y, z)))
+            self.xmesh, self.ymesh, self.zmesh = np.mgrid[xmin:xmax:precision_x,
+                                                 ymin:ymax:precision_y,
+                                                 zmin:zmax:precision_z]
+            coor_request = (self.xmesh, self.ymesh, self.zmesh)
         else:
-            val_mesh[:, :, i] = griddata(coor_known, val[:, i], coor_request, method=interp, fill_value=fill_val)
+            self.coor_known = np.transpose(np.vstack((x, y)))
+            self.xmesh, self.ymesh = np.mgrid[xmin:xmax:precision_x,
+                                     ymin:ymax:precision_y]
+            # Dummy array for zmesh in 2D
+            self.zmesh = np.empty(1)
+            coor_request = (self.xmesh, self.ymesh)
+
+        # Requested coordinates flattened to (n_mesh_points, n_dim)
+        self.coor_request = np.column_stack([coor.ravel() for coor in coor_request])
+        self.mesh_shape = self.xmesh.shape
+        self.weights, self.inside, self.tri, self.lattice = None, None, None, None
+        if structured:
+            self.lattice = self._detectLattice(self.coor_known, lattice_tol)
+            if self.lattice is None:
+                if structured != 'auto':
+                    raise ValueError("\nKnown coordinates don't form a structured lattice!\n")
+
+                print('\nNo structured lattice detected, using scattered interpolation')
+
+        if self.lattice is not None:
+            print('\nStructured lattice of shape ' + str(self.lattice[1]) + ' detected')
+        elif interp == 'cubic' and self.coor_known.shape[1] == 2:
+            self.tri = Delaunay(self.coor_known)
+        elif interp not in ('nearest', 'linear'):
+            raise ValueError("\nUnknown interpolation method " + str(interp) + " for " + str(self.coor_known.shape[1]) + " dimensional data!\n")
+        elif cache_dir is not None:
+            # Cache key from known coordinates, target mesh and interpolation method
+            key = hashlib.sha1(np.ascontiguousarray(self.coor_known, dtype=np.float64).tobytes())
+            key.update(repr(tuple(None if lim is None else float(lim) for lim in (xmin, xmax, ymin, ymax, zmin, zmax))
+                            + (float(mesh_target), self.mesh_shape, interp)).encode())
+            cache_file = os.path.join(cache_dir, key.hexdigest() + '.npz')
+            if os.path.isfile(cache_file):
+                self._loadWeights(cache_file)
+                # Mark cache file as most recently used
+                os.utime(cache_file)
+                print('\nInterpolation weights loaded from ' + cache_file)
+            else:
+                self._buildWeights()
+                os.makedirs(cache_dir, exist_ok=True)
+                self._saveWeights(cache_file)
+                self._evictCache(cache_dir, cache_max_size)
+                print('\nInterpolation weights cached in ' + cache_file)
 
-    # In case provided value only has 1 feature, compress from shape (grid mesh, 1) to (grid mesh)
-    if n_features == 1:
-        if z is None:
-            val_mesh = val_mesh.reshape((val_mesh.shape[0], val_mesh.shape[1]))
         else:
-            val_mesh = val_mesh.reshape((val_mesh.shape[0], val_mesh.shape[1], val_mesh.shape[2]))
+            self._buildWeights()
 
-    print('\nValues interpolated to mesh ' + str(np.shape(xmesh)))
-    return xmesh, ymesh, zmesh, val_mesh
+        print('\nInterpolator built for mesh ' + str(self.mesh_shape))
+
+
+    @staticmethod
+    def _detectLattice(coor, lattice_tol=1e-6):
+        """
+        Detect whether coor forms a structured lattice, i.e. every combination of unique coordinates in each dimension
+        appears exactly once, after rotating the lattice in the x-y plane to align with the axes.
+        The lattice rotation is the median direction between sampled points and their nearest neighbors.
+        
+        :return: None if no lattice is found, otherwise the rotation matrix to lattice frame, lattice shape, 
+        lattice coordinates of each dimension, and indices sorting known points to the lattice in C order.
+        :rtype: None or (ndarray[n_dim, n_dim], tuple, tuple, ndarray[n_points])
+        """
+        from scipy.spatial import cKDTree
+
+        n_points, ndim = coor.shape
+        rot = np.eye(ndim)
+        # Lattice rotation in the x-y plane, in [0, pi/2)
+        sample = coor[::max(n_points//1000, 1)]
+        _, idx = cKDTree(coor).query(sample, k=2)
+        dist = coor[idx[:, 1]] - sample
+        angle = np.median(np.arctan2(dist[:, 1], dist[:, 0])%(np.pi/2.))
+        if angle > np.pi/4.: angle -= np.pi/2.
+        if abs(angle) > 1e-12:
+            rot[0, 0] = rot[1, 1] = cos(angle)
+            rot[0, 1], rot[1, 0] = -sin(angle), sin(angle)
+
+        # Coordinates in lattice frame
+        coor_lattice = coor @ rot
+        axes, ids = [], []
+        for i in range(ndim):
+            order = np.argsort(coor_lattice[:, i], kind='stable')
+            vals = coor_lattice[order, i]
+            # A new lattice line starts wherever sorted coordinates jump more than tolerance
+            jump = np.diff(vals) > lattice_tol*max(np.ptp(vals), 1e-300)
+            line = np.empty(n_points, dtype=np.intp)
+            line[order] = np.concatenate(([0], np.cumsum(jump)))
+            axes.append(np.bincount(line, weights=coor_lattice[:, i])/np.bincount(line))
+            ids.append(line)
+
+        shape = tuple(len(axis) for axis in axes)
+        if np.prod(shape) != n_points or min(shape) < 2: return None
+        flat = np.ravel_multi_index(ids, shape)
+        sort = np.argsort(flat)
+        # Every lattice node has to be occupied exactly once
+        if not np.array_equal(flat[sort], np.arange(n_points)): return None
+
+        return rot, shape, tuple(axes), sort
+
+
+    def _buildWeights(self):
+        """
+        Build sparse interpolation weights of shape (n_mesh_points, n_points) for "nearest" or "linear" interpolation.
+        """
+        from scipy.spatial import Delaunay, cKDTree
+        from scipy import sparse
+
+        n_points, ndim = self.coor_known.shape
+        n_request = self.coor_request.shape[0]
+        if self.interp == 'nearest':
+            # Each requested point takes the value of its nearest known point, with weight 1
+            _, idx = cKDTree(self.coor_known).query(self.coor_request)
+            self.weights = sparse.csr_matrix((np.ones(n_request), idx, np.arange(n_request + 1)), shape=(n_request, n_points))
+        else:
+            self.tri = Delaunay(self.coor_known)
+            simplex = self.tri.find_simplex(self.coor_request)
+            self.inside = simplex >= 0
+            simplex = simplex[self.inside]
+            # Barycentric coordinates of requested points inside the convex hull,
+            # accumulated in the same order as scipy.interpolate.LinearNDInterpolator
+            transform = self.tri.transform[simplex]
+            dist = self.coor_request[self.inside] - transform[:, ndim]
+            bary = np.empty((len(simplex), ndim + 1))
+            bary[:, ndim] = 1.
+            for i in range(ndim):
+                bary[:, i] = 0.
+                for j in range(ndim):
+                    bary[:, i] += transform[:, i, j]*dist[:, j]
+
+                bary[:, ndim] -= bary[:, i]
+
+            # CSR matrix built directly, without sorting column indices, to keep the summation order of vertices
+            indptr = np.zeros(n_request + 1, dtype=np.intp)
+            indptr[1:] = np.cumsum(self.inside*(ndim + 1))
+            self.weights = sparse.csr_matrix((bary.ravel(), self.tri.simplices[simplex].ravel(), indptr), shape=(n_request, n_points))
+
+
+    def _saveWeights(self, cache_file):
+        """
+        Save sparse interpolation weights to cache_file, written to a temporary file first so that a cache file is always complete.
+        """
+        tmp_file = os.path.splitext(cache_file)[0] + '.' + str(os.getpid()) + '.tmp.npz'
+        np.savez(tmp_file, data=self.weights.data, indices=self.weights.indices, indptr=self.weights.indptr,
+                 shape=np.array(self.weights.shape), inside=np.array([]) if self.inside is None else self.inside)
+        os.replace(tmp_file, cache_file)
+
+
+    def _loadWeights(self, cache_file):
+        """
+        Load sparse interpolation weights from cache_file.
+        """
+        from scipy import sparse
+
+        with np.load(cache_file) as cache:
+            self.weights = sparse.csr_matrix((cache['data'], cache['indices'], cache['indptr']), shape=tuple(cache['shape']))
+            self.inside = cache['inside'] if self.interp == 'linear' else None
+
+
+    @staticmethod
+    def _evictCache(cache_dir, cache_max_size):
+        """
+        Remove least recently used cache files in cache_dir until their total size is within cache_max_size bytes.
+        The most recently used cache file is always kept.
+        """
+        cache_files = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith('.npz') and '.tmp.' not in f]
+        # Most recently used first
+        cache_files.sort(key=os.path.getmtime, reverse=True)
+        sizes = [os.path.getsize(f) for f in cache_files]
+        for i in range(len(cache_files) - 1, 0, -1):
+            if sum(sizes[:i + 1]) <= cache_max_size: break
+            os.remove(cache_files[i])
+            print('\nInterpolation cache ' + cache_files[i] + ' evicted')
+
+
+    def __call__(self, val):
+        """
+        Interpolate field properties to the target mesh.
+        
+        :param val: n_features number of field properties to interpolate with mesh.
+        :type val: ndarray[n_points, n_features] if n_features > 1 or ndarray[n_points]
+
+        :return: Field properties mesh grid.
+        Field properties values are stacked as the last dimension, either 3rd (2D grid) or 4th (3D grid) dimension.
+        :rtype: ndarray[nx, ny, n_features] or ndarray[nx, ny, nz, n_features], 
+        or ndarray[nx, ny] or ndarray[nx, ny, nz] if val is 1D
+        """
+        from scipy.interpolate import CloughTocher2DInterpolator, RegularGridInterpolator
+
+        val = np.asarray(val)
+        # Interpolate in float32 only if val is float32
+        if val.dtype != np.float32: val = val.astype(np.float64, copy=False)
+        # Ensure val is at least 2D with shape (n_points, 1) if it was 1D
+        val_2d = val.reshape((val.shape[0], -1))
+        if self.lattice is not None:
+            rot, shape, axes, sort = self.lattice
+            # "nearest" extrapolates like scipy.interpolate.griddata
+            val_mesh = RegularGridInterpolator(axes, val_2d[sort].reshape(shape + (val_2d.shape[1],)), method=self.interp,
+                                               bounds_error=False, fill_value=None if self.interp == 'nearest' else self.fill_val)(self.coor_request @ rot)
+        elif self.interp == 'cubic':
+            val_mesh = CloughTocher2DInterpolator(self.tri, val_2d, fill_value=self.fill_val)(self.coor_request)
+        else:
+            val_mesh = self.weights.astype(val.dtype, copy=False) @ val_2d
+            # Requested points outside the convex hull of known coordinates
+            if self.inside is not None: val_mesh[~self.inside] = self.fill_val
+
+        val_mesh = val_mesh.astype(val.dtype, copy=False)
+        # In case provided value only has 1 feature, compress from shape (grid mesh, 1) to (grid mesh)
+        if val_2d.shape[1] == 1:
+            return val_mesh.reshape(self.mesh_shape)
+        else:
+            return val_mesh.reshape(self.mesh_shape + (val_2d.shape[1],))
 
 
 cpdef tuple collapseMeshGridFeatures(np.ndarray meshgrid, bint infer_matrix_form=True, tuple matrix_shape=(3, 3), bint collapse_matrix=True):
@@ -355,12 +608,12 @@ cpdef np.ndarray rotateData(np.ndarray ndarr, double anglex=0., double angley=0.
     return ndarr
 
 
-cpdef tuple fieldSpatialSmoothing(np.ndarray[np.float_t, ndim=2] val,
-                                        np.ndarray[np.float_t] x, np.ndarray[np.float_t] y, np.ndarray z=None,
+cpdef tuple fieldSpatialSmoothing(np.ndarray val,
+                                        np.ndarray x, np.ndarray y, np.ndarray z=None,
                                         tuple val_bnd=(-np.inf, np.inf), bint is_bij=False, double bij_bnd_multiplier=2.,
                                         tuple xlim=(None, None), tuple ylim=(None, None), tuple zlim=(None, None),
                                         double mesh_target=1e4,
-                                  str interp_method='nearest'):
+                                  str interp_method='nearest', str cache_dir=None, object structured=False):
     """
     Spatially smooth a field of shape (n_points, n_outputs). Therefore, if the field is a 2/3D mesh grid, it has to be flattened beforehand.
     The workflow is:
@@ -374,6 +627,7 @@ cpdef tuple fieldSpatialSmoothing(np.ndarray[np.float_t, ndim=2] val,
     whatever is out of [-1/2, 1/2]*bij_bnd_multiplier off-diagonally is set to NaN.
     Otherwise, whatever is out of val_bnd is set to NaN.
     If one or more of xlim, ylim, zlim is provided, the target mesh is limited to xlim, and/or ylim, and/or zlim range.
+    A float32 field is smoothed in float32, see GridInterpolator and gaussianFilterChannels().
     
     :param val: Field value to be made mesh grid and smoothed. If is anisotropy tensor bij, is_bij should be True.  
     :type val: ndarray[n_points x n_outputs]
@@ -405,6 +659,12 @@ cpdef tuple fieldSpatialSmoothing(np.ndarray[np.float_t, ndim=2] val,
     :type mesh_target: float, optional (default=1e4)
     :param interp_method: Interpolation method.
     :type interp_method: 'nearest', 'linear', 'cubic', optional (default='nearest')
+    :param cache_dir: Directory to cache interpolation weights across runs, see GridInterpolator.
+    If None, no caching is done.
+    :type cache_dir: str or None, optional (default=None)
+    :param structured: Whether x, y, (z) form a (rotated) structured lattice, see GridInterpolator.
+    If "auto", the lattice is detected.
+    :type structured: bool or "auto", optional (default=False)
     
     :return: Mesh grid coordinates of x, y, z, and spatially smoothed field mesh grid.
     :rtype: (ndarray[3D mesh grid], ndarray[3D mesh grid], ndarray[3D mesh grid], ndarray[3D mesh grid x n_outputs])
@@ -432,10 +692,10 @@ cpdef tuple fieldSpatialSmoothing(np.ndarray[np.float_t, ndim=2] val,
 
     # Step 2
     xmesh, ymesh, zmesh, val_mesh = interpolateGridData(x, y, val, z=z, xlim=xlim, ylim=ylim, zlim=zlim,
-                                       mesh_target=mesh_target, interp=interp_method, fill_val=np.nan)
-    # Step 3
-    for i in range(n_outputs):
-        val_mesh[..., i] = gaussianFilter(val_mesh[..., i])
+                                       mesh_target=mesh_target, interp=interp_method, fill_val=np.nan, cache_dir=cache_dir,
+                                                        structured=structured)
+    # Step 3, all components filtered at once, in-place through a view with components as the last dimension
+    gaussianFilterChannels(val_mesh.reshape(np.shape(xmesh) + (n_outputs,)), inplace=True)
 
     return xmesh, ymesh, zmesh, val_mesh
 
@@ -470,23 +730,73 @@ cpdef np.ndarray gaussianFilter(np.ndarray array, double sigma=2.):
     :return: Filtered array or mesh grid of the same shape as input
     :rtype: ndarray
     """
-    cdef np.ndarray v, vv, w, ww, arr_filtered
+    # Filter array as a single channel
+    return gaussianFilterChannels(array[..., None], sigma=sigma)[..., 0]
+
+
+cpdef np.ndarray gaussianFilterChannels(np.ndarray array, double sigma=2., str backend='auto', bint inplace=False, double truncate=4.):
+    """
+    Perform Gaussian filter to smooth every channel of a 2D/3D field of shape (nx, ny[, nz], n_channels), along spatial axes only.
+    NaNs are ignored the same way as gaussianFilter(). 
+    If every channel has the same NaN locations, the filtered weight field is computed once and shared by all channels.
+    With "fft" backend, the filter is done by FFT convolution with the Gaussian kernel along each spatial axis, 
+    on the array reflected at the boundaries, the same as scipy.ndimage.gaussian_filter.
+    Since the filter is separable, "fft" only pays off for large kernels.
     
-    v = array.copy()
-    v[np.isnan(array)] = 0.
-    vv = ndimage.gaussian_filter(v, sigma=sigma)
-    w = np.ones_like(array)
-    w[np.isnan(array)] = 0.
-    ww = ndimage.gaussian_filter(w, sigma=sigma)
-    arr_filtered = vv/ww
+    :param array: Mesh grid of channels to perform Gaussian filtering, with channels stacked as the last dimension.
+    :type array: ndarray[nx, ny, n_channels] or ndarray[nx, ny, nz, n_channels]
+    :param sigma: Standard deviation for Gaussian kernel in number of cells.
+    :type sigma: double, optional (default=2.)
+    :param backend: Filter backend. 
+    If "auto", "fft" is used for sigma >= 15, otherwise "direct" scipy.ndimage.gaussian_filter.
+    :type backend: "auto" or "direct" or "fft", optional (default="auto")
+    :param inplace: Whether to filter array in-place, saving a full-size copy. Requires array of float32 or float64.
+    :type inplace: bool, optional (default=False)
+    :param truncate: Truncate the Gaussian kernel at this many standard deviations.
+    :type truncate: double, optional (default=4.)
+    
+    :return: Filtered mesh grid of the same shape as input, float32 if array is float32 and float64 else. Is array if inplace.
+    :rtype: ndarray[nx, ny, n_channels] or ndarray[nx, ny, nz, n_channels]
+    """
+    cdef np.ndarray v, w, ww, nan
+    cdef int n_spatial = array.ndim - 1
+    cdef tuple sigmas = (sigma,)*n_spatial + (0.,)
+    cdef bint shared_nan
+
+    if backend == 'auto': backend = 'fft' if sigma >= 15. else 'direct'
+    if inplace and array.dtype not in (np.float32, np.float64):
+        raise ValueError("\nIn-place Gaussian filter requires array of float32 or float64!\n")
+
+    nan = np.isnan(array)
+    # Filter in float32 only if array is float32
+    v = array if inplace else array.astype(np.float32 if array.dtype == np.float32 else np.float64)
+    v[nan] = 0.
+    # Weight field of 1 for valid values and 0 for NaN, shared among channels if NaN locations are the same
+    shared_nan = bool((nan == nan[..., :1]).all())
+    w = (~nan[..., :1] if shared_nan else ~nan).astype(v.dtype)
+    if backend == 'fft':
+        v[...] = _fftGaussianFilter(v, sigma, n_spatial, truncate)
+        ww = _fftGaussianFilter(w, sigma, n_spatial, truncate)
+        # Round-off of FFT leaves tiny weights and values where there should be no valid value within the kernel
+        ww[ww < 1e-12] = 0.
+        v[np.broadcast_to(ww == 0., np.shape(v))] = 0.
+    else:
+        ndimage.gaussian_filter(v, sigma=sigmas, output=v, truncate=truncate)
+        ww = ndimage.gaussian_filter(w, sigma=sigmas, output=w, truncate=truncate)
 
-    return arr_filtered
+    # Filtered values normalized by filtered weights, NaN if no valid value is within the kernel
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(v, ww, out=v)
 
-def confineFieldDomain3D(nparr[flt, ndim=2] cc, nparr vals,
+    return v
+
+
+def confineFieldDomain3D(np.ndarray cc, np.ndarray vals,
                                double box_l, double box_w, double box_h, tuple box_orig=(0., 0., 0.), double rot_z=0.):
     """
     Confine a (z-axis rotated) 3D domain given cell centers cc and values val.
     The confined box is defined by box length box_l, width box_w, height h, origin box_origin, and rotation angle rot_z in rad.
+    See confineFieldDomainIndices3D() to confine multiple boxes in one pass without copies.
 
     :param cc: 3D cell center coordinates
     :type cc: 2D array of shape (n_cells, 3)
@@ -506,14 +816,90 @@ def confineFieldDomain3D(nparr[flt, ndim=2] cc, nparr vals,
     :return: Confined cell centers, confined values, and 1D bool mask
     :rtype: (2D array of shape (n_cells, 3), 1/2D array of shape (n_cells,) or (n_cells, n_features), 1D array of shape (n_cells,))
     """
+    cdef np.ndarray idx, mask
+
     print('\nConfining 3D field domain...')
-    # Confined mask in uint8 type, then change it to bool type
-    mask = np.array(_confineFieldDomain3D(cc, box_l, box_w, box_h, box_orig, rot_z), dtype=np.bool)
+    idx = confineFieldDomainIndices3D(cc, [dict(box_l=box_l, box_w=box_w, box_h=box_h, box_orig=box_orig, rot_z=rot_z)])[0]
+    mask = np.zeros(cc.shape[0], dtype=bool)
+    mask[idx] = True
     # Pick up cell centers and values in confined region
-    cc_confined = cc[mask]
-    vals_confined = vals[mask]
+    return cc[idx], vals[idx], mask
 
-    return cc_confined, vals_confined, mask
+
+cpdef list confineFieldDomainIndices3D(np.ndarray cc, list boxes):
+    """
+    Find cells of a 3D domain inside each of multiple (z-axis rotated) boxes, in one parallel pass over the cell centers cc.
+    Every box is a dictionary of keyword arguments box_l, box_w, box_h, box_orig, rot_z of confineFieldDomain3D(),
+    e.g. the "first" and "second" refinement zones and a box per turbine.
+    A cell is inside a box if it's inside or on the faces of the box.
+    Instead of copies of confined cell centers and values, ascending cell indices per box are returned,
+    so that callers gather only the rows and columns they need, e.g. vals[idx] or vals[idx, :3], 
+    reading the field in order.
+    
+    :param cc: 3D cell center coordinates
+    :type cc: 2D array of shape (n_cells, 3)
+    :param boxes: Up to 64 boxes, each a dictionary with keys box_l, box_w, box_h, and optionally box_orig (default=(0., 0., 0.)) 
+    and rot_z (default=0.).
+    :type boxes: list(dict)
+    
+    :return: Ascending indices of cells inside each box, all views of one buffer.
+    :rtype: list(1D array of int)
+    """
+    cdef int n_boxes = len(boxes)
+    cdef Py_ssize_t n_cells = cc.shape[0]
+    cdef double[:, :] cc_view
+    cdef double[:, ::1] box_view
+    cdef np.uint64_t[::1] bits
+    cdef Py_ssize_t[::1] counts, pos
+    cdef Py_ssize_t[::1] idx_view
+    cdef np.ndarray idx
+    cdef np.uint64_t b
+    cdef Py_ssize_t i
+    cdef int j
+    cdef tuple box_orig
+    cdef double rot_z
+
+    if n_boxes > 64:
+        raise ValueError("\nAt most 64 boxes can be confined in one pass!\n")
+
+    # Every box as origin x, y, z, cos and sin of rotation, length, width, height
+    box_view = np.empty((max(n_boxes, 1), 8))
+    for j in range(n_boxes):
+        box_orig, rot_z = tuple(boxes[j].get('box_orig', (0., 0., 0.))), boxes[j].get('rot_z', 0.)
+        box_view[j, 0], box_view[j, 1], box_view[j, 2] = box_orig[0], box_orig[1], box_orig[2]
+        box_view[j, 3], box_view[j, 4] = cos(rot_z), sin(rot_z)
+        box_view[j, 5], box_view[j, 6], box_view[j, 7] = boxes[j]['box_l'], boxes[j]['box_w'], boxes[j]['box_h']
+
+    cc_view = np.asarray(cc, dtype=np.float64)
+    # Bit j of a cell is whether it's inside box j
+    bits = np.empty(n_cells, dtype=np.uint64)
+    counts, pos = np.zeros(n_boxes + 1, dtype=np.intp), np.zeros(n_boxes, dtype=np.intp)
+    with nogil:
+        for i in prange(n_cells, schedule='static'):
+            bits[i] = _getBoxBits(cc_view[i, 0], cc_view[i, 1], cc_view[i, 2], &box_view[0, 0], n_boxes)
+
+        # Offsets of each box in the index buffer
+        for i in range(n_cells):
+            b = bits[i]
+            for j in range(n_boxes):
+                if (b >> j) & 1: counts[j + 1] += 1
+
+        for j in range(n_boxes):
+            counts[j + 1] += counts[j]
+            pos[j] = counts[j]
+
+    idx = np.empty(counts[n_boxes], dtype=np.intp)
+    idx_view = idx
+    with nogil:
+        for i in range(n_cells):
+            b = bits[i]
+            for j in range(n_boxes):
+                if (b >> j) & 1:
+                    idx_view[pos[j]] = i
+                    pos[j] += 1
+
+    print('\n' + str([counts[j + 1] - counts[j] for j in range(n_boxes)]) + ' cells confined in ' + str(n_boxes) + ' box(es)')
+    return [idx[counts[j]:counts[j + 1]] for j in range(n_boxes)]
 
 
 def timer(func):
@@ -544,36 +930,53 @@ def deprecated(func):
     return newFunc
 
 
-cdef uint8[:] _confineFieldDomain3D(nparr[flt, ndim=2] cc,
-                               double box_l, double box_w, double box_h, tuple box_orig=(0., 0., 0.), double rot_z=0.):
+cdef np.uint64_t _getBoxBits(double x, double y, double z, const double* boxes, int n_boxes) noexcept nogil:
     """
-    Cython doesn't support bool type array. Thus uint8 type memoryview workaround.
+    Bit j is whether point x, y, z is inside box j of boxes, each being origin x, y, z, cos and sin of rotation, length, width, height.
     """
-    cdef uint8[:] mask_z, mask_xy, mask
-    cdef nparr[flt, ndim=2] cc_confined
-    cdef nparr vals_confined
-
-    # Create the bounding box
-    box = path.Path(((box_orig[0], box_orig[1]),
-                     (box_l*cos(rot_z) + box_orig[0], box_l*sin(rot_z) + box_orig[1]),
-                     (box_l*cos(rot_z) + box_orig[0] - box_w*sin(rot_z), box_l*sin(rot_z) + box_orig[1] + box_w*cos(rot_z)),
-                     (box_orig[0] - box_w*sin(rot_z), box_orig[1] + box_w*cos(rot_z)),
-                     (box_orig[0], box_orig[1])))
-    # 1D bool mask where z is confined
-    mask_z = np.frombuffer(np.where((cc[:, 2] >= box_orig[2]) & (cc[:, 2] <= box_orig[2] + box_h), True, False), dtype=np.uint8)
-    # 1D bool mask array of confined x, y
-    mask_xy = np.frombuffer(box.contains_points((cc[:, :2])), dtype=np.uint8)
-    # Combine mask_z and mask_xy together
-    mask = np.frombuffer(np.logical_and(mask_xy, mask_z), dtype=np.uint8)
-
-    return mask
-
-
-
-
-
-
+    cdef np.uint64_t b = 0
+    cdef const double* box
+    cdef double dx, dy, u, v
+    cdef int j
 
+    for j in range(n_boxes):
+        box = boxes + 8*j
+        if z < box[2] or z > box[2] + box[7]: continue
+        # Coordinates along box length and width
+        dx, dy = x - box[0], y - box[1]
+        u = dx*box[3] + dy*box[4]
+        v = dy*box[3] - dx*box[4]
+        if 0. <= u <= box[5] and 0. <= v <= box[6]:
+            b |= (<np.uint64_t>1) << j
 
+    return b
 
 
+cdef np.ndarray _fftGaussianFilter(np.ndarray array, double sigma, int n_axes, double truncate=4.):
+    """
+    Gaussian filter the first n_axes axes of array by FFT convolution, with the same kernel and reflect boundary as scipy.ndimage.gaussian_filter.
+    """
+    from scipy import fft
+
+    cdef int radius = <int>(truncate*sigma + 0.5)
+    cdef np.ndarray kernel = np.exp(-0.5/sigma**2*np.arange(-radius, radius + 1)**2)
+    cdef np.ndarray kernel_fft
+    cdef int axis, n, n_fft
+    cdef list pad, shape
+
+    kernel /= kernel.sum()
+    for axis in range(n_axes):
+        n = array.shape[axis]
+        pad, shape = [(0, 0)]*array.ndim, [1]*array.ndim
+        pad[axis] = (radius, radius)
+        # Linear convolution of the padded array of length n + 2*radius with the kernel of length 2*radius + 1
+        n_fft = fft.next_fast_len(n + 4*radius, real=True)
+        kernel_fft = fft.rfft(kernel, n_fft)
+        shape[axis] = len(kernel_fft)
+        # "symmetric" padding is scipy.ndimage "reflect" mode
+        array = fft.irfft(fft.rfft(np.pad(array, pad, mode='symmetric'), n_fft, axis=axis, workers=-1)*kernel_fft.reshape(shape),
+                          n_fft, axis=axis, workers=-1)
+        # Discard the kernel's lead-in and the padding
+        array = np.take(array, np.arange(2*radius, 2*radius + n), axis=axis)
+
+    return array